@@ -8,10 +8,8 @@ import random
 import folium
 from streamlit_folium import st_folium
 import requests
-from concurrent.futures import ThreadPoolExecutor
 import plotly.graph_objects as go
 import plotly.express as px
-import sqlite3
 import json
 import sys
 import os
@@ -20,7 +18,23 @@ import os
 _APP_DIR = os.path.dirname(os.path.abspath(__file__))
 if _APP_DIR not in sys.path:
     sys.path.insert(0, _APP_DIR)
-from shared_utils import fetch_routes as shared_fetch_routes, distance_km, hash_password, verify_password, calculate_co2_savings, estimate_fuel_consumption
+from shared_utils import fetch_routes as shared_fetch_routes, SENSORS_GRID, distances_km, hash_password, verify_password, calculate_co2_savings, estimate_fuel_consumption
+import db
+import schema
+import rollups
+import fleet_snapshot
+import comms
+import route_matrix
+import geometry
+import sensors
+import forecast
+import green_wave
+import leases
+import live_map
+import deck_map
+import map_layers
+import spatial_index
+import queries
 try:
     from shared_utils import HOSPITALS, ONLINE_THRESHOLD_SEC, MISSION_EXPIRY_SEC
 except ImportError:
@@ -46,28 +60,6 @@ except ImportError:
         "Samaritan Hospital": [10.1900, 76.3800], "Mom Hospital": [10.0150, 76.3100]
     }
 
-try:
-    from geopy.distance import geodesic
-except Exception:
-    import math
-
-    def geodesic(a, b):
-        lat1, lon1 = a
-        lat2, lon2 = b
-        r = 6371000.0
-        p1, p2 = math.radians(lat1), math.radians(lat2)
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        x = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
-        meters = 2 * r * math.asin(math.sqrt(x))
-
-        class _D:
-            def __init__(self, m):
-                self.meters = m
-                self.km = m / 1000.0
-
-        return _D(meters)
-
 # ==========================================
 # 0. SYSTEM CONFIGURATION & GLOBAL STATE
 # ==========================================
@@ -85,219 +77,48 @@ if 'emergency_mode' not in st.session_state: st.session_state.emergency_mode = F
 if 'mission_id' not in st.session_state: st.session_state.mission_id = f"CMD-{random.randint(1000,9999)}"
 if 'priority_val' not in st.session_state: st.session_state.priority_val = "STANDARD"
 
-# DB (same folder as script for shared DB when running from any cwd)
+# DB (same folder as script for shared DB when running from any cwd); pooled connections via db.py
 # TomTom API key: shared_utils.TOMTOM_API_KEY (supports TOMTOM_API_KEY env var)
-DB_FILE = os.path.join(_APP_DIR, "titan_v52.db")
+DB_FILE = db.DB_FILE
+# Explicit column lists: times are stored as epoch ms and rendered as local time strings for display
+MISSION_COLS = ("id, mission_id, origin, destination, priority, assigned_driver_id, status, notes, decline_reason, created_at_ms, "
+                + ", ".join(db.local_ts(f"{c}_ms", c) for c in ("created_at", "accepted_at", "completed_at")))
 
 # ==========================================
 # 1. DATABASE ENGINE
 # ==========================================
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA busy_timeout=5000;")
-    c = conn.cursor()
-    
-    # 1. MISSION LOGS
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS mission_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME,
-            mission_id TEXT,
-            origin TEXT,
-            destination TEXT,
-            priority TEXT,
-            time_saved REAL,
-            co2_saved REAL,
-            avg_speed REAL
-        )
-    ''')
-    
-    # 2. DRIVER STATE (Telemetry history: lat, lon, speed per push)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS driver_state (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            driver_id TEXT,
-            origin TEXT,
-            destination TEXT,
-            current_lat REAL,
-            current_lon REAL,
-            speed REAL,
-            status TEXT,
-            timestamp DATETIME
-        )
-    ''')
-    try:
-        c.execute("ALTER TABLE driver_state ADD COLUMN speed REAL")
-    except sqlite3.OperationalError:
-        pass
-    
-    # 3. COMMUNICATIONS
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS driver_comms (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME,
-            driver_id TEXT,
-            status TEXT,
-            message TEXT
-        )
-    ''')
-
-    # 4. DRIVER REGISTRY (Master state: syncs with driverapp)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS drivers (
-            driver_id TEXT PRIMARY KEY,
-            status TEXT,
-            current_lat REAL,
-            current_lon REAL,
-            last_seen DATETIME,
-            speed REAL,
-            origin TEXT,
-            destination TEXT,
-            active_mission_id TEXT,
-            clearance_status TEXT,
-            selected_route_id INTEGER
-        )
-    ''')
-    # Migration: add columns if table already existed without them
-    for col, typ in [
-        ("speed", "REAL"), ("origin", "TEXT"), ("destination", "TEXT"),
-        ("active_mission_id", "TEXT"), ("clearance_status", "TEXT"), ("selected_route_id", "INTEGER"),
-    ]:
-        try:
-            c.execute(f"ALTER TABLE drivers ADD COLUMN {col} {typ}")
-        except sqlite3.OperationalError:
-            pass
-
-    # 5. MISSIONS
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS missions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            created_at DATETIME,
-            mission_id TEXT,
-            origin TEXT,
-            destination TEXT,
-            priority TEXT,
-            assigned_driver_id TEXT,
-            status TEXT,
-            accepted_at DATETIME,
-            completed_at DATETIME
-        )
-    ''')
-
-    # 6. OPERATORS
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS operators (
-            username TEXT PRIMARY KEY,
-            password TEXT,
-            display_name TEXT
-        )
-    ''')
-
-    # 7. DRIVER ACCOUNTS
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS driver_accounts (
-            driver_id TEXT PRIMARY KEY,
-            username TEXT UNIQUE,
-            password TEXT,
-            full_name TEXT,
-            phone TEXT,
-            vehicle_id TEXT,
-            base_hospital TEXT,
-            created_at DATETIME
-        )
-    ''')
-
-    # 8. SIGNAL STATUS (For Green Wave)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS signal_status (
-            stop_id TEXT PRIMARY KEY,
-            status TEXT,
-            last_updated DATETIME
-        )
-    ''')
-
-    # 9. HAZARDS (For Hazard Mapping)
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS hazards (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            lat REAL,
-            lon REAL,
-            type TEXT,
-            timestamp DATETIME
-        )
-    ''')
-
-    # missions.notes
-    try:
-        c.execute("ALTER TABLE missions ADD COLUMN notes TEXT")
-    except sqlite3.OperationalError:
-        pass
-    # missions.decline_reason
-    try:
-        c.execute("ALTER TABLE missions ADD COLUMN decline_reason TEXT")
-    except sqlite3.OperationalError:
-        pass
-    # activity_log
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS activity_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME,
-            action TEXT,
-            actor TEXT,
-            details TEXT
-        )
-    ''')
-    # mission_declines: persist driver declines so they don't see same mission after refresh
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS mission_declines (
-            mission_id TEXT,
-            driver_id TEXT,
-            declined_at DATETIME,
-            reason TEXT,
-            PRIMARY KEY (mission_id, driver_id)
-        )
-    ''')
-    # Seed defaults (hashed passwords)
-    c.execute(
-        "INSERT OR IGNORE INTO operators (username, password, display_name) VALUES (?, ?, ?)",
-        ("COMMANDER", hash_password("TITAN-X"), "HQ Commander"),
-    )
-    c.execute(
-        "INSERT OR IGNORE INTO driver_accounts (driver_id, username, password, full_name, created_at) VALUES (?, ?, ?, ?, ?)",
-        ("UNIT-07", "UNIT-07", hash_password("TITAN-DRIVER"), "Unit 7", datetime.datetime.now()),
-    )
-    
-    conn.commit()
-    conn.close()
-
-init_db()
+# Schema lives in schema.py (versioned migrations, applied once per process)
+schema.ensure_schema(DB_FILE)
+# Telemetry rollups + retention run in a background thread (started once per process)
+rollups.ensure_worker(DB_FILE)
+# Hospital -> hospital route matrix for instant Mission Center previews; the in-app refresh (up to
+# REFRESH_BATCH TomTom calls a minute) only runs with ROUTE_MATRIX_REFRESH=1
+if route_matrix.REFRESH_IN_APP:
+    route_matrix.ensure_worker(DB_FILE)
+# Junction sensor readings: one ingestion loop per process, shared by every session
+sensors.ensure_worker(DB_FILE)
+# Automatic green wave ahead of every ACCEPTED mission's unit along its selected route
+green_wave.ensure_worker(DB_FILE)
+# Expired green waves / clearance requests are swept periodically (reads filter on expiry meanwhile)
+leases.ensure_worker(DB_FILE)
 
 # --- HELPER: SAVE MISSION ---
 def save_mission_data(mid, org, dst, prio, saved, co2, speed):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO mission_logs (timestamp, mission_id, origin, destination, priority, time_saved, co2_saved, avg_speed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                  (datetime.datetime.now(), mid, org, dst, prio, saved, co2, speed))
-        conn.commit()
-        conn.close()
+        db.execute("INSERT INTO mission_logs (timestamp_ms, mission_id, origin, destination, priority, time_saved, co2_saved, avg_speed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                   (db.now_ms(), mid, org, dst, prio, saved, co2, speed))
     except: pass
 
 # --- HELPER: GET DRIVER POSITION ---
 def get_driver_status():
     """Reads the absolute latest telemetry from the driver app"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        row = conn.execute("SELECT * FROM driver_state ORDER BY id DESC LIMIT 1").fetchone()
-        conn.close()
+        row = db.fetchone(queries.LATEST_DRIVER_STATE_SQL)
         if row:
-            # driver_state: id, driver_id, origin, destination, current_lat, current_lon, speed, status, timestamp
             return {
-                "id": row[1], "origin": row[2], "dest": row[3],
-                "lat": row[4], "lon": row[5], "speed": row[6] if len(row) > 6 else None,
-                "status": row[7] if len(row) > 7 else row[6],
-                "time": row[8] if len(row) > 8 else row[7]
+                "id": row[0], "origin": row[1], "dest": row[2],
+                "lat": row[3], "lon": row[4], "speed": row[5],
+                "status": row[6], "time": row[7]
             }
     except: pass
     return None
@@ -309,12 +130,7 @@ def get_ghost_trail(limit=20):
 def get_driver_status_by_id(driver_id):
     """Latest telemetry for a specific driver"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        row = conn.execute(
-            "SELECT driver_id, origin, destination, current_lat, current_lon, speed, status, timestamp FROM driver_state WHERE driver_id=? ORDER BY id DESC LIMIT 1",
-            (driver_id,)
-        ).fetchone()
-        conn.close()
+        row = db.fetchone(queries.DRIVER_STATE_BY_ID_SQL, (driver_id,))
         if row:
             return {
                 "id": row[0], "origin": row[1], "dest": row[2],
@@ -330,14 +146,7 @@ def get_ghost_trail_for_driver(driver_id, limit=80):
     if not driver_id:
         return path
     try:
-        conn = sqlite3.connect(DB_FILE)
-        rows = conn.execute(
-            """SELECT current_lat, current_lon FROM driver_state
-               WHERE driver_id=? AND current_lat IS NOT NULL AND current_lon IS NOT NULL
-               ORDER BY id DESC LIMIT ?""",
-            (driver_id, limit)
-        ).fetchall()
-        conn.close()
+        rows = db.fetchall(queries.GHOST_TRAIL_SQL, (driver_id, limit))
         if rows:
             valid = []
             for r in reversed(rows):
@@ -355,20 +164,16 @@ def get_ghost_trail_for_driver(driver_id, limit=80):
 def get_hazards():
     hazards = []
     try:
-        conn = sqlite3.connect(DB_FILE)
-        rows = conn.execute("SELECT lat, lon, type FROM hazards ORDER BY id DESC LIMIT 50").fetchall()
-        conn.close()
+        rows = db.fetchall(queries.RECENT_HAZARDS_SQL)
         if rows:
-            hazards = [{"lat": r[0], "lon": r[1], "type": r[2]} for r in rows]
+            hazards = [{"lat": r[0], "lon": r[1], "type": r[2], "id": r[3]} for r in rows]
     except: pass
     return hazards
 
 def get_signal_status():
     signals = {}
     try:
-        conn = sqlite3.connect(DB_FILE)
-        rows = conn.execute("SELECT stop_id, status FROM signal_status").fetchall()
-        conn.close()
+        rows = db.fetchall(queries.SIGNAL_STATUS_SQL, (db.now_ms(),))
         for r in rows:
             signals[r[0]] = r[1]
     except: pass
@@ -380,27 +185,30 @@ def get_driver_profiles(driver_ids):
     if not ids:
         return {}
     ids = list(dict.fromkeys(ids))
+    # Recently-seen drivers come from the shared snapshot; only the rest hit the DB
+    known = fleet_snapshot.current(DB_FILE).profiles
+    out = {did: dict(known[did]) for did in ids if did in known}
+    missing = [did for did in ids if did not in out]
+    if not missing:
+        return out
     try:
-        conn = sqlite3.connect(DB_FILE)
-        placeholders = ",".join("?" * len(ids))
-        rows = conn.execute(
+        placeholders = ",".join("?" * len(missing))
+        rows = db.fetchall(
             f"SELECT driver_id, full_name, vehicle_id FROM driver_accounts WHERE driver_id IN ({placeholders})",
-            ids,
-        ).fetchall()
-        conn.close()
-        return {r[0]: {"full_name": r[1] or "—", "vehicle_id": r[2] or "—"} for r in rows}
+            missing,
+        )
+        out.update({r[0]: {"full_name": r[1] or "—", "vehicle_id": r[2] or "—"} for r in rows})
     except Exception:
-        return {}
+        pass
+    return out
 
 def get_driver_from_drivers_table(driver_id):
     """Current position & route from drivers table (heartbeat). Fallback when driver_state is empty."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        row = conn.execute(
+        row = db.fetchone(
             "SELECT driver_id, origin, destination, current_lat, current_lon, speed, status FROM drivers WHERE driver_id=?",
             (driver_id,),
-        ).fetchone()
-        conn.close()
+        )
         if row:
             return {"id": row[0], "origin": row[1], "dest": row[2], "lat": row[3], "lon": row[4], "speed": row[5], "status": row[6]}
     except Exception:
@@ -411,22 +219,13 @@ def get_available_drivers(online_within_seconds=None):
     """Drivers who are ONLINE (recent last_seen), ACTIVE (not BREAK/INACTIVE), and have a REGISTERED account."""
     if online_within_seconds is None:
         online_within_seconds = ONLINE_THRESHOLD_SEC
+    if online_within_seconds <= fleet_snapshot.SNAPSHOT_WINDOW_SEC:
+        df = fleet_snapshot.current(DB_FILE).available(online_within_seconds)
+        return df if not df.empty else pd.DataFrame()
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        df = pd.read_sql_query("""
-            SELECT d.* FROM drivers d
-            INNER JOIN driver_accounts a ON d.driver_id = a.driver_id
-            WHERE d.current_lat IS NOT NULL AND d.current_lon IS NOT NULL
-              AND (d.status IS NULL OR d.status NOT IN ('BREAK', 'INACTIVE'))
-        """, conn)
-        conn.close()
+        df = db.read_sql(queries.ONLINE_DRIVERS_SQL, (db.ago_ms(online_within_seconds),))
         if df.empty:
             return pd.DataFrame()
-        df["last_seen"] = pd.to_datetime(df["last_seen"], errors="coerce")
-        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=online_within_seconds)
-        df = df[df["last_seen"] >= cutoff]
-        df = df.sort_values(["status", "last_seen"], ascending=[True, False])
         return df
     except Exception:
         return pd.DataFrame()
@@ -440,18 +239,10 @@ def get_all_active_drivers(online_within_seconds=30):
 def get_drivers_for_live_map(online_within_seconds=60):
     """Drivers for Live Tracking map: includes those without position (simulated). Returns df with current_lat, current_lon, status, etc."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        df = pd.read_sql_query("""
-            SELECT d.driver_id, d.status, d.current_lat, d.current_lon, d.origin, d.destination, d.speed, d.last_seen, d.active_mission_id
-            FROM drivers d INNER JOIN driver_accounts a ON d.driver_id = a.driver_id
-        """, conn)
-        conn.close()
-        if df.empty:
-            return pd.DataFrame()
-        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=online_within_seconds)
-        df["last_seen"] = pd.to_datetime(df["last_seen"], errors="coerce")
-        df = df[df["last_seen"] >= cutoff]
+        if online_within_seconds <= fleet_snapshot.SNAPSHOT_WINDOW_SEC:
+            df = fleet_snapshot.current(DB_FILE).live(online_within_seconds)
+        else:
+            df = db.read_sql(queries.LIVE_MAP_DRIVERS_SQL, (db.ago_ms(online_within_seconds),))
         if df.empty:
             return pd.DataFrame()
         # Simulate position when lat/lon is null (no real-time GPS) - linear interpolation along route
@@ -480,27 +271,18 @@ def get_drivers_for_live_map(online_within_seconds=60):
 def get_drivers_pending_clearance():
     """Drivers with clearance_status == 'PENDING' for Traffic Control Center."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        df = pd.read_sql_query(
-            "SELECT driver_id, status, current_lat, current_lon, last_seen FROM drivers WHERE clearance_status = 'PENDING'",
-            conn,
-        )
-        conn.close()
-        return df
+        return db.read_sql(queries.PENDING_CLEARANCE_SQL, (db.now_ms(),))
     except Exception:
         return pd.DataFrame()
 
 
 def get_current_mission_for_driver(driver_id):
     """Current mission for a driver (DISPATCHED or ACCEPTED). Returns dict with mission_id, origin, destination, status or None."""
+    m = fleet_snapshot.current(DB_FILE).active_missions.get(driver_id)
+    if m is not None:
+        return dict(m)
     try:
-        conn = sqlite3.connect(DB_FILE)
-        row = conn.execute(
-            "SELECT mission_id, origin, destination, status FROM missions WHERE assigned_driver_id = ? AND status IN ('DISPATCHED','ACCEPTED') ORDER BY id DESC LIMIT 1",
-            (driver_id,),
-        ).fetchone()
-        conn.close()
+        row = db.fetchone(queries.CURRENT_MISSION_SQL, (driver_id,))
         if row:
             return {"mission_id": row[0], "origin": row[1], "destination": row[2], "status": row[3]}
     except Exception:
@@ -509,26 +291,16 @@ def get_current_mission_for_driver(driver_id):
 
 
 def update_driver_clearance(driver_id, status):
-    """Set clearance_status to GRANTED or DENIED."""
-    if status not in ("GRANTED", "DENIED"):
-        return False
+    """Set clearance_status to GRANTED or DENIED (shown to the driver until the lease lapses)."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("UPDATE drivers SET clearance_status = ? WHERE driver_id = ?", (status, driver_id))
-        conn.commit()
-        conn.close()
-        return True
+        return leases.resolve_clearance(driver_id, status)
     except Exception:
         return False
 
 def mission_id_exists(mid):
     """Check if mission_id already exists."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        row = conn.execute("SELECT 1 FROM missions WHERE mission_id=?", (mid,)).fetchone()
-        conn.close()
-        return row is not None
+        return db.fetchone("SELECT 1 FROM missions WHERE mission_id=?", (mid,)) is not None
     except Exception:
         return False
 
@@ -542,53 +314,36 @@ def generate_unique_mission_id():
 
 def create_mission(mid, org, dst, prio, assigned_driver_id=None, notes=None):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute(
+        db.execute(
             """
-            INSERT INTO missions (created_at, mission_id, origin, destination, priority, assigned_driver_id, status, notes)
+            INSERT INTO missions (created_at_ms, mission_id, origin, destination, priority, assigned_driver_id, status, notes)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
-            (datetime.datetime.now(), mid, org, dst, prio, assigned_driver_id, "DISPATCHED", notes or ""),
+            (db.now_ms(), mid, org, dst, prio, assigned_driver_id, "DISPATCHED", notes or ""),
         )
-        conn.commit()
-        conn.close()
         return True
     except Exception:
         try:
-            c.execute(
-                "INSERT INTO missions (created_at, mission_id, origin, destination, priority, assigned_driver_id, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (datetime.datetime.now(), mid, org, dst, prio, assigned_driver_id, "DISPATCHED"),
+            db.execute(
+                "INSERT INTO missions (created_at_ms, mission_id, origin, destination, priority, assigned_driver_id, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (db.now_ms(), mid, org, dst, prio, assigned_driver_id, "DISPATCHED"),
             )
-            conn.commit()
         except Exception:
             pass
-        conn.close()
         return True
 
 def list_missions(limit=200):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query(
-            "SELECT * FROM missions ORDER BY id DESC LIMIT ?",
-            conn,
-            params=(limit,),
-        )
-        conn.close()
-        return df
+        return db.read_sql(f"SELECT {MISSION_COLS} FROM missions ORDER BY id DESC LIMIT ?", (limit,))
     except Exception:
         return pd.DataFrame()
 
 def update_mission_assignment(mission_id, assigned_driver_id):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute(
+        db.execute(
             "UPDATE missions SET assigned_driver_id=? WHERE mission_id=?",
             (assigned_driver_id, mission_id),
         )
-        conn.commit()
-        conn.close()
         return True
     except Exception:
         return False
@@ -596,11 +351,10 @@ def update_mission_assignment(mission_id, assigned_driver_id):
 def get_mission_details(mission_id):
     """Get assigned_driver_id, origin, destination for a mission. Returns dict or None."""
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            row = conn.execute(
-                "SELECT assigned_driver_id, origin, destination FROM missions WHERE mission_id=?",
-                (mission_id,)
-            ).fetchone()
+        row = db.fetchone(
+            "SELECT assigned_driver_id, origin, destination FROM missions WHERE mission_id=?",
+            (mission_id,)
+        )
         if row:
             return {"assigned_driver_id": row[0], "origin": row[1], "destination": row[2]}
     except Exception:
@@ -609,11 +363,7 @@ def get_mission_details(mission_id):
 
 def update_mission_status(mission_id, status):
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("UPDATE missions SET status=? WHERE mission_id=?", (status, mission_id))
-        conn.commit()
-        conn.close()
+        db.execute("UPDATE missions SET status=? WHERE mission_id=?", (status, mission_id))
         return True
     except Exception:
         return False
@@ -621,45 +371,17 @@ def update_mission_status(mission_id, status):
 def mark_expired_missions():
     """Mark DISPATCHED missions as EXPIRED when past MISSION_EXPIRY_SEC. Returns count marked."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=MISSION_EXPIRY_SEC)).isoformat()
-        c.execute(
-            "UPDATE missions SET status='EXPIRED' WHERE status='DISPATCHED' AND created_at < ?",
-            (cutoff,),
-        )
-        n = c.rowcount
-        conn.commit()
-        conn.close()
-        return n
+        cur = db.execute(queries.EXPIRE_MISSIONS_SQL, (db.ago_ms(MISSION_EXPIRY_SEC),))
+        return cur.rowcount
     except Exception:
         return 0
 
 def get_driver_offline_alerts(offline_seconds=150):
     """Missions where assigned driver has last_seen > offline_seconds ago. Returns list of {mission_id, driver_id, seen_ago}."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=offline_seconds)).isoformat()
-        rows = conn.execute("""
-            SELECT m.mission_id, m.assigned_driver_id, d.last_seen
-            FROM missions m
-            INNER JOIN drivers d ON m.assigned_driver_id = d.driver_id
-            WHERE m.status = 'ACCEPTED' AND d.last_seen < ?
-        """, (cutoff,)).fetchall()
-        conn.close()
-        now = datetime.datetime.now()
-        alerts = []
-        for r in rows:
-            mid, did, last = r[0], r[1], r[2]
-            if last:
-                try:
-                    last_dt = pd.to_datetime(last, errors="coerce")
-                    if pd.notna(last_dt):
-                        seen_ago = int((now - last_dt).total_seconds())
-                        alerts.append({"mission_id": mid, "driver_id": did, "seen_ago": seen_ago})
-                except Exception:
-                    pass
-        return alerts
+        now = db.now_ms()
+        rows = db.fetchall(queries.OFFLINE_ALERTS_SQL, (now, now - offline_seconds * 1000))
+        return [{"mission_id": r[0], "driver_id": r[1], "seen_ago": int(r[2])} for r in rows]
     except Exception:
         return []
 
@@ -673,35 +395,33 @@ def get_driver_comms(limit=100, driver_id=None, conversation_mode=False):
     - driver_id="UNIT-07": filter by unit
       - conversation_mode=False: only messages FROM that driver
       - conversation_mode=True: messages from driver + messages TO that driver (HQ msgs where recipient=driver_id or 'ALL')
+    HQ messages are matched as 'HQ' <= status < 'HR' (same as LIKE 'HQ%') so the driver_comms indexes apply.
     """
     try:
-        conn = sqlite3.connect(DB_FILE)
         if driver_id is None:
-            df = pd.read_sql_query("SELECT * FROM driver_comms ORDER BY id DESC LIMIT ?", conn, params=(limit,))
-        elif conversation_mode:
-            df = pd.read_sql_query("""
-                SELECT * FROM driver_comms
-                WHERE (status NOT LIKE 'HQ%%' AND driver_id=?) OR (status LIKE 'HQ%%' AND (driver_id=? OR driver_id='ALL'))
-                ORDER BY id DESC LIMIT ?
-            """, conn, params=(driver_id, driver_id, limit))
-        else:
-            df = pd.read_sql_query(
-                "SELECT * FROM driver_comms WHERE driver_id=? AND status NOT LIKE 'HQ%%' ORDER BY id DESC LIMIT ?",
-                conn, params=(driver_id, limit),
-            )
-        conn.close()
-        return df
+            return db.read_sql(queries.ALL_COMMS_SQL, (limit,))
+        if conversation_mode:
+            return db.read_sql(queries.CONVERSATION_SQL, (driver_id, driver_id, limit))
+        return db.read_sql(queries.DRIVER_MESSAGES_SQL, (driver_id, limit))
     except Exception:
         return pd.DataFrame()
 
+def get_comms_feed(driver_id=None, conversation_mode=False, capacity=80):
+    """Per-session incremental feed for one V2X filter (kept in session_state, polled by the live fragment)."""
+    if driver_id is None:
+        scope = "all"
+    else:
+        scope = "conversation" if conversation_mode else "from_driver"
+    feeds = st.session_state.setdefault("comms_feeds", {})
+    key = (scope, driver_id)
+    if key not in feeds:
+        feeds[key] = comms.CommsFeed(scope, driver_id, capacity, DB_FILE)
+    return feeds[key]
+
 def get_driver_ids_with_messages():
     """Driver IDs who have sent messages (for unit filter dropdown)."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        rows = conn.execute(
-            "SELECT DISTINCT driver_id FROM driver_comms WHERE status NOT LIKE 'HQ%%' ORDER BY driver_id"
-        ).fetchall()
-        conn.close()
+        rows = db.fetchall(queries.DRIVERS_WITH_MESSAGES_SQL)
         return [r[0] for r in rows if r[0]]
     except Exception:
         return []
@@ -709,14 +429,10 @@ def get_driver_ids_with_messages():
 def send_hq_message(driver_id, message, msg_type="HQ_BROADCAST"):
     """Send a message from HQ to driver"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute(
-            "INSERT INTO driver_comms (timestamp, driver_id, status, message) VALUES (?, ?, ?, ?)",
-            (datetime.datetime.now(), driver_id, msg_type, message),
+        db.execute(
+            "INSERT INTO driver_comms (timestamp_ms, driver_id, status, message) VALUES (?, ?, ?, ?)",
+            (db.now_ms(), driver_id, msg_type, message),
         )
-        conn.commit()
-        conn.close()
         return True
     except Exception:
         return False
@@ -724,37 +440,25 @@ def send_hq_message(driver_id, message, msg_type="HQ_BROADCAST"):
 def get_mission_analytics():
     """Get mission statistics for engineering report"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        
         # Total missions
-        total = conn.execute("SELECT COUNT(*) FROM missions").fetchone()[0]
-        completed = conn.execute("SELECT COUNT(*) FROM missions WHERE status='COMPLETED'").fetchone()[0]
-        active = conn.execute("SELECT COUNT(*) FROM missions WHERE status IN ('DISPATCHED', 'ACCEPTED')").fetchone()[0]
+        total = db.fetchone("SELECT COUNT(*) FROM missions")[0]
+        completed = db.fetchone("SELECT COUNT(*) FROM missions WHERE status='COMPLETED'")[0]
+        active = db.fetchone("SELECT COUNT(*) FROM missions WHERE status IN ('DISPATCHED', 'ACCEPTED')")[0]
         
         # Avg response time (accepted_at - created_at) in minutes
-        resp_df = pd.read_sql_query(
-            "SELECT created_at, accepted_at FROM missions WHERE status IN ('ACCEPTED','COMPLETED') AND accepted_at IS NOT NULL",
-            conn,
+        row = db.fetchone(
+            "SELECT AVG(accepted_at_ms - created_at_ms) FROM missions WHERE status IN ('ACCEPTED','COMPLETED') AND accepted_at_ms IS NOT NULL AND created_at_ms IS NOT NULL"
         )
-        avg_response_min = 0
-        if not resp_df.empty and "created_at" in resp_df.columns and "accepted_at" in resp_df.columns:
-            resp_df["created_at"] = pd.to_datetime(resp_df["created_at"], errors="coerce")
-            resp_df["accepted_at"] = pd.to_datetime(resp_df["accepted_at"], errors="coerce")
-            resp_df["resp_sec"] = (resp_df["accepted_at"] - resp_df["created_at"]).dt.total_seconds()
-            valid = resp_df.dropna(subset=["resp_sec"])
-            if not valid.empty:
-                avg_response_min = round(valid["resp_sec"].mean() / 60, 1)
+        avg_response_min = round(row[0] / 60000, 1) if row and row[0] is not None else 0
         
         # Mission logs with time/CO2 data
-        logs_df = pd.read_sql_query("SELECT * FROM mission_logs ORDER BY id DESC LIMIT 100", conn)
+        logs_df = db.read_sql(f"""
+            SELECT id, {db.local_ts("timestamp_ms", "timestamp")}, mission_id, origin, destination, priority, time_saved, co2_saved, avg_speed
+            FROM mission_logs ORDER BY id DESC LIMIT 100
+        """)
         
         # Recent missions for timeline
-        recent_df = pd.read_sql_query(
-            "SELECT * FROM missions ORDER BY id DESC LIMIT 20",
-            conn,
-        )
-        
-        conn.close()
+        recent_df = db.read_sql(f"SELECT {MISSION_COLS} FROM missions ORDER BY id DESC LIMIT 20")
         
         return {
             "total": total,
@@ -770,24 +474,16 @@ def get_mission_analytics():
 def get_fleet_metrics():
     """Get fleet performance metrics"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        
         # Driver stats
-        drivers_df = pd.read_sql_query("SELECT * FROM drivers", conn)
-        total_drivers = len(drivers_df)
-        online_drivers = len(drivers_df[pd.to_datetime(drivers_df["last_seen"], errors="coerce") > 
-                                        (datetime.datetime.now() - datetime.timedelta(seconds=30))])
-        en_route = len(drivers_df[drivers_df["status"] == "EN_ROUTE"])
-        
-        # Telemetry history
-        telemetry_df = pd.read_sql_query(
-            "SELECT * FROM driver_state ORDER BY id DESC LIMIT 500",
-            conn,
+        row = db.fetchone(
+            "SELECT COUNT(*), COALESCE(SUM(last_seen_ms > ?), 0), COALESCE(SUM(status = 'EN_ROUTE'), 0) FROM drivers",
+            (db.ago_ms(30),),
         )
+        total_drivers, online_drivers, en_route = row
         
-        conn.close()
-        
-        avg_speed = telemetry_df["speed"].mean() if "speed" in telemetry_df.columns and not telemetry_df.empty else 0
+        # Telemetry from per-minute rollups (bounded by time window, not raw history size)
+        telemetry_df = rollups.speed_series(hours=6)
+        avg_speed = rollups.fleet_avg_speed(minutes=60)
         
         return {
             "total_drivers": total_drivers,
@@ -802,22 +498,15 @@ def get_fleet_metrics():
 def get_hazard_analytics():
     """Get hazard statistics"""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("SELECT * FROM hazards ORDER BY id DESC LIMIT 50", conn)
-        conn.close()
-        return df
+        return db.read_sql(queries.HAZARD_LOG_SQL)
     except Exception:
         return pd.DataFrame()
 
 def log_activity(action, actor, details=""):
     """Log activity for audit trail."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO activity_log (timestamp, action, actor, details) VALUES (?, ?, ?, ?)",
-                  (datetime.datetime.now(), action, actor, details))
-        conn.commit()
-        conn.close()
+        db.execute("INSERT INTO activity_log (timestamp_ms, action, actor, details) VALUES (?, ?, ?, ?)",
+                   (db.now_ms(), action, actor, details))
         return True
     except Exception:
         return False
@@ -825,56 +514,34 @@ def log_activity(action, actor, details=""):
 def get_activity_log(limit=30):
     """Get recent activity log."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("SELECT * FROM activity_log ORDER BY id DESC LIMIT ?", conn, params=(limit,))
-        conn.close()
-        return df
+        return db.read_sql(queries.ACTIVITY_LOG_SQL, (limit,))
     except Exception:
         return pd.DataFrame()
 
 def get_driver_leaderboard(limit=10):
     """Top drivers by missions completed."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        df = pd.read_sql_query("""
+        return db.read_sql("""
             SELECT assigned_driver_id as driver_id, COUNT(*) as completed
             FROM missions WHERE status='COMPLETED' AND assigned_driver_id IS NOT NULL
             GROUP BY assigned_driver_id ORDER BY completed DESC LIMIT ?
-        """, conn, params=(limit,))
-        conn.close()
-        return df
+        """, (limit,))
     except Exception:
         return pd.DataFrame()
 
 def get_missions_per_day(days=7):
     """Missions completed per day for charting."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cutoff = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat()
-        df = pd.read_sql_query("""
-            SELECT date(completed_at) as day, COUNT(*) as count
-            FROM missions WHERE status='COMPLETED' AND completed_at IS NOT NULL
-            AND completed_at >= ?
-            GROUP BY date(completed_at) ORDER BY day
-        """, conn, params=(cutoff,))
-        conn.close()
-        return df
+        return db.read_sql(queries.MISSIONS_PER_DAY_SQL, (db.ago_ms(days * 86400),))
     except Exception:
         return pd.DataFrame()
 
-def cleanup_old_driver_state(days=7):
-    """Delete driver_state rows older than X days."""
+def run_telemetry_maintenance():
+    """Roll up pending driver_state rows and apply retention now (the background worker does this every 30s)."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        cutoff = (datetime.datetime.now() - datetime.timedelta(days=days)).isoformat()
-        c.execute("DELETE FROM driver_state WHERE timestamp < ?", (cutoff,))
-        deleted = c.rowcount
-        conn.commit()
-        conn.close()
-        return deleted, None
+        return rollups.run_maintenance(DB_FILE), None
     except Exception as e:
-        return 0, str(e)
+        return None, str(e)
 
 # ==========================================
 # 2. UI STYLE ENGINE (CYBERPUNK THEME)
@@ -982,28 +649,7 @@ st.markdown(f"""
 # 3. DATA LAYER (HOSPITALS from shared_utils)
 # ==========================================
 
-SENSORS_GRID = {
-    "Edappally Toll": (10.0261, 76.3085), "Palarivattom Junc": (10.0033, 76.3063),
-    "Vyttila Hub": (9.9660, 76.3185), "Kundannoor Junc": (9.9482, 76.3180),
-    "Madhava Pharmacy": (9.9850, 76.2830), "MG Road (North)": (9.9790, 76.2760),
-    "MG Road (South)": (9.9630, 76.2880), "High Court Junc": (9.9790, 76.2760),
-    "Kaloor Stadium": (9.9940, 76.2920), "Kadavanthra Junc": (9.9670, 76.2980),
-    "SA Road": (9.9650, 76.3000), "Panampilly Nagar": (9.9600, 76.2950),
-    "Thevara Ferry": (9.9400, 76.2900), "Thoppumpady Junc": (9.9312, 76.2673),
-    "Fort Kochi": (9.9650, 76.2400), "Mattancherry": (9.9550, 76.2550),
-    "Willingdon Island": (9.9500, 76.2650), "Container Road": (10.0155, 76.2555),
-    "Kalamassery Premier": (10.0510, 76.3550), "Aluva Bypass": (10.1076, 76.3516),
-    "Aluva Pump Junc": (10.1100, 76.3500), "Companypady": (10.0800, 76.3500),
-    "HMT Junction": (10.0450, 76.3400), "Seaport-Airport Rd": (10.0384, 76.3458),
-    "Kakkanad Civil Stn": (10.0150, 76.3400), "Infopark Phase 1": (10.0100, 76.3600),
-    "Infopark Phase 2": (10.0050, 76.3700), "Tripunithura Statue": (9.9500, 76.3400),
-    "Pettah Junc": (9.9550, 76.3300), "Maradu Junc": (9.9400, 76.3200),
-    "Kumbalam Toll": (9.9100, 76.3100), "Aroor Bypass": (9.8730, 76.3070),
-    "Cheranallur Signal": (10.0400, 76.2800), "Varapuzha Bridge": (10.0600, 76.2700),
-    "Paravur Junc": (10.1500, 76.2300), "Angamaly KSRTC": (10.1900, 76.3800),
-    "Nedumbassery (Airport)": (10.1500, 76.4000), "Desom Junc": (10.1300, 76.3600),
-    "Bolgatty Junc": (9.9800, 76.2700), "Goshree Bridge": (9.9900, 76.2600)
-}
+# SENSORS_GRID (junction name -> (lat, lon)) lives in shared_utils with HOSPITALS
 
 # ==========================================
 # 4. LOGIC FUNCTIONS (TomTom via shared_utils)
@@ -1011,48 +657,70 @@ SENSORS_GRID = {
 def fetch_routes(start, end, priority_factor=1.0):
     return shared_fetch_routes(start, end, priority_factor=priority_factor, max_alternatives=3)
 
-# NOTE: Not caching this anymore to ensure we get live DB updates or random refreshes
 def get_sensors_data():
-    """Fetches live traffic flow and Signal Status"""
-    res = []
-    
-    # 1. Get Live Green Wave Statuses from DB
-    signal_status_db = get_signal_status()
-
-    def fetch(name, lat, lon):
-        try:
-            curr = random.randint(10, 70) 
-            status = "JAMMED" if curr < 15 else "HEAVY" if curr < 35 else "CLEAR"
-            
-            # --- GREEN WAVE OVERRIDE (From DB or Simulation) ---
-            # If the signal is marked GREEN_WAVE in DB, priority override
-            if signal_status_db.get(name) == "GREEN_WAVE":
-                status = "GREEN_WAVE"
-                curr = 80 # High flow
-            
-            # For Simulation Purposes if not in DB, randomly assign one
-            if random.random() < 0.05: 
-                status = "GREEN_WAVE"
-
-            return {"Area": name, "Status": status, "Flow": int(curr), "Lat": lat, "Lon": lon}
-        except: return None
-
-    with ThreadPoolExecutor(max_workers=20) as ex:
-        futures = [ex.submit(fetch, k, v[0], v[1]) for k, v in SENSORS_GRID.items()]
-        for f in futures: 
-            if f.result(): res.append(f.result())
-    return res
+    """Latest traffic flow and signal status per junction, from the shared ingestion loop (sensors.py)."""
+    return sensors.latest(DB_FILE)
 
 # ==========================================
 # 5. FRAGMENTS (PERFECT SYNC)
 # ==========================================
 
+def _live_base_key(active_org, active_dst, routes, zoom):
+    """Identity of a live map's static part: the base map is only rebuilt in the browser when this changes."""
+    return (
+        tuple(active_org) if active_org is not None else None,
+        tuple(active_dst) if active_dst is not None else None,
+        zoom,
+        tuple(r.get("polyline") or len(r.get("coords") or []) for r in routes),
+    )
+
+def _live_base_map(center, zoom, active_org, active_dst, routes, labels=False):
+    """Static layers (routes, origin/destination) of a live map; moving objects go through live_map.LiveLayer."""
+    m = live_map.attach(folium.Map(location=center, zoom_start=zoom, tiles="CartoDB dark_matter"))
+    if active_org and active_dst:
+        c_codes = ["#ff003c", "#00f3ff", "#ffcc00", "#ffffff"]
+        for i in reversed(range(len(routes))):
+            folium.PolyLine(geometry.map_coords(routes[i], zoom), color=c_codes[i % len(c_codes)], weight=5 if i == 0 else 3, opacity=0.9 if i == 0 else 0.6).add_to(m)
+        folium.Marker(list(active_org), icon=folium.Icon(color="blue", icon="play", prefix="fa"), popup="<b>📍 ORIGIN</b>" if labels else None).add_to(m)
+        folium.Marker(list(active_dst), icon=folium.Icon(color="red", icon="flag-checkered", prefix="fa"), popup="<b>🏁 DESTINATION</b>" if labels else None).add_to(m)
+    return m
+
+def _live_hazard_and_green_items(items, hazards, sensors):
+    for h in hazards:
+        items[f"h:{h.get('id') or (h['lat'], h['lon'], h['type'])}"] = live_map.hazard(h['lat'], h['lon'], h['type'])
+    for s in sensors:
+        if s['Status'] == "GREEN_WAVE":
+            items[f"g:{s['Area']}"] = live_map.green_zone(s['Lat'], s['Lon'], s['Area'])
+    return items
+
+def _render_live(layer_key, m, items, base_key, center, zoom, returned_objects=()):
+    """Ship the base map plus only what changed since the previous tick (live_map.LiveLayer)."""
+    layer = st.session_state[layer_key]
+    t0 = time.perf_counter()
+    layer.returned = st_folium(
+        m, key=layer_key, width="100%", height=600, center=center, zoom=zoom,
+        feature_group_to_add=layer.feature_group(items, base_key), returned_objects=[*returned_objects, live_map.SEQ_FIELD],
+    )
+    if deck_map.MAP_STATS:
+        st.caption(f"folium ({live_map.LIVE_MAP_MODE}): update {layer.last_bytes / 1e3:.1f} KB · {(time.perf_counter() - t0) * 1e3:.0f} ms")
+
+def _render_deck(name, center, zoom, base_key, **layers):
+    """MAP_RENDERER=deck: the same layers through deck.gl (deck_map.py). The view only resets when the route changes."""
+    views = st.session_state.setdefault("deck_views", {})
+    if name not in views or views[name][0] != base_key:
+        views[name] = (base_key, list(center))
+    t0 = time.perf_counter()
+    deck = deck_map.fleet_deck(views[name][1], zoom, **layers)
+    st.pydeck_chart(deck, key=f"deck_{name}", height=deck_map.MAP_HEIGHT)
+    if deck_map.MAP_STATS:
+        st.caption(f"deck.gl: {deck_map.payload_bytes(deck) / 1e3:.1f} KB · {(time.perf_counter() - t0) * 1e3:.0f} ms")
+
 @st.fragment(run_every=5)
 def render_live_map_fragment(active_org, active_dst, prio_factor):
     """
     Global map: all active drivers + routes + hazards.
     Refreshes every 5 seconds (reduced from 2s to prevent blinking).
-    Uses returned_objects=[] to prevent map reset on data updates.
+    The base map stays in the browser; each tick only sends moved / added / removed markers (live_map.py).
     """
     driver = get_driver_status()
     all_drivers = get_all_active_drivers(60)
@@ -1067,18 +735,18 @@ def render_live_map_fragment(active_org, active_dst, prio_factor):
     elif active_org:
         map_center = list(active_org) if hasattr(active_org, "__iter__") else active_org
 
-    m = folium.Map(location=map_center, zoom_start=zoom, tiles="CartoDB dark_matter")
-
-    # 1. DRAW ROUTE (focused mission if any)
-    if active_org and active_dst:
-        routes = fetch_routes(active_org, active_dst, prio_factor)
-        c_codes = ["#ff003c", "#00f3ff", "#ffcc00", "#ffffff"]
-        for i in reversed(range(len(routes))):
-            folium.PolyLine(routes[i]["coords"], color=c_codes[i % len(c_codes)], weight=5 if i == 0 else 3, opacity=0.9 if i == 0 else 0.6).add_to(m)
-        folium.Marker(list(active_org), icon=folium.Icon(color="blue", icon="play", prefix="fa")).add_to(m)
-        folium.Marker(list(active_dst), icon=folium.Icon(color="red", icon="flag-checkered", prefix="fa")).add_to(m)
-
-    # 2. DRAW ALL ACTIVE DRIVERS (global view)
+    # 1. STATIC: ROUTE (focused mission if any)
+    routes = fetch_routes(active_org, active_dst, prio_factor) if active_org and active_dst else []
+    base_key = _live_base_key(active_org, active_dst, routes, zoom)
+    if deck_map.MAP_RENDERER == "deck":
+        _render_deck("hq", map_center, zoom, base_key, routes=routes, drivers=all_drivers, hazards=hazards, sensors=sensors,
+                     origin=active_org if routes else None, destination=active_dst if routes else None)
+        return
+    layer = st.session_state.setdefault("live_map_hq", live_map.LiveLayer())
+    m = _live_base_map(layer.anchor(base_key, map_center), zoom, active_org, active_dst, routes)
+
+    # 2. ALL ACTIVE DRIVERS (global view)
+    items = {}
     for _, row in all_drivers.iterrows():
         lat, lon = row.get("current_lat"), row.get("current_lon")
         if pd.isna(lat) or pd.isna(lon):
@@ -1087,39 +755,12 @@ def render_live_map_fragment(active_org, active_dst, prio_factor):
         status = row.get("status", "?")
         speed = row.get("speed")
         spd = f" {int(speed)} km/h" if speed is not None and not pd.isna(speed) else ""
-        folium.Marker(
-            [float(lat), float(lon)],
-            icon=folium.Icon(color="green" if status == "EN_ROUTE" else "gray", icon="ambulance", prefix="fa"),
-            popup=f"{did} | {status}{spd}",
-        ).add_to(m)
+        items[f"d:{did}"] = live_map.driver(lat, lon, "green" if status == "EN_ROUTE" else "gray", driver_id=did, status=status, speed=spd)
 
-    # 3. DRAW HAZARDS
-    for h in hazards:
-        folium.Marker(
-            [h['lat'], h['lon']],
-            icon=folium.Icon(color="orange", icon="exclamation-triangle", prefix="fa"),
-            tooltip=f"{h['type']}"
-        ).add_to(m)
+    # 3. HAZARDS + 4. GREEN WAVE (Glowing Circles)
+    _live_hazard_and_green_items(items, hazards, sensors)
 
-    # 4. DRAW GREEN WAVE (Glowing Circles)
-    for s in sensors:
-        if s['Status'] == "GREEN_WAVE":
-            folium.Circle(
-                location=[s['Lat'], s['Lon']],
-                radius=300,
-                color="#00ff00",
-                fill=True,
-                fill_color="#00ff00",
-                fill_opacity=0.3,
-                popup=f"GREEN WAVE: {s['Area']}"
-            ).add_to(m)
-
-    # Use returned_objects=[] to prevent map from resetting/blinking on updates
-    st_folium(m, width="100%", height=600, returned_objects=[])
-
-def _safe_html(s):
-    if s is None or pd.isna(s): return "—"
-    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+    _render_live("live_map_hq", m, items, base_key, map_center, zoom)
 
 def render_live_tracking_map(active_org, active_dst, prio_factor, focus_driver_id=None):
     """Live map: ambulance drivers' live location, status, ghost trail. Simulates position when no real-time GPS."""
@@ -1128,8 +769,6 @@ def render_live_tracking_map(active_org, active_dst, prio_factor, focus_driver_i
     if drv_live and not driver:
         driver = drv_live
     all_drivers = get_drivers_for_live_map(60)
-    profiles = get_driver_profiles(all_drivers["driver_id"].tolist() if not all_drivers.empty else [])
-    hazards = get_hazards()
     ghost_trail = get_ghost_trail_for_driver(focus_driver_id, 50) if focus_driver_id else []
     if focus_driver_id and len(ghost_trail) < 2:
         mission = get_current_mission_for_driver(focus_driver_id)
@@ -1162,16 +801,30 @@ def render_live_tracking_map(active_org, active_dst, prio_factor, focus_driver_i
         except (TypeError, ValueError, KeyError):
             pass
     
-    m = folium.Map(location=map_center, zoom_start=zoom, tiles="CartoDB dark_matter")
+    routes = fetch_routes(active_org, active_dst, prio_factor) if active_org and active_dst else []
+    base_key = _live_base_key(active_org, active_dst, routes, zoom)
+    deck = deck_map.MAP_RENDERER == "deck"
+    layer = None if deck else st.session_state.setdefault("live_map_tracking", live_map.LiveLayer())
+    anchor = map_center if deck else layer.anchor(base_key, map_center)
+    # Viewport: what the browser last showed (plus a margin), or the view estimated from center / zoom before it
+    # has reported bounds (deck.gl never does). Both renderers take hazards in it from the spatial index
+    view, view_zoom = map_layers.viewport(layer.returned if layer else None, map_center, zoom)
+    bbox = map_layers.expand(view)
+    hazards = spatial_index.get_hazard_index(DB_FILE).within(*bbox, limit=map_layers.MAX_HAZARDS_IN_VIEW)
+    if deck:
+        # WebGL draws the whole fleet; no unit culling or clustering needed
+        _render_deck("tracking", map_center, zoom, base_key, routes=routes, drivers=all_drivers, hazards=hazards, sensors=sensors,
+                     trail=ghost_trail if focus_driver_id else None, origin=active_org if routes else None,
+                     destination=active_dst if routes else None, focus=focus_driver_id)
+        return
+    m = _live_base_map(anchor, zoom, active_org, active_dst, routes, labels=True)
     
-    if active_org and active_dst:
-        routes = fetch_routes(active_org, active_dst, prio_factor)
-        c_codes = ["#ff003c", "#00f3ff", "#ffcc00", "#ffffff"]
-        for i in reversed(range(len(routes))):
-            folium.PolyLine(routes[i]["coords"], color=c_codes[i % len(c_codes)], weight=5 if i == 0 else 3, opacity=0.9 if i == 0 else 0.6).add_to(m)
-        folium.Marker(list(active_org), icon=folium.Icon(color="blue", icon="play", prefix="fa"), popup="<b>📍 ORIGIN</b>").add_to(m)
-        folium.Marker(list(active_dst), icon=folium.Icon(color="red", icon="flag-checkered", prefix="fa"), popup="<b>🏁 DESTINATION</b>").add_to(m)
+    if not all_drivers.empty:
+        keep = map_layers.in_bbox(all_drivers["current_lat"], all_drivers["current_lon"], bbox) | (all_drivers["driver_id"] == focus_driver_id)
+        all_drivers = all_drivers[keep]
+    profiles = get_driver_profiles(all_drivers["driver_id"].tolist() if not all_drivers.empty else [])
     
+    items = {}
     for _, row in all_drivers.iterrows():
         lat, lon = row.get("current_lat"), row.get("current_lon")
         if pd.isna(lat) or pd.isna(lon):
@@ -1183,52 +836,52 @@ def render_live_tracking_map(active_org, active_dst, prio_factor, focus_driver_i
         dest = row.get("destination") or "—"
         spd = f" {int(speed)} km/h" if speed is not None and not pd.isna(speed) else ""
         prof = profiles.get(did, {})
-        fname = prof.get("full_name", "—")
-        vnum = prof.get("vehicle_id", "—")
-        is_focus = did == focus_driver_id
-        popup_html = f"""
-        <div style="min-width:200px; font-family:sans-serif; font-size:12px;">
-            <div style="font-size:24px; margin-bottom:8px;">🚑 <b>{_safe_html(did)}</b>{" (TRACKED)" if is_focus else ""}</div>
-            <div style="border-bottom:1px solid #333; padding-bottom:6px; margin-bottom:6px;">
-                <div><b>Driver:</b> {_safe_html(fname)}</div>
-                <div><b>Vehicle:</b> {_safe_html(vnum)}</div>
-                <div><b>Unit ID:</b> {_safe_html(did)}</div>
-            </div>
-            <div style="color:#00f3ff;"><b>From:</b> {_safe_html(origin)}</div>
-            <div style="color:#00ff9d;"><b>To:</b> {_safe_html(dest)}</div>
-            <div style="margin-top:6px; color:#888;">{status}{spd}</div>
-        </div>
-        """
-        folium.Marker(
-            [float(lat), float(lon)],
-            icon=folium.Icon(color="green" if status == "EN_ROUTE" else "blue" if status == "IDLE" else "gray", icon="ambulance", prefix="fa"),
-            popup=folium.Popup(popup_html, max_width=280),
-            tooltip=f"🚑 {did} — {fname} ({status})",
-        ).add_to(m)
+        # Popup / tooltip come from map_layers.TEMPLATES["driver_card"], filled (escaped) in the browser
+        items[f"d:{did}"] = live_map.driver(
+            lat, lon, "green" if status == "EN_ROUTE" else "blue" if status == "IDLE" else "gray", template="driver_card",
+            driver_id=did, status=status, speed=spd, origin=origin, destination=dest, tracked=" (TRACKED)" if did == focus_driver_id else "",
+            full_name=prof.get("full_name", "—"), vehicle_id=prof.get("vehicle_id", "—"),
+        )
     
     if focus_driver_id and len(ghost_trail) > 1:
-        folium.PolyLine(ghost_trail, color="#00ff9d", weight=3, dash_array="5, 10", opacity=0.7).add_to(m)
-    
-    for h in hazards:
-        folium.Marker([h['lat'], h['lon']], icon=folium.Icon(color="orange", icon="exclamation-triangle", prefix="fa"), tooltip=h['type']).add_to(m)
-    for s in sensors:
-        if s['Status'] == "GREEN_WAVE":
-            folium.Circle(location=[s['Lat'], s['Lon']], radius=300, color="#00ff00", fill=True, fill_color="#00ff00", fill_opacity=0.3, popup=f"GREEN WAVE: {s['Area']}").add_to(m)
+        items["trail"] = live_map.trail(ghost_trail)
     
-    st_folium(m, width="100%", height=600, returned_objects=[])
+    _live_hazard_and_green_items(items, hazards, sensors)
+    # Zoomed out: grid clusters instead of individual markers (the tracked unit is always drawn)
+    items = map_layers.cluster(map_layers.cull(items, bbox), view_zoom, keep={f"d:{focus_driver_id}", "trail"})
+    _render_live("live_map_tracking", m, items, base_key, map_center, zoom, returned_objects=("bounds", "zoom"))
+
+def _sparkline_svg(values, color, width=120, height=22):
+    """Inline SVG polyline for a short series (empty string if fewer than 2 points)."""
+    if len(values) < 2:
+        return ""
+    lo, hi = min(values), max(values)
+    span = (hi - lo) or 1.0
+    step = width / (len(values) - 1)
+    pts = " ".join(f"{i * step:.1f},{height - (v - lo) / span * (height - 2) - 1:.1f}" for i, v in enumerate(values))
+    return f'<svg width="{width}" height="{height}" style="display:block; margin:4px 0;"><polyline points="{pts}" fill="none" stroke="{color}" stroke-width="1.5"/></svg>'
 
 @st.fragment(run_every=2)
 def render_sensor_grid_fragment():
     """
     Independent Sensor Grid refresh.
     """
-    data = get_sensors_data()
+    ingestor = sensors.ensure_worker(DB_FILE)
+    data = ingestor.latest()
+    stats = ingestor.stats()
     # Sort: Green Wave & Jammed first
     data.sort(key=lambda x: 0 if x['Status']=="GREEN_WAVE" else 1 if x['Status']=="JAMMED" else 2)
     
     cols = st.columns(4)
     for i, d in enumerate(data):
         c = "#00ff00" if d['Status']=="GREEN_WAVE" else "#ff003c" if d['Status']=="JAMMED" else "#ffaa00" if d['Status']=="HEAVY" else "#00e5ff"
+        s = stats.get(d['Area']) or {}
+        if s.get("samples"):
+            trend = "▲" if s["trend"] > 1 else "▼" if s["trend"] < -1 else "▬"
+            jam = f" · slow {int(s['congested_sec'] // 60)}m" if s["congested_sec"] >= 60 else ""
+            detail = f"avg {s['mean']:.0f} · p10 {s['p10']:.0f} · {trend}{jam}"
+        else:
+            detail = ""
         with cols[i%4]: 
             st.markdown(f"""
             <div class="titan-card" style="border-left-color:{c}; padding:10px;">
@@ -1237,6 +890,8 @@ def render_sensor_grid_fragment():
                     <span style="font-family:'Orbitron'; font-size:18px; color:{c};">{d['Flow']} KM/H</span>
                     <span style="font-size:10px;">{d['Status']}</span>
                 </div>
+                {_sparkline_svg(ingestor.sparkline(d['Area']), c)}
+                <div style="font-size:10px; color:#888;">{detail}</div>
             </div>""", unsafe_allow_html=True)
 
 
@@ -1278,26 +933,20 @@ def render_home():
 def operator_signup(username, password, display_name):
     """Register new operator. Returns (True, None) on success else (False, error_msg)."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        if c.execute("SELECT 1 FROM operators WHERE username=?", (username.strip(),)).fetchone():
-            conn.close()
-            return False, "Username already taken."
-        c.execute(
-            "INSERT INTO operators (username, password, display_name) VALUES (?, ?, ?)",
-            (username.strip(), hash_password(password), (display_name or username).strip()),
-        )
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            if conn.execute("SELECT 1 FROM operators WHERE username=?", (username.strip(),)).fetchone():
+                return False, "Username already taken."
+            conn.execute(
+                "INSERT INTO operators (username, password, display_name) VALUES (?, ?, ?)",
+                (username.strip(), hash_password(password), (display_name or username).strip()),
+            )
         return True, None
     except Exception as e:
         return False, str(e)
 
 def _verify_operator_password(uid, key):
     """Verify operator credentials. Supports hashed and legacy plain."""
-    conn = sqlite3.connect(DB_FILE)
-    row = conn.execute("SELECT username, password FROM operators WHERE username=?", (uid.strip(),)).fetchone()
-    conn.close()
+    row = db.fetchone("SELECT username, password FROM operators WHERE username=?", (uid.strip(),))
     if not row:
         return False
     _, stored = row
@@ -1399,12 +1048,9 @@ def render_dashboard():
             org_c = HOSPITALS.get(org)
             driver_opts = ["AUTO / ANY AVAILABLE"]
             if not drivers_df.empty and org_c:
-                # Sort by proximity to origin
-                with_dist = []
-                for _, row in drivers_df.iterrows():
-                    lat, lon = row.get("current_lat"), row.get("current_lon")
-                    d = distance_km(org_c[0], org_c[1], float(lat or 10), float(lon or 76)) if pd.notna(lat) and pd.notna(lon) else 999
-                    with_dist.append((row["driver_id"], row.get("status","?"), d))
+                # Sort by proximity to origin (one vectorized pass over the fleet)
+                dists = np.nan_to_num(distances_km(org_c[0], org_c[1], drivers_df["current_lat"], drivers_df["current_lon"]), nan=999)
+                with_dist = list(zip(drivers_df["driver_id"], drivers_df["status"].fillna("?"), dists.tolist()))
                 with_dist.sort(key=lambda x: (0 if x[1]=="IDLE" else 1, x[2]))
                 driver_opts += [f"{d[0]} ({d[2]}km)" for d in with_dist]
             else:
@@ -1460,6 +1106,11 @@ def render_dashboard():
     @st.fragment(run_every=5)
     def _driver_online_detector():
         try:
+            # Nothing visible changed since this session's last check: no diff, no toasts
+            snap = fleet_snapshot.current(DB_FILE)
+            if st.session_state.get("fleet_version_seen") == snap.version:
+                return
+            st.session_state.fleet_version_seen = snap.version
             drivers_df = get_available_drivers()
             if drivers_df.empty or "driver_id" not in drivers_df.columns:
                 current_ids = set()
@@ -1514,8 +1165,11 @@ def render_dashboard():
             fetch_key = (org, dst, prio_label)
             if org != dst and org in HOSPITALS and dst in HOSPITALS:
                 if st.session_state.get("mc_fetch_key") != fetch_key:
-                    with st.spinner("Loading routes..."):
-                        st.session_state.mc_routes = fetch_routes(HOSPITALS[org], HOSPITALS[dst], prio_factor)
+                    # Precomputed matrix first (instant); live TomTom only for pairs not yet in it
+                    st.session_state.mc_routes = route_matrix.preview(org, dst, prio_factor, db_file=DB_FILE)
+                    if not st.session_state.mc_routes:
+                        with st.spinner("Loading routes..."):
+                            st.session_state.mc_routes = fetch_routes(HOSPITALS[org], HOSPITALS[dst], prio_factor)
                     st.session_state.mc_fetch_key = fetch_key
                 st.session_state.mc_submitted_org = org
                 st.session_state.mc_submitted_dst = dst
@@ -1539,29 +1193,27 @@ def render_dashboard():
                 driver_proximity = []
             else:
                 profiles = get_driver_profiles(drivers_df["driver_id"].tolist())
+                rows = {r["driver_id"]: r for r in drivers_df.to_dict("records")}
+                # Nearest IDLE units first, then busy ones, straight from the live driver index
+                if org_coords:
+                    svc = fleet_snapshot.get_service(DB_FILE)
+                    is_idle = lambda d: d in rows and rows[d].get("status") == "IDLE"
+                    ranked = svc.nearest_drivers(org_coords[0], org_coords[1], 10, where=is_idle)
+                    ranked += svc.nearest_drivers(org_coords[0], org_coords[1], 10, where=lambda d: d in rows and not is_idle(d))
+                else:
+                    ranked = [(did, 999) for did in rows]
                 driver_proximity = []
-                for _, row in drivers_df.iterrows():
-                    did = row.get("driver_id", "?")
-                    lat, lon = row.get("current_lat"), row.get("current_lon")
+                for did, dist in ranked:
+                    row = rows[did]
                     prof = profiles.get(did, {})
-                    full_name = prof.get("full_name") or did
-                    if pd.notna(lat) and pd.notna(lon) and org_coords:
-                        dist = distance_km(org_coords[0], org_coords[1], float(lat), float(lon))
-                        driver_proximity.append({
-                            "driver_id": did,
-                            "full_name": full_name,
-                            "status": row.get("status", "?"),
-                            "distance_km": dist,
-                            "lat": lat, "lon": lon
-                        })
-                    else:
-                        driver_proximity.append({
-                            "driver_id": did,
-                            "full_name": full_name,
-                            "status": row.get("status", "?"),
-                            "distance_km": 999,
-                            "lat": None, "lon": None
-                        })
+                    driver_proximity.append({
+                        "driver_id": did,
+                        "full_name": prof.get("full_name") or did,
+                        "status": row.get("status", "?"),
+                        "distance_km": dist,
+                        "lat": row.get("current_lat") if dist != 999 else None,
+                        "lon": row.get("current_lon") if dist != 999 else None,
+                    })
                 driver_proximity.sort(key=lambda x: (0 if x["status"] == "IDLE" else 1, x["distance_km"]))
                 
                 for d in driver_proximity[:10]:
@@ -1587,6 +1239,8 @@ def render_dashboard():
         
         mc_routes = st.session_state.get("mc_routes", [])
         if mc_routes:
+            # Re-rank by predicted congestion on each corridor at the time it will be driven
+            mc_routes = forecast.rank_routes(list(mc_routes), sensors.ensure_worker(DB_FILE).forecaster)
             route_cols = st.columns(min(4, len(mc_routes)))
             colors = ["#ff003c", "#00f3ff", "#ffcc00", "#00ff9d"]
             
@@ -1594,6 +1248,9 @@ def render_dashboard():
                 with route_cols[idx]:
                     c = colors[idx % len(colors)]
                     delay = route.get('traffic_delay_min', 0) or 0
+                    fc = route.get("forecast") or {}
+                    fc_color = "#ff003c" if fc.get("status") == "JAMMED" else "#ffaa00" if fc.get("status") == "HEAVY" else "#00ff9d"
+                    fc_line = f"🔮 {fc['status']} in {fc['horizon_min']} min • {fc['delay_min']:+.0f} min" if fc.get("status") else "🔮 no sensors on corridor"
                     st.markdown(f"""
                     <div class="titan-card" style="border-left-color:{c}; padding:20px; cursor:pointer;">
                         <div style="font-size:11px; color:#888; margin-bottom:4px;">{route.get('route_type', '')}</div>
@@ -1602,6 +1259,7 @@ def render_dashboard():
                             <span>📍 {route.get('dist', 0)} km</span>
                             <span style="color:{'#ff003c' if delay>3 else '#00ff9d'}">+{delay} min delay</span>
                         </div>
+                        <div style="font-size:11px; margin-top:6px; color:{fc_color};">{fc_line}</div>
                     </div>
                     """, unsafe_allow_html=True)
             
@@ -1612,13 +1270,16 @@ def render_dashboard():
             mc_map = folium.Map(location=org_coords, zoom_start=12, tiles="CartoDB dark_matter")
             c_codes = ["#ff003c", "#00f3ff", "#ffcc00", "#00ff9d"]
             for i, route in enumerate(mc_routes[:4]):
-                coords = route.get("coords", [])
+                coords = geometry.map_coords(route, 12)
                 if coords:
                     folium.PolyLine(coords, color=c_codes[i % len(c_codes)], weight=5 if i == 0 else 3, opacity=0.9 if i == 0 else 0.6).add_to(mc_map)
             folium.Marker(org_coords, icon=folium.Icon(color="blue", icon="play", prefix="fa"), popup=f"<b>📍 ORIGIN</b><br>{org}").add_to(mc_map)
             folium.Marker(dst_coords, icon=folium.Icon(color="red", icon="flag-checkered", prefix="fa"), popup=f"<b>🏁 DESTINATION</b><br>{dst}").add_to(mc_map)
             st_folium(mc_map, width="100%", height=400, returned_objects=[])
-            st.caption(f"Best ETA: {mc_routes[0].get('eta', 0)} min • {mc_routes[0].get('dist', 0)} km — {mc_routes[0].get('route_type', 'Fastest')}")
+            best_caption = f"Best ETA: {mc_routes[0].get('eta', 0)} min (forecast {mc_routes[0].get('eta_forecast', mc_routes[0].get('eta', 0))} min) • {mc_routes[0].get('dist', 0)} km — {mc_routes[0].get('route_type', 'Fastest')}"
+            if mc_routes[0].get("fetched_at_ms"):
+                best_caption += f" • typical traffic (precomputed {datetime.datetime.fromtimestamp(mc_routes[0]['fetched_at_ms'] / 1000):%d %b %H:%M})"
+            st.caption(best_caption)
             
             st.markdown("---")
             st.markdown("""
@@ -2049,13 +1710,13 @@ def render_dashboard():
             st.markdown("### 📊 Fleet Speed Analysis")
             telemetry = fleet_stats['telemetry']
             if not telemetry.empty and 'speed' in telemetry.columns:
-                # Speed over time
+                # Per-minute average speed over time (driver_state_1m rollups)
                 telemetry['timestamp'] = pd.to_datetime(telemetry['timestamp'], errors='coerce')
                 telemetry_clean = telemetry.dropna(subset=['speed', 'timestamp'])
                 
                 if not telemetry_clean.empty:
                     fig_speed = px.line(
-                        telemetry_clean.head(100),
+                        telemetry_clean,
                         x='timestamp',
                         y='speed',
                         color='driver_id' if 'driver_id' in telemetry_clean.columns else None,
@@ -2210,13 +1871,17 @@ def render_dashboard():
         # Data cleanup
         st.markdown("---")
         st.markdown("### 🧹 Data Maintenance")
-        if st.button("🗑️ Clean old telemetry (7+ days)", key="cleanup_btn"):
-            deleted, err = cleanup_old_driver_state(7)
+        st.caption(f"Raw telemetry is rolled up per minute/hour and kept for {rollups.RAW_RETENTION_HOURS}h; "
+                   f"minute rollups {rollups.MINUTE_RETENTION_DAYS}d, hourly {rollups.HOUR_RETENTION_DAYS}d.")
+        if st.button("🗑️ Roll up & prune telemetry now", key="cleanup_btn"):
+            result, err = run_telemetry_maintenance()
             if err:
                 st.error(f"Cleanup failed: {err}")
             else:
-                st.success(f"Deleted {deleted} old driver_state rows.")
-                log_activity("CLEANUP", st.session_state.get("operator_id", "HQ"), f"Removed {deleted} rows")
+                pruned = result["pruned"]
+                st.success(f"Rolled up {result['rolled_up']} rows; pruned {pruned['raw']} raw, "
+                           f"{pruned['minute']} minute and {pruned['hour']} hourly rows.")
+                log_activity("CLEANUP", st.session_state.get("operator_id", "HQ"), f"Removed {pruned['raw']} raw rows")
                 st.rerun()
         
         # System Health
@@ -2264,28 +1929,21 @@ def render_dashboard():
             @st.fragment(run_every=2)
             def _comms_feed_live():
                 driver_id_filter = None if filter_unit == "All units" else filter_unit
-                comms_df = get_driver_comms(80, driver_id=driver_id_filter, conversation_mode=show_conversation)
-                # SOS prioritization: CRITICAL first, then WARNING, then rest
-                if not comms_df.empty and 'status' in comms_df.columns:
-                    def _prio(s):
-                        if s == 'CRITICAL': return 0
-                        if s in ('WARNING', 'REQUEST'): return 1
-                        return 2
-                    comms_df = comms_df.copy()
-                    comms_df['_prio'] = comms_df['status'].apply(_prio)
-                    comms_df = comms_df.sort_values(['_prio', 'id'], ascending=[True, False]).drop(columns=['_prio'], errors='ignore')
-                total = len(comms_df)
-                reqs = len(comms_df[comms_df['status'] == 'REQUEST']) if not comms_df.empty and 'status' in comms_df.columns else 0
-                warns = len(comms_df[comms_df['status'].isin(['WARNING', 'CRITICAL'])]) if not comms_df.empty and 'status' in comms_df.columns else 0
-                sos_count = len(comms_df[comms_df['status'] == 'CRITICAL']) if not comms_df.empty and 'status' in comms_df.columns else 0
+                # Incremental: only rows newer than the feed's cursor are read; SOS buckets are kept by the feed
+                feed = get_comms_feed(driver_id_filter, show_conversation)
+                feed.poll()
+                total = len(feed)
+                reqs = feed.count('REQUEST')
+                warns = feed.count('WARNING', 'CRITICAL')
+                sos_count = feed.count('CRITICAL')
                 
                 # Sticky CRITICAL alerts section — never scrolls away
-                critical_df = comms_df[comms_df['status'].isin(['CRITICAL', 'WARNING', 'REQUEST'])] if not comms_df.empty and 'status' in comms_df.columns else pd.DataFrame()
-                if not critical_df.empty:
+                critical_rows = feed.alerts(10)
+                if critical_rows:
                     if sos_count > 0:
                         st.markdown("<style>@keyframes pulse { 50% { opacity: 0.85; box-shadow: 0 0 30px rgba(255,0,60,0.6); } }</style>", unsafe_allow_html=True)
                     st.markdown("**🚨 CRITICAL ALERTS** — Never miss these")
-                    for _, row in critical_df.head(10).iterrows():
+                    for row in critical_rows:
                         ts, did, sts, msg = row.get('timestamp',''), row.get('driver_id','?'), row.get('status',''), row.get('message','')
                         c = "#ff003c" if sts == 'CRITICAL' else "#ff6600" if sts == 'WARNING' else "#ffcc00"
                         dir_label = "←" if 'HQ' not in sts else "→"
@@ -2302,8 +1960,8 @@ def render_dashboard():
                 if sos_count > 0:
                     header += f" | 🚨 SOS: {sos_count}"
                 st.markdown(header)
-                if not comms_df.empty:
-                    for _, row in comms_df.head(40).iterrows():
+                if total:
+                    for row in feed.ordered()[:40]:
                         timestamp = row.get('timestamp', '')
                         driver_id = row.get('driver_id', 'UNKNOWN')
                         status = row.get('status', 'INFO')
@@ -2419,30 +2077,24 @@ def render_dashboard():
             
             # Signal Control — in expander (separate from comms)
             with st.expander("🚦 Traffic Signal Control", expanded=False):
+                auto = green_wave.ensure_worker(DB_FILE).active
+                if auto:
+                    st.caption("Auto green wave: " + " • ".join(f"{j} ({mid}, {eta:.0f}s)" for j, (mid, eta) in sorted(auto.items(), key=lambda kv: kv[1][1])))
+                else:
+                    st.caption("Auto green wave: no unit approaching a junction")
                 signal_name = st.selectbox("Select Junction", list(SENSORS_GRID.keys())[:10], key="v2x_signal")
                 sig_cols = st.columns(2)
                 with sig_cols[0]:
                     if st.button("🟢 SET GREEN", use_container_width=True, key="set_green"):
                         try:
-                            conn = sqlite3.connect(DB_FILE)
-                            c = conn.cursor()
-                            c.execute(
-                                "INSERT OR REPLACE INTO signal_status (stop_id, status, last_updated) VALUES (?, ?, ?)",
-                                (signal_name, "GREEN_WAVE", datetime.datetime.now())
-                            )
-                            conn.commit()
-                            conn.close()
-                            st.success(f"Green Wave set for {signal_name}")
+                            leases.set_green(signal_name)
+                            st.success(f"Green Wave set for {signal_name} ({leases.MANUAL_GREEN_TTL_SEC // 60} min)")
                         except Exception:
                             st.error("Failed to update signal")
                 with sig_cols[1]:
                     if st.button("🔴 RESET", use_container_width=True, key="reset_sig"):
                         try:
-                            conn = sqlite3.connect(DB_FILE)
-                            c = conn.cursor()
-                            c.execute("DELETE FROM signal_status WHERE stop_id = ?", (signal_name,))
-                            conn.commit()
-                            conn.close()
+                            leases.reset_signal(signal_name)
                             st.info(f"Signal reset for {signal_name}")
                         except Exception:
                             st.error("Failed to reset signal")
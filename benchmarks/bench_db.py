@@ -0,0 +1,54 @@
+"""
+Connection-open overhead per dashboard rerun: connect-per-call (the old helpers) vs db.ConnectionManager.
+
+    python benchmarks/bench_db.py
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+def bench_rerun(helper_calls=40, reruns=50):
+    """Simulate an HQ rerun (`helper_calls` small queries) with connect-per-call vs pooled."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed = sqlite3.connect(path)
+        seed.execute("CREATE TABLE drivers (driver_id TEXT PRIMARY KEY, status TEXT, last_seen DATETIME)")
+        seed.executemany("INSERT INTO drivers VALUES (?, 'IDLE', datetime('now'))", [(f"UNIT-{i}",) for i in range(200)])
+        seed.commit()
+        seed.close()
+        sql = "SELECT status FROM drivers WHERE driver_id=?"
+
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            for i in range(helper_calls):
+                conn = sqlite3.connect(path)
+                conn.execute("PRAGMA journal_mode=WAL;")
+                conn.execute("PRAGMA busy_timeout=5000;")
+                conn.execute(sql, (f"UNIT-{i}",)).fetchone()
+                conn.close()
+        before = (time.perf_counter() - t0) / reruns
+
+        mgr = db.ConnectionManager(path)
+        t0 = time.perf_counter()
+        for _ in range(reruns):
+            for i in range(helper_calls):
+                mgr.fetchone(sql, (f"UNIT-{i}",))
+        after = (time.perf_counter() - t0) / reruns
+        opened = mgr.opened
+        mgr.close_all()
+
+    print(f"{helper_calls} helper calls per rerun, {reruns} reruns")
+    print(f"  connect-per-call: {before * 1000:.2f} ms/rerun, {helper_calls} connections opened per rerun")
+    print(f"  pooled:           {after * 1000:.2f} ms/rerun, {opened} connection(s) opened in total")
+    return before, after
+
+
+if __name__ == "__main__":
+    bench_rerun()
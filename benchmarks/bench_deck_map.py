@@ -0,0 +1,44 @@
+"""
+deck.gl payload and build time vs the folium live-map keyframe, 50 to 5,000 units.
+
+    python benchmarks/bench_deck_map.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import deck_map  # noqa: E402
+import live_map  # noqa: E402
+
+
+def bench(fleet=(50, 500, 5000), repeat=3):
+    rng = random.Random(0)
+    for n in fleet:
+        df = pd.DataFrame({
+            "driver_id": [f"UNIT-{i}" for i in range(n)],
+            "status": [rng.choice(["EN_ROUTE", "IDLE"]) for _ in range(n)],
+            "current_lat": [9.9 + rng.random() * 0.2 for _ in range(n)],
+            "current_lon": [76.25 + rng.random() * 0.2 for _ in range(n)],
+            "speed": [rng.randint(0, 80) for _ in range(n)],
+        })
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            size = deck_map.payload_bytes(deck_map.fleet_deck((10.015, 76.34), 12, drivers=df))
+        t_deck = (time.perf_counter() - t0) / repeat
+        items = {f"d:{r.driver_id}": live_map.driver(r.current_lat, r.current_lon, "green", driver_id=r.driver_id,
+                                                     status=r.status, speed=f" {r.speed} km/h")
+                 for r in df.itertuples()}
+        t0 = time.perf_counter()
+        key = live_map.LiveLayer(keyframe_ticks=0).diff(items, "base")
+        t_key = time.perf_counter() - t0
+        print(f"{n:,} units: deck {size / 1e3:.0f} KB in {t_deck * 1e3:.0f} ms | folium keyframe "
+              f"{len(key) / 1e3:.0f} KB in {t_key * 1e3:.0f} ms (items built outside the timer)")
+
+
+if __name__ == "__main__":
+    bench()
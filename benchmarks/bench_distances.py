@@ -0,0 +1,43 @@
+"""
+Scalar distance_km loop vs the vectorized kernels (one-to-many and the hospital x driver matrix).
+
+    python benchmarks/bench_distances.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from shared_utils import HOSPITALS, distance_km, distance_matrix_km, distances_km  # noqa: E402
+
+
+def bench(sizes=(10, 1000, 100000), repeat=5):
+    rng = np.random.default_rng(0)
+    origin = HOSPITALS["Amrita AIMS (Edappally)"]
+    hosp = np.array(list(HOSPITALS.values()))
+    for n in sizes:
+        lats = 9.9 + rng.random(n) * 0.3
+        lons = 76.2 + rng.random(n) * 0.2
+        pts = list(zip(lats.tolist(), lons.tolist()))
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            scalar = [distance_km(origin[0], origin[1], la, lo) for la, lo in pts]
+        t_scalar = (time.perf_counter() - t0) / repeat
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            vec = distances_km(origin[0], origin[1], lats, lons)
+        t_vec = (time.perf_counter() - t0) / repeat
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            distance_matrix_km(hosp[:, 0], hosp[:, 1], lats, lons)
+        t_mat = (time.perf_counter() - t0) / repeat
+        err = float(np.max(np.abs(np.asarray(scalar) - vec)))
+        print(f"{n:>7,} drivers: scalar loop {t_scalar * 1000:9.3f} ms | one-to-many {t_vec * 1000:7.3f} ms "
+              f"({t_scalar / t_vec:6.1f}x) | {len(hosp)} hospitals x {n:,} matrix {t_mat * 1000:8.3f} ms | max err {err:.1e} km")
+
+
+if __name__ == "__main__":
+    bench()
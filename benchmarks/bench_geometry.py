@@ -0,0 +1,36 @@
+"""
+Payload/memory of a TomTom-density route: raw coordinate lists vs the stored polyline vs per-zoom map payloads.
+
+    python benchmarks/bench_geometry.py
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import geometry  # noqa: E402
+
+
+def bench(points=2000):
+    # Synthetic route with a point every ~5 m
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, 1, points)
+    raw = np.column_stack([10.0 + 0.09 * t + 0.002 * np.sin(t * 40), 76.28 + 0.07 * t]) + rng.normal(0, 2e-6, (points, 2))
+    coords = raw.tolist()
+    t0 = time.perf_counter()
+    route = geometry.compact({"coords": coords})
+    t_compact = time.perf_counter() - t0
+    list_bytes = sys.getsizeof(coords) + sum(sys.getsizeof(p) + 2 * 24 for p in coords)
+    print(f"raw:     {len(coords)} points, ~{list_bytes:,} B as lists, {len(json.dumps(coords)):,} B JSON")
+    print(f"stored:  {len(route['coords'])} points, {len(route['polyline']):,} B polyline ({t_compact * 1e3:.1f} ms to compact)")
+    for z in (12, 14, 16):
+        pts = geometry.map_coords(route, z, headroom=0)
+        print(f"zoom {z}: {len(pts)} points, {len(json.dumps(pts)):,} B JSON to the browser")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,41 @@
+"""
+Live-map payload per tick vs fleet size: full redraw every tick vs incremental diffs (10% of units moving).
+
+    python benchmarks/bench_live_map.py
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import live_map  # noqa: E402
+
+
+def bench(fleet=(50, 500, 2000), moving=0.1, ticks=20):
+    rng = random.Random(0)
+    for n in fleet:
+        pos = {f"UNIT-{i}": (10.0 + rng.random() * 0.05, 76.3 + rng.random() * 0.05) for i in range(n)}
+
+        def items():
+            return {k: live_map.driver(lat, lon, "green", driver_id=k, status="EN_ROUTE", speed=" 50 km/h")
+                    for k, (lat, lon) in pos.items()}
+
+        full, inc = live_map.LiveLayer(keyframe_ticks=0), live_map.LiveLayer()
+        full_b = inc_b = 0
+        for t in range(ticks):
+            for k in rng.sample(list(pos), max(1, int(n * moving))):
+                lat, lon = pos[k]
+                pos[k] = (lat + 1e-4, lon + 1e-4)
+            cur = items()
+            full.feature_group(cur, "base")
+            inc.feature_group(cur, "base")
+            inc.returned = {live_map.SEQ_FIELD: {"seq": inc.seq, "at": t}}   # the browser applied it and reported
+            full_b += full.last_bytes
+            inc_b += inc.last_bytes
+        print(f"{n:,} units, {moving:.0%} moving: full {full_b / ticks / 1e3:.1f} KB/tick | "
+              f"incremental {inc_b / ticks / 1e3:.1f} KB/tick (first tick is a keyframe)")
+
+
+if __name__ == "__main__":
+    bench()
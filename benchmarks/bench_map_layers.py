@@ -0,0 +1,63 @@
+"""
+500-unit fleet drawn as individual folium markers vs one GeoJSON layer (cold and cached), then viewport
+culling + clustering of a 5,000-unit multi-district fleet at overview and street zooms.
+
+    python benchmarks/bench_map_layers.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import folium  # noqa: E402
+
+import map_layers  # noqa: E402
+from map_layers import CLUSTER, DRIVER  # noqa: E402
+
+
+def bench(units=500, repeat=5):
+    rng = random.Random(0)
+    fleet = [(f"UNIT-{i}", 10.0 + rng.random() * 0.05, 76.3 + rng.random() * 0.05) for i in range(units)]
+    fields = {"status": "EN_ROUTE", "speed": " 52 km/h", "full_name": "A. Driver", "vehicle_id": "KL-07-1234",
+              "origin": "General Hospital", "destination": "Medical Trust", "tracked": ""}
+    card = map_layers.TEMPLATES["driver_card"]["popup"]
+
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        m = folium.Map(location=[10.015, 76.34], zoom_start=13)
+        for did, lat, lon in fleet:
+            folium.Marker([lat, lon], icon=folium.Icon(color="green", icon="ambulance", prefix="fa"),
+                          popup=folium.Popup(card.format(driver_id=did, **fields), max_width=280),
+                          tooltip=f"🚑 {did}").add_to(m)
+        old = m.get_root().render()
+    t_old = (time.perf_counter() - t0) / repeat
+
+    items = {f"d:{did}": (DRIVER, (lat, lon), {"color": "green", "tpl": "driver_card", "driver_id": did, **fields})
+             for did, lat, lon in fleet}
+    t0 = time.perf_counter()
+    new = map_layers.layers_json(items)
+    t_cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        map_layers.layers_json(items)
+    t_warm = (time.perf_counter() - t0) / repeat
+    size = sum(len(s) for s in new.values())
+    print(f"{units} units: folium markers {t_old * 1e3:.0f} ms, {len(old) / 1e3:.0f} KB | GeoJSON layer "
+          f"{t_cold * 1e3:.1f} ms cold, {t_warm * 1e3:.2f} ms cached, {size / 1e3:.0f} KB")
+
+    # Multi-district fleet: culling + clustering at overview and street zooms
+    big = {f"d:UNIT-{i}": (DRIVER, (9.8 + rng.random() * 0.5, 76.1 + rng.random() * 0.5), {"color": "green", "tpl": "driver_line"})
+           for i in range(5000)}
+    for z in (11, 13, 15):
+        t0 = time.perf_counter()
+        view, _ = map_layers.viewport(center=(10.015, 76.34), zoom=z)
+        shown = map_layers.cluster(map_layers.cull(big, map_layers.expand(view)), z)
+        t_cc = time.perf_counter() - t0
+        n_cl = sum(1 for it in shown.values() if it[0] == CLUSTER)
+        print(f"5,000 units at zoom {z}: {len(shown):,} features ({n_cl:,} clusters) in {t_cc * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,41 @@
+"""
+SeriesBank at 1 Hz for thousands of junctions: push per tick, stats for all junctions, one sparkline.
+
+    python benchmarks/bench_sensor_series.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import sensor_series  # noqa: E402
+
+
+def bench(junctions=5000, ticks=600):
+    rng = np.random.default_rng(0)
+    bank = sensor_series.SeriesBank([f"J{i}" for i in range(junctions)], capacity=300)
+    rows = np.arange(junctions)
+    flows = rng.uniform(10, 70, junctions).astype(np.float32)
+    t0 = time.perf_counter()
+    for t in range(ticks):
+        flows = np.clip(flows + rng.normal(0, 3, junctions), 0, 120).astype(np.float32)
+        statuses = sensor_series.classify(flows)
+        bank.push(1_700_000_000_000 + t * 1000, rows, flows, statuses)
+    t_push = (time.perf_counter() - t0) / ticks
+    t0 = time.perf_counter()
+    bank.stats()
+    t_stats = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for i in range(100):
+        bank.sparkline(f"J{i}")
+    t_spark = (time.perf_counter() - t0) / 100
+    mb = sum(a.nbytes for a in (bank.ts, bank.flow, bank.status, bank.hist)) / 1e6
+    print(f"{junctions:,} junctions x {bank.capacity} samples ({mb:.1f} MB): push tick {t_push * 1e3:.2f} ms | "
+          f"stats for all {t_stats * 1e3:.1f} ms | sparkline {t_spark * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,59 @@
+"""
+City-scale ingestion and rendering through the production path (sensors.SensorIngestor fed by CitySimulator).
+
+    python benchmarks/bench_sensor_sim.py --junctions 10000 --ticks 10
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import folium  # noqa: E402
+
+import db  # noqa: E402
+import schema  # noqa: E402
+import sensor_sim  # noqa: E402
+import sensors  # noqa: E402
+
+
+def bench(junctions=10000, ticks=10):
+    sim = sensor_sim.CitySimulator(n=junctions)
+    t0 = time.perf_counter()
+    for k in range(ticks):
+        sim.flows_at(1_700_000_000_000 + k * 2000)
+    t_field = (time.perf_counter() - t0) / ticks
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sim.db")
+        schema.migrate(path)
+        ing = sensors.SensorIngestor(path, source=sim, junctions=sim.junctions)
+        t0 = time.perf_counter()
+        for _ in range(ticks):
+            ing.tick_once()
+        t_tick = (time.perf_counter() - t0) / ticks
+        t0 = time.perf_counter()
+        data = ing.latest()
+        ing.stats()
+        t_read = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        m = folium.Map(location=[10.015, 76.34], zoom_start=12)
+        for d in data:
+            folium.CircleMarker([d["Lat"], d["Lon"]], radius=3, weight=0, fill=True).add_to(m)
+        html = m.get_root().render()
+        t_map = time.perf_counter() - t0
+        rows = db.fetchone("SELECT COUNT(*) FROM sensor_readings", db_file=path)[0]
+        db.get_manager(path).close_all()
+    counts = {s: sum(1 for d in data if d["Status"] == s) for s in ("CLEAR", "HEAVY", "JAMMED")}
+    print(f"{junctions:,} junctions: field {t_field * 1e3:.1f} ms | ingest tick {t_tick * 1e3:.0f} ms "
+          f"({rows:,} rows in {ticks} ticks) | latest+stats {t_read * 1e3:.0f} ms | folium map {t_map * 1e3:.0f} ms, "
+          f"{len(html) / 1e6:.1f} MB HTML | {counts}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--junctions", type=int, default=10000)
+    parser.add_argument("--ticks", type=int, default=10)
+    args = parser.parse_args()
+    bench(args.junctions, args.ticks)
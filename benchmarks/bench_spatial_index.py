@@ -0,0 +1,47 @@
+"""
+Grid spatial index knn / radius / upsert vs a full vectorized scan, at 100 to 10,000 points.
+
+    python benchmarks/bench_spatial_index.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+import spatial_index  # noqa: E402
+from shared_utils import distances_km  # noqa: E402
+
+
+def bench(sizes=(100, 1000, 10000), queries=200):
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        lats = 9.85 + rng.random(n) * 0.35
+        lons = 76.2 + rng.random(n) * 0.25
+        idx = spatial_index.from_points({i: (lats[i], lons[i]) for i in range(n)})
+        qs = list(zip(9.9 + rng.random(queries) * 0.25, 76.25 + rng.random(queries) * 0.15))
+        t0 = time.perf_counter()
+        for la, lo in qs:
+            d = distances_km(la, lo, lats, lons)
+            np.argpartition(d, min(10, n - 1))[:10]
+        t_scan = (time.perf_counter() - t0) / queries
+        t0 = time.perf_counter()
+        for la, lo in qs:
+            idx.knn(la, lo, 10)
+        t_knn = (time.perf_counter() - t0) / queries
+        t0 = time.perf_counter()
+        for la, lo in qs:
+            idx.radius(la, lo, 2.0)
+        t_rad = (time.perf_counter() - t0) / queries
+        t0 = time.perf_counter()
+        for i in range(n):
+            idx.upsert(i, lats[i] + 1e-4, lons[i])
+        t_up = (time.perf_counter() - t0) / n
+        print(f"{n:>6,} points: full scan top-10 {t_scan * 1e3:.3f} ms | grid knn(10) {t_knn * 1e3:.3f} ms | "
+              f"radius(2 km) {t_rad * 1e3:.3f} ms | upsert {t_up * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,64 @@
+"""
+Synchronous per-heartbeat writes vs the write-behind TelemetryIngestor.
+
+    python benchmarks/bench_telemetry.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import schema  # noqa: E402
+import telemetry  # noqa: E402
+
+
+def bench(units=100, ticks=20):
+    """`units` drivers each sending `ticks` heartbeats (+ driver_state rows while EN_ROUTE)."""
+
+    def rows(tick):
+        now = db.now_ms()
+        for u in range(units):
+            did = f"UNIT-{u:03d}"
+            lat, lon = 10.0 + u * 1e-3, 76.3 + tick * 1e-4
+            yield (did, "EN_ROUTE", lat, lon, now, 50.0, "A", "B", None, 1), (did, "A", "B", lat, lon, 50.0, "EN_ROUTE", now)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sync_path = os.path.join(tmp, "sync.db")
+        schema.migrate(sync_path)
+        mgr = db.get_manager(sync_path)
+        t0 = time.perf_counter()
+        for tick in range(ticks):
+            for drow, srow in rows(tick):
+                mgr.execute(telemetry.DRIVER_UPSERT_SQL, drow)
+                mgr.execute(telemetry.DRIVER_STATE_SQL, srow)
+        sync_sec = time.perf_counter() - t0
+        sync_rate = units * ticks * 2 / sync_sec
+
+        wb_path = os.path.join(tmp, "wb.db")
+        schema.migrate(wb_path)
+        ing = telemetry.TelemetryIngestor(wb_path)
+        t0 = time.perf_counter()
+        for tick in range(ticks):
+            for drow, srow in rows(tick):
+                ing.upsert_driver(drow)
+                ing.append_state(srow)
+        enqueue_sec = time.perf_counter() - t0
+        ing.stop()
+        wb_sec = time.perf_counter() - t0
+        st = ing.stats()
+        for path in (sync_path, wb_path):
+            db.get_manager(path).close_all()
+
+    print(f"{units} units x {ticks} heartbeats ({units * ticks * 2} telemetry writes)")
+    print(f"  synchronous:  {sync_rate:,.0f} writes/s ({sync_sec * 1000:.0f} ms)")
+    print(f"  write-behind: {units * ticks * 2 / wb_sec:,.0f} writes/s end-to-end ({wb_sec * 1000:.0f} ms, "
+          f"producer blocked {enqueue_sec * 1000:.0f} ms), {st['inserts_per_sec']:,} rows/s in flush, "
+          f"{st['flushes']} flushes, {st['collapsed']} upserts collapsed, {st['dropped']} dropped")
+    return st
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,100 @@
+"""
+Incremental V2X comms feed.
+fetch_since() returns only driver_comms rows newer than a cursor id; CommsFeed keeps a bounded ring
+buffer of the latest messages plus CRITICAL/WARNING/REQUEST buckets updated as rows arrive and fall off,
+so a steady-state poll costs one indexed range read of the new rows instead of re-reading the window.
+"""
+from collections import deque
+
+import db
+
+PRIORITY_STATUSES = ("CRITICAL", "WARNING", "REQUEST")
+FIELDS = ("id", "timestamp", "driver_id", "status", "message")
+_COLS = "id, " + db.local_ts("timestamp_ms", "timestamp") + ", driver_id, status, message"
+
+# Filters: name -> (WHERE clause, number of driver_id params). HQ messages are 'HQ' <= status < 'HR'.
+# Unary + keeps the status/driver_id indexes out of the plan: the cursor's rowid range (id > ?) is the
+# access path, so a poll touches only rows newer than the cursor however many HQ messages exist.
+_FILTERS = {
+    "all": ("1=1", 0),
+    "from_driver": ("+driver_id=? AND (+status < 'HQ' OR +status >= 'HR')", 1),
+    "conversation": ("((+status < 'HQ' OR +status >= 'HR') AND +driver_id=?) OR (+status >= 'HQ' AND +status < 'HR' AND +driver_id IN (?, 'ALL'))", 2),
+    "hq_inbox": ("(+status >= 'HQ' AND +status < 'HR') OR +driver_id IN ('ALL', ?)", 1),
+}
+SCOPES = tuple(_FILTERS)
+FETCH_SQL = "SELECT " + _COLS + " FROM driver_comms WHERE id > ? AND ({where}) ORDER BY id DESC LIMIT ?"
+
+
+def fetch_sql(scope):
+    """(SQL, number of driver_id params) that fetch_since runs for `scope`."""
+    where, n = _FILTERS[scope]
+    return FETCH_SQL.format(where=where), n
+
+
+def fetch_since(after_id=0, limit=100, scope="all", driver_id=None, db_file=db.DB_FILE):
+    """Rows with id > after_id matching `scope`, oldest first. At most the newest `limit` are returned."""
+    sql, n = fetch_sql(scope)
+    rows = db.fetchall(sql, (after_id, *([driver_id] * n), limit), db_file=db_file)
+    rows.reverse()
+    return [dict(zip(FIELDS, r)) for r in rows]
+
+
+class CommsFeed:
+    """Bounded, incrementally updated view of one comms filter. Keep one per session/filter in session_state."""
+
+    def __init__(self, scope="all", driver_id=None, capacity=80, db_file=db.DB_FILE):
+        self.scope = scope
+        self.driver_id = driver_id
+        self.capacity = capacity
+        self.db_file = db_file
+        self.last_id = 0
+        self.messages = deque(maxlen=capacity)  # oldest -> newest
+        self.buckets = {s: deque() for s in PRIORITY_STATUSES}
+        self._ordered = None
+
+    def _append(self, msg):
+        if len(self.messages) == self.capacity:
+            old = self.messages[0]
+            bucket = self.buckets.get(old["status"])
+            if bucket and bucket[0] is old:
+                bucket.popleft()
+        self.messages.append(msg)
+        bucket = self.buckets.get(msg["status"])
+        if bucket is not None:
+            bucket.append(msg)
+
+    def poll(self):
+        """Pull rows newer than the cursor. Returns the new messages (oldest first)."""
+        new = fetch_since(self.last_id, self.capacity, self.scope, self.driver_id, self.db_file)
+        for msg in new:
+            self._append(msg)
+        if new:
+            self.last_id = new[-1]["id"]
+            self._ordered = None
+        return new
+
+    def latest(self, n=None):
+        """Newest first."""
+        out = list(reversed(self.messages))
+        return out if n is None else out[:n]
+
+    def alerts(self, n=None):
+        """CRITICAL, then WARNING/REQUEST (newest first within each tier)."""
+        crit = list(reversed(self.buckets["CRITICAL"]))
+        rest = sorted(list(self.buckets["WARNING"]) + list(self.buckets["REQUEST"]), key=lambda m: m["id"], reverse=True)
+        out = crit + rest
+        return out if n is None else out[:n]
+
+    def ordered(self):
+        """Whole window with SOS first: CRITICAL, then WARNING/REQUEST, then everything else; newest first in each."""
+        if self._ordered is None:
+            alerts = self.alerts()
+            others = [m for m in reversed(self.messages) if m["status"] not in self.buckets]
+            self._ordered = alerts + others
+        return self._ordered
+
+    def count(self, *statuses):
+        return sum(len(self.buckets[s]) for s in statuses)
+
+    def __len__(self):
+        return len(self.messages)
@@ -0,0 +1,253 @@
+"""
+Shared SQLite connection layer for App.py (HQ) and driverapp.py (Driver).
+One long-lived connection per thread: PRAGMAs are applied once when it opens,
+and sqlite3's prepared-statement cache survives across Streamlit reruns.
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "titan_v52.db")
+
+# Applied once per connection (not per helper call)
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA synchronous=NORMAL;",
+)
+# Per-connection LRU of compiled statements (sqlite3 built-in)
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionManager:
+    """Per-thread pooled connections for a single database file."""
+
+    def __init__(self, db_file=DB_FILE, pragmas=PRAGMAS, cached_statements=STATEMENT_CACHE_SIZE):
+        self.db_file = db_file
+        self.pragmas = tuple(pragmas)
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._by_thread = {}  # thread ident -> (thread, connection)
+        self.opened = 0
+        self.checkouts = 0
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_file,
+            timeout=5.0,
+            isolation_level=None,  # autocommit; use transaction() for multi-statement writes
+            cached_statements=self.cached_statements,
+        )
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def _reap_dead_threads(self):
+        """Close connections owned by threads that have exited (Streamlit recycles script threads)."""
+        for ident, (thread, conn) in list(self._by_thread.items()):
+            if not thread.is_alive():
+                del self._by_thread[ident]
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def connection(self):
+        """Connection owned by the calling thread (opened on first use)."""
+        self.checkouts += 1
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        conn = self._open()
+        self._local.conn = conn
+        with self._lock:
+            self.opened += 1
+            self._reap_dead_threads()
+            self._by_thread[threading.get_ident()] = (threading.current_thread(), conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error). Nested calls join the outer transaction."""
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def execute(self, sql, params=()):
+        """Single autocommitted statement. Returns the cursor (rowcount / lastrowid)."""
+        return self.connection().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        with self.transaction() as conn:
+            return conn.executemany(sql, seq_of_params)
+
+    def fetchone(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def fetchall(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def read_sql(self, sql, params=()):
+        """pandas DataFrame for a query, on the pooled connection."""
+        return pd.read_sql_query(sql, self.connection(), params=params)
+
+    def close_all(self):
+        with self._lock:
+            for _, conn in self._by_thread.values():
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._by_thread.clear()
+        self._local = threading.local()
+
+    def stats(self):
+        with self._lock:
+            live = len(self._by_thread)
+        return {"opened": self.opened, "checkouts": self.checkouts, "live": live}
+
+
+# ==========================================
+# PER-DATABASE SINGLETONS AND BACKGROUND WORKERS (module state survives Streamlit reruns)
+# ==========================================
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def per_db(kind, db_file, factory):
+    """Process-wide object per (kind, database file), built once by factory(absolute db path)."""
+    key = (kind, os.path.abspath(db_file))
+    obj = _instances.get(key)
+    if obj is None:
+        with _instances_lock:
+            obj = _instances.get(key)
+            if obj is None:
+                obj = _instances[key] = factory(key[1])
+    return obj
+
+
+def get_manager(db_file=DB_FILE):
+    """Process-wide manager per database file."""
+    return per_db("connections", db_file, ConnectionManager)
+
+
+class Worker:
+    """Daemon thread calling tick() every `interval` seconds until stop(). Pass tick=fn(db_file), or subclass
+    and override tick() (and setup(), run once in the thread before the first tick). Exceptions go to
+    last_error and the loop carries on. fixed_rate=True keeps a steady cadence, skipping ticks it fell
+    behind on, instead of sleeping `interval` after each tick."""
+
+    def __init__(self, db_file=DB_FILE, interval=1.0, tick=None, name="titan-worker", fixed_rate=False):
+        self.db_file = db_file
+        self.interval = interval
+        self.fixed_rate = fixed_rate
+        self.runs = 0
+        self.last_result = None
+        self.last_error = None
+        self._tick_fn = tick
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def setup(self):
+        pass
+
+    def tick(self):
+        return self._tick_fn(self.db_file)
+
+    def tick_once(self):
+        """One tick in the calling thread (the worker loop, or tests / benchmarks driving it by hand)."""
+        self.last_result = self.tick()
+        self.runs += 1
+        return self.last_result
+
+    def _run(self):
+        try:
+            self.setup()
+        except Exception as e:
+            self.last_error = str(e)
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.tick_once()
+            except Exception as e:
+                self.last_error = str(e)
+            if not self.fixed_rate:
+                self._stop.wait(self.interval)
+                continue
+            next_at += self.interval
+            self._stop.wait(max(0.0, next_at - time.monotonic()))
+            if time.monotonic() - next_at > self.interval:
+                next_at = time.monotonic()  # fell behind (slow tick): don't burst to catch up
+
+    def start(self):
+        if self._thread.ident is None:
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+def ensure_worker(kind, db_file, make):
+    """Start make(absolute db path) once per process and database; later calls (every rerun) return the
+    running worker."""
+    return per_db(kind, db_file, lambda path: make(path).start())
+
+
+# --- Timestamps: stored as INTEGER epoch milliseconds (schema migration 4) ---
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def ago_ms(seconds):
+    """Epoch-ms cutoff `seconds` before now, for `WHERE x_ms >= ?` recency filters."""
+    return now_ms() - int(seconds * 1000)
+
+
+def local_ts(col, alias=None):
+    """SQL expression rendering an epoch-ms column as local 'YYYY-MM-DD HH:MM:SS' for display."""
+    expr = f"datetime({col} / 1000, 'unixepoch', 'localtime')"
+    return f"{expr} AS {alias}" if alias else expr
+
+
+# --- Module-level shortcuts on the default database ---
+def connection(db_file=DB_FILE):
+    return get_manager(db_file).connection()
+
+
+def transaction(db_file=DB_FILE):
+    return get_manager(db_file).transaction()
+
+
+def execute(sql, params=(), db_file=DB_FILE):
+    return get_manager(db_file).execute(sql, params)
+
+
+def executemany(sql, seq_of_params, db_file=DB_FILE):
+    return get_manager(db_file).executemany(sql, seq_of_params)
+
+
+def fetchone(sql, params=(), db_file=DB_FILE):
+    return get_manager(db_file).fetchone(sql, params)
+
+
+def fetchall(sql, params=(), db_file=DB_FILE):
+    return get_manager(db_file).fetchall(sql, params)
+
+
+def read_sql(sql, params=(), db_file=DB_FILE):
+    return get_manager(db_file).read_sql(sql, params)
@@ -0,0 +1,125 @@
+"""
+WebGL (deck.gl via pydeck) renderer for the HQ fleet maps, selectable with MAP_RENDERER=deck.
+Drivers, ghost trail, routes, hazards and every sensor's status are drawn as deck.gl layers on the GPU
+instead of one Leaflet DOM marker each. Per object only a position (rounded to ~1 m) and two tooltip
+strings are sent; color and radius are constants of the layer, one layer per status. st.pydeck_chart
+ships the deck as JSON (pydeck's binary transport only exists for Jupyter widgets). With MAP_STATS=1
+both renderers show payload size and build time under the map for comparison.
+"""
+import html
+import os
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+
+import geometry
+
+MAP_RENDERER = os.environ.get("MAP_RENDERER", "folium")   # "folium" (live_map.py) or "deck"
+MAP_STATS = os.environ.get("MAP_STATS") == "1"
+MAP_HEIGHT = 600
+COORD_DECIMALS = 5
+
+ROUTE_RGB = [[255, 0, 60], [0, 243, 255], [255, 204, 0], [255, 255, 255]]
+DRIVER_RGB = {"EN_ROUTE": [0, 200, 80], "IDLE": [40, 120, 255]}
+DRIVER_OTHER_RGB = [140, 140, 140]
+FOCUS_RGB = [0, 255, 157]
+SENSOR_RGB = {"CLEAR": [0, 229, 255], "HEAVY": [255, 170, 0], "JAMMED": [255, 0, 60], "GREEN_WAVE": [0, 255, 0]}
+HAZARD_RGB = [255, 140, 0]
+TRAIL_RGB = [0, 255, 157]
+
+
+# ==========================================
+# LAYER DATA: position + tooltip text only; color and size are per layer (one layer per status)
+# ==========================================
+def _points(lats, lons, names, infos):
+    # deck.gl substitutes {name} / {info} into the tooltip HTML as is, so escape them here
+    return pd.DataFrame({
+        "lon": np.round(np.asarray(lons, dtype=float), COORD_DECIMALS),
+        "lat": np.round(np.asarray(lats, dtype=float), COORD_DECIMALS),
+        "name": [html.escape(str(v)) for v in names], "info": [html.escape(str(v)) for v in infos],
+    })
+
+
+def drivers_frames(df, focus=None):
+    """{color_key: DataFrame} of driver points from a live-map DataFrame (driver_id, status, current_lat,
+    current_lon, speed); color_key is the status, "OTHER" or "FOCUS"."""
+    if df is None or df.empty:
+        return {}
+    df = df.dropna(subset=["current_lat", "current_lon"])
+    status = df["status"].fillna("?").astype(str)
+    speed = df["speed"] if "speed" in df else pd.Series(np.nan, index=df.index)
+    ids = df["driver_id"].astype(str)
+    info = [f"{s} {int(v)} km/h" if pd.notna(v) else s for s, v in zip(status, speed)]
+    key = np.where(ids == focus, "FOCUS", np.where(status.isin(list(DRIVER_RGB)), status, "OTHER"))
+    frame = _points(df["current_lat"], df["current_lon"], ids, info)
+    return {k: frame[key == k].reset_index(drop=True) for k in pd.unique(key)}
+
+
+def _path(coords):
+    """[[lat, lon], ...] -> [[lon, lat], ...] rounded."""
+    pts = np.round(np.asarray(coords, dtype=float).reshape(-1, 2), COORD_DECIMALS)
+    return pts[:, ::-1].tolist()
+
+
+def _scatter(layer_id, frame, color, radius, **kwargs):
+    return pdk.Layer(
+        "ScatterplotLayer", frame, id=layer_id, get_position=["lon", "lat"], get_fill_color=color,
+        get_radius=radius, pickable=True, **kwargs,
+    )
+
+
+# ==========================================
+# DECK
+# ==========================================
+def fleet_deck(center, zoom, routes=(), drivers=None, hazards=(), sensors=(), trail=None,
+               origin=None, destination=None, focus=None):
+    """pdk.Deck for the HQ maps; same inputs as the folium path (routes from fetch_routes, drivers DataFrame,
+    get_hazards() / sensors.latest() dicts, ghost trail as [[lat, lon], ...])."""
+    layers = []
+    for status, color in SENSOR_RGB.items():
+        rows = [s for s in sensors if s["Status"] == status]
+        if rows:
+            # Every junction by status; GREEN_WAVE junctions get the 300 m zone radius
+            layers.append(_scatter(
+                f"sensors-{status}", _points([s["Lat"] for s in rows], [s["Lon"] for s in rows], [s["Area"] for s in rows],
+                                             [f"{status} · {s['Flow']} km/h" for s in rows]),
+                color, 300 if status == "GREEN_WAVE" else 80, opacity=0.35, radius_min_pixels=3,
+            ))
+    if routes:
+        paths = [{"path": _path(geometry.map_coords(r, zoom)), "color": ROUTE_RGB[i % len(ROUTE_RGB)], "width": 5 if i == 0 else 3}
+                 for i, r in reversed(list(enumerate(routes)))]
+        layers.append(pdk.Layer(
+            "PathLayer", paths, id="routes", get_path="path", get_color="color", get_width="width",
+            width_units="pixels", opacity=0.8,
+        ))
+    if trail is not None and len(trail) > 1:
+        layers.append(pdk.Layer(
+            "PathLayer", [{"path": _path(trail)}], id="trail", get_path="path", get_color=TRAIL_RGB, get_width=3,
+            width_units="pixels", opacity=0.7,
+        ))
+    if hazards:
+        layers.append(_scatter(
+            "hazards", _points([h["lat"] for h in hazards], [h["lon"] for h in hazards], ["Hazard"] * len(hazards),
+                               [str(h["type"]) for h in hazards]),
+            HAZARD_RGB, 40, radius_min_pixels=5,
+        ))
+    for layer_id, point, color, label in (("origin", origin, [40, 120, 255], "ORIGIN"), ("destination", destination, [255, 0, 60], "DESTINATION")):
+        if point is not None:
+            layers.append(_scatter(layer_id, _points([point[0]], [point[1]], [label], [""]), color, 50, radius_min_pixels=6))
+    for key, frame in drivers_frames(drivers, focus).items():
+        color = FOCUS_RGB if key == "FOCUS" else DRIVER_RGB.get(key, DRIVER_OTHER_RGB)
+        layers.append(_scatter(
+            f"drivers-{key}", frame, color, 60 if key == "FOCUS" else 35, stroked=True,
+            get_line_color=[255, 255, 255], line_width_min_pixels=1, radius_min_pixels=5,
+        ))
+    return pdk.Deck(
+        layers=layers,
+        initial_view_state=pdk.ViewState(latitude=float(center[0]), longitude=float(center[1]), zoom=zoom),
+        map_provider="carto", map_style="dark", height=MAP_HEIGHT,
+        tooltip={"html": "<b>{name}</b><br/>{info}", "style": {"backgroundColor": "#111", "color": "#fff", "fontSize": "12px"}},
+    )
+
+
+def payload_bytes(deck):
+    return len(deck.to_json())
@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import folium
 from streamlit_folium import st_folium
-import sqlite3
 import datetime
 import time
 import random
@@ -11,27 +10,6 @@ import html
 import sys
 import os
 
-try:
-    from geopy.distance import geodesic
-except Exception:
-    import math
-
-    def geodesic(a, b):
-        lat1, lon1 = a
-        lat2, lon2 = b
-        r = 6371000.0
-        p1, p2 = math.radians(lat1), math.radians(lat2)
-        dlat = math.radians(lat2 - lat1)
-        dlon = math.radians(lon2 - lon1)
-        x = math.sin(dlat / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dlon / 2) ** 2
-        meters = 2 * r * math.asin(math.sqrt(x))
-
-        class _D:
-            def __init__(self, m):
-                self.km = m / 1000.0
-
-        return _D(meters)
-
 # ==========================================
 # 0. MOBILE CONFIGURATION
 # ==========================================
@@ -47,6 +25,14 @@ _APP_DIR = os.path.dirname(os.path.abspath(__file__))
 if _APP_DIR not in sys.path:
     sys.path.insert(0, _APP_DIR)
 from shared_utils import fetch_route_alternatives_4, distance_km, hash_password, verify_password, calculate_co2_savings
+import db
+import schema
+import telemetry
+import comms
+import geometry
+import spatial_index
+import leases
+import queries
 try:
     from shared_utils import HOSPITALS, MISSION_EXPIRY_SEC
 except ImportError:
@@ -71,7 +57,7 @@ except ImportError:
         "Samaritan Hospital": [10.1900, 76.3800], "Mom Hospital": [10.0150, 76.3100]
     }
 
-DB_FILE = os.path.join(_APP_DIR, "titan_v52.db")
+DB_FILE = db.DB_FILE  # pooled connections via db.py
 
 # HOSPITALS from shared_utils (single source of truth)
 
@@ -291,107 +277,8 @@ if 'pending_sound_ts' not in st.session_state: st.session_state.pending_sound_ts
 SOUND_MISSION = "https://assets.mixkit.co/active_storage/sfx/2869-ping-high-15.mp3"
 SOUND_ALERT = "https://assets.mixkit.co/active_storage/sfx/2568-simple-notification-2568.mp3"
 
-def init_db_extensions():
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS drivers (
-                driver_id TEXT PRIMARY KEY,
-                status TEXT,
-                current_lat REAL,
-                current_lon REAL,
-                last_seen DATETIME,
-                speed REAL,
-                origin TEXT,
-                destination TEXT,
-                active_mission_id TEXT,
-                clearance_status TEXT,
-                selected_route_id INTEGER
-            )
-        ''')
-        for col, typ in [
-            ("speed", "REAL"), ("origin", "TEXT"), ("destination", "TEXT"),
-            ("active_mission_id", "TEXT"), ("clearance_status", "TEXT"), ("selected_route_id", "INTEGER"),
-        ]:
-            try:
-                c.execute(f"ALTER TABLE drivers ADD COLUMN {col} {typ}")
-            except sqlite3.OperationalError:
-                pass
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS missions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                created_at DATETIME,
-                mission_id TEXT,
-                origin TEXT,
-                destination TEXT,
-                priority TEXT,
-                assigned_driver_id TEXT,
-                status TEXT,
-                accepted_at DATETIME,
-                completed_at DATETIME
-            )
-        ''')
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS driver_accounts (
-                driver_id TEXT PRIMARY KEY,
-                username TEXT UNIQUE,
-                password TEXT,
-                full_name TEXT,
-                phone TEXT,
-                vehicle_id TEXT,
-                base_hospital TEXT,
-                created_at DATETIME
-            )
-        ''')
-        for col, typ in [("vehicle_id", "TEXT"), ("base_hospital", "TEXT")]:
-            try:
-                c.execute(f"ALTER TABLE driver_accounts ADD COLUMN {col} {typ}")
-            except sqlite3.OperationalError:
-                pass
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS hazards (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                lat REAL,
-                lon REAL,
-                type TEXT,
-                timestamp DATETIME
-            )
-        ''')
-        try:
-            c.execute("ALTER TABLE missions ADD COLUMN decline_reason TEXT")
-        except sqlite3.OperationalError:
-            pass
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS activity_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME,
-                action TEXT,
-                actor TEXT,
-                details TEXT
-            )
-        ''')
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS mission_declines (
-                mission_id TEXT,
-                driver_id TEXT,
-                declined_at DATETIME,
-                reason TEXT,
-                PRIMARY KEY (mission_id, driver_id)
-            )
-        ''')
-        c.execute(
-            "INSERT OR IGNORE INTO driver_accounts (driver_id, username, password, full_name, created_at) VALUES (?, ?, ?, ?, ?)",
-            ("UNIT-07", "UNIT-07", hash_password("TITAN-DRIVER"), "Unit 7", datetime.datetime.now()),
-        )
-        conn.commit()
-        conn.close()
-    except Exception:
-        pass
-
-# MUST run before any DB access (including restore)
-init_db_extensions()
+# MUST run before any DB access (including restore). Schema lives in schema.py (runs once per process)
+schema.ensure_schema(DB_FILE)
 
 # ==========================================
 # PERSISTENT LOGIN - survive page refresh (smooth, no crash)
@@ -407,13 +294,10 @@ def _restore_session_from_url():
         did, uname = str(did).strip(), str(uname).strip()
         if not did or not uname:
             return False
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        row = conn.execute(
+        row = db.fetchone(
             "SELECT driver_id FROM driver_accounts WHERE driver_id = ? AND username = ?",
             (did, uname),
-        ).fetchone()
-        conn.close()
+        )
         if row:
             st.session_state.driver_authenticated = True
             st.session_state.driver_id = did
@@ -451,13 +335,10 @@ if not st.session_state.driver_authenticated:
 def get_driver_profile(driver_id):
     """Fetch full driver profile from driver_accounts: id, username, full_name, phone, vehicle_id, base_hospital."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        row = conn.execute(
+        row = db.fetchone(
             "SELECT driver_id, username, full_name, phone, vehicle_id, base_hospital FROM driver_accounts WHERE driver_id = ?",
             (driver_id,),
-        ).fetchone()
-        conn.close()
+        )
         if row:
             return {
                 "driver_id": row[0],
@@ -474,21 +355,16 @@ def get_driver_profile(driver_id):
 def driver_signup(username, password, full_name, phone="", vehicle_id="", base_hospital=""):
     """Register new driver. Returns (driver_id, None) on success else (None, error_msg)."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        c = conn.cursor()
-        existing = c.execute("SELECT driver_id FROM driver_accounts WHERE username=?", (username.strip(),)).fetchone()
-        if existing:
-            conn.close()
-            return None, "Username already taken."
-        driver_id = f"UNIT-{random.randint(100, 999)}"
-        pwd_hash = hash_password(password)
-        c.execute(
-            "INSERT INTO driver_accounts (driver_id, username, password, full_name, phone, vehicle_id, base_hospital, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (driver_id, username.strip(), pwd_hash, full_name.strip(), phone.strip() or None, (vehicle_id or "").strip() or None, (base_hospital or "").strip() or None, datetime.datetime.now()),
-        )
-        conn.commit()
-        conn.close()
+        with db.transaction() as conn:
+            existing = conn.execute("SELECT driver_id FROM driver_accounts WHERE username=?", (username.strip(),)).fetchone()
+            if existing:
+                return None, "Username already taken."
+            driver_id = f"UNIT-{random.randint(100, 999)}"
+            pwd_hash = hash_password(password)
+            conn.execute(
+                "INSERT INTO driver_accounts (driver_id, username, password, full_name, phone, vehicle_id, base_hospital, created_at_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (driver_id, username.strip(), pwd_hash, full_name.strip(), phone.strip() or None, (vehicle_id or "").strip() or None, (base_hospital or "").strip() or None, db.now_ms()),
+            )
         return driver_id, None
     except Exception as e:
         return None, str(e)
@@ -523,12 +399,10 @@ def driver_login_screen():
                     st.error("Enter username and password.")
                 else:
                     try:
-                        conn = sqlite3.connect(DB_FILE)
-                        row = conn.execute(
+                        row = db.fetchone(
                             "SELECT driver_id, full_name, password FROM driver_accounts WHERE username=?",
                             (u.strip(),),
-                        ).fetchone()
-                        conn.close()
+                        )
                         if row:
                             stored_hash = row[2] if len(row) > 2 else None
                             if stored_hash and len(str(stored_hash)) == 64 and str(stored_hash).isalnum():
@@ -579,38 +453,32 @@ def driver_login_screen():
 def _current_speed():
     return random.randint(45, 72) if st.session_state.status == "EN_ROUTE" else 0
 
+def publish_selected_route():
+    """Share the selected route of the active mission with HQ (green-wave scheduler). Writes only on change."""
+    mid = st.session_state.active_mission_id
+    routes = st.session_state.route_alternatives
+    if not mid or not routes:
+        return
+    route = routes[min(st.session_state.selected_route_id or 0, len(routes) - 1)]
+    polyline = geometry.compact(route)["polyline"]
+    if st.session_state.get("_published_route") == (mid, polyline):
+        return
+    db.execute(queries.PUBLISH_ROUTE_SQL, (polyline, mid, st.session_state.driver_id))
+    st.session_state._published_route = (mid, polyline)
+
 def heartbeat():
-    """Push telemetry to server: lat, lon, speed, status, origin, dest, mission, clearance, selected_route."""
+    """Push telemetry to server: lat, lon, speed, status, origin, dest, mission, selected_route."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        c = conn.cursor()
         speed = _current_speed()
         org = st.session_state.active_org or ""
         dst = st.session_state.active_dst or ""
         mid = st.session_state.active_mission_id
         rid = st.session_state.selected_route_id
-        clearance = st.session_state.clearance_status or ""
-        c.execute(
-            """
-            INSERT INTO drivers (driver_id, status, current_lat, current_lon, last_seen, speed, origin, destination, active_mission_id, clearance_status, selected_route_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(driver_id) DO UPDATE SET
-              status=excluded.status,
-              current_lat=excluded.current_lat,
-              current_lon=excluded.current_lon,
-              last_seen=excluded.last_seen,
-              speed=excluded.speed,
-              origin=excluded.origin,
-              destination=excluded.destination,
-              active_mission_id=excluded.active_mission_id,
-              clearance_status=excluded.clearance_status,
-              selected_route_id=excluded.selected_route_id
-            """,
-            (st.session_state.driver_id, st.session_state.status, st.session_state.gps_lat, st.session_state.gps_lon, datetime.datetime.now(), speed, org, dst, mid, clearance, rid),
+        # Write-behind: telemetry.py batches and collapses these upserts off the script thread
+        telemetry.get_ingestor().upsert_driver(
+            (st.session_state.driver_id, st.session_state.status, st.session_state.gps_lat, st.session_state.gps_lon, db.now_ms(), speed, org, dst, mid, rid),
         )
-        conn.commit()
-        conn.close()
+        publish_selected_route()
         # Push to driver_state for ghost trail when EN_ROUTE (throttled every 5s)
         if st.session_state.status == "EN_ROUTE" and org and dst:
             last_push = st.session_state.get("_last_driver_state_push")
@@ -622,60 +490,43 @@ def heartbeat():
         pass
 
 
-def get_my_clearance():
-    """Poll server for this driver's clearance_status (GRANTED / DENIED / PENDING)."""
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        row = conn.execute("SELECT clearance_status FROM drivers WHERE driver_id = ?", (st.session_state.driver_id,)).fetchone()
-        conn.close()
-        return row[0] if row and row[0] else None
-    except Exception:
-        return None
+def request_clearance():
+    """Ask HQ for a green wave. The request is a lease: it drops out on its own if HQ never answers."""
+    heartbeat()
+    telemetry.get_ingestor().flush()  # HQ sees the request with the unit's current position
+    leases.request_clearance(st.session_state.driver_id)
+    st.session_state.clearance_status = "PENDING"
 
 def update_server(org, dst, stat):
-    """Push telemetry to driver_state (lat, lon, speed) so server map updates instantly."""
+    """Queue telemetry for driver_state (lat, lon, speed); flushed to the server within FLUSH_INTERVAL_SEC."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
-        c = conn.cursor()
         speed = _current_speed()
-        try:
-            c.execute(
-                "INSERT INTO driver_state (driver_id, origin, destination, current_lat, current_lon, speed, status, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                (st.session_state.driver_id, org, dst, st.session_state.gps_lat, st.session_state.gps_lon, speed, stat, datetime.datetime.now()),
-            )
-        except sqlite3.OperationalError:
-            c.execute(
-                "INSERT INTO driver_state (driver_id, origin, destination, current_lat, current_lon, status, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                (st.session_state.driver_id, org, dst, st.session_state.gps_lat, st.session_state.gps_lon, stat, datetime.datetime.now()),
-            )
-        conn.commit()
-        conn.close()
+        telemetry.get_ingestor().append_state(
+            (st.session_state.driver_id, org, dst, st.session_state.gps_lat, st.session_state.gps_lon, speed, stat, db.now_ms()),
+        )
     except Exception:
         pass
 
 def send_msg(stat, msg):
     """Send message to HQ (driver_comms). Server reads this for V2X Comms."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO driver_comms (timestamp, driver_id, status, message) VALUES (?, ?, ?, ?)",
-                  (datetime.datetime.now(), st.session_state.driver_id, stat, msg))
-        conn.commit()
-        conn.close()
+        db.execute("INSERT INTO driver_comms (timestamp_ms, driver_id, status, message) VALUES (?, ?, ?, ?)",
+                   (db.now_ms(), st.session_state.driver_id, stat, msg))
     except Exception:
         pass
 
+def get_hq_feed():
+    """This session's incremental HQ inbox (latest 10). Shared by the notifier, Home and Comms views."""
+    feed = st.session_state.get("hq_feed")
+    if feed is None or feed.driver_id != st.session_state.driver_id:
+        feed = st.session_state.hq_feed = comms.CommsFeed("hq_inbox", st.session_state.driver_id, 10, DB_FILE)
+    return feed
+
 def log_activity(action, actor, details=""):
     """Log activity for audit trail."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("INSERT INTO activity_log (timestamp, action, actor, details) VALUES (?, ?, ?, ?)",
-                  (datetime.datetime.now(), action, actor, details))
-        conn.commit()
-        conn.close()
+        db.execute("INSERT INTO activity_log (timestamp_ms, action, actor, details) VALUES (?, ?, ?, ?)",
+                   (db.now_ms(), action, actor, details))
         return True
     except Exception:
         return False
@@ -683,13 +534,9 @@ def log_activity(action, actor, details=""):
 def report_hazard(hazard_type="OTHER"):
     """Inserts a hazard record at current location with specified type."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
         type_str = f"{hazard_type}: {st.session_state.driver_id}" if hazard_type else "OTHER"
-        c.execute("INSERT INTO hazards (lat, lon, type, timestamp) VALUES (?, ?, ?, ?)",
-                  (st.session_state.gps_lat, st.session_state.gps_lon, type_str, datetime.datetime.now()))
-        conn.commit()
-        conn.close()
+        db.execute("INSERT INTO hazards (lat, lon, type, timestamp_ms) VALUES (?, ?, ?, ?)",
+                   (st.session_state.gps_lat, st.session_state.gps_lon, type_str, db.now_ms()))
         st.toast("Hazard Reported Successfully!", icon="⚠️")
     except Exception:
         pass
@@ -697,32 +544,14 @@ def report_hazard(hazard_type="OTHER"):
 def check_orders():
     """Fetch pending mission assigned to this driver (or unassigned). Expiry 30 min. Excludes persisted declines."""
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("PRAGMA journal_mode=WAL;")
         driver_id = str(st.session_state.get("driver_id", ""))
-        dfm = pd.read_sql_query(
-            """
-            SELECT m.* FROM missions m
-            WHERE m.status = 'DISPATCHED'
-              AND (m.assigned_driver_id IS NULL OR m.assigned_driver_id = ?)
-              AND NOT EXISTS (SELECT 1 FROM mission_declines d WHERE d.mission_id = m.mission_id AND d.driver_id = ?)
-            ORDER BY m.id DESC
-            LIMIT 5
-            """,
-            conn,
-            params=(driver_id, driver_id),
-        )
-        conn.close()
+        dfm = db.read_sql(queries.PENDING_ORDERS_SQL, (db.ago_ms(MISSION_EXPIRY_SEC), driver_id, driver_id))
         declined = st.session_state.get("declined_missions") or set()
         for _, row in dfm.iterrows():
             mid = row.get("mission_id")
             if mid and mid in declined:
                 continue
-            created = pd.to_datetime(row.get("created_at"), errors="coerce")
-            if pd.notna(created):
-                age_sec = (datetime.datetime.now() - created).total_seconds()
-                if age_sec < MISSION_EXPIRY_SEC:
-                    return row.to_dict()
+            return row.to_dict()
     except Exception:
         pass
     return None
@@ -843,14 +672,6 @@ def _mission_poller():
         st.session_state.pending_mission_sound = True
         st.rerun()
 
-# Poll clearance on load
-try:
-    _clearance = get_my_clearance()
-    if _clearance:
-        st.session_state.clearance_status = _clearance
-except Exception:
-    pass
-
 # HEADER (driver info + Online/status)
 try:
     _profile = get_driver_profile(st.session_state.get("driver_id", ""))
@@ -904,34 +725,47 @@ st.markdown(f"""
     <span style="color:rgba(0,255,136,0.9); font-size:10px; font-family:'JetBrains Mono'; letter-spacing:2px;">● SYNCED</span>
 </div>
 """, unsafe_allow_html=True)
-if st.session_state.clearance_status == "GRANTED":
-    st.markdown("""
-    <div style="background:rgba(0,255,136,0.1); backdrop-filter:blur(8px); border:1px solid rgba(0,255,136,0.5); border-radius:14px; padding:14px 20px; color:#00ff88; font-weight:700; font-family:'JetBrains Mono'; letter-spacing:2px; box-shadow:0 0 30px rgba(0,255,136,0.15);">
-        ✓ GREEN WAVE GRANTED
-    </div>
-    """, unsafe_allow_html=True)
-    st.session_state.clearance_status = None  # reset after showing so we can request again later
+# Once per session and driver: pick up a clearance that is still pending or on display (page reload, re-login)
+if st.session_state.get("clearance_seeded_for") != st.session_state.driver_id:
     try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("UPDATE drivers SET clearance_status = NULL WHERE driver_id = ?", (st.session_state.driver_id,))
-        conn.commit()
-        conn.close()
-    except Exception:
-        pass
-elif st.session_state.clearance_status == "DENIED":
-    st.markdown("""
-    <div style="background:rgba(255,0,80,0.1); backdrop-filter:blur(8px); border:1px solid rgba(255,0,80,0.5); border-radius:14px; padding:14px 20px; color:#ff0050; font-weight:700; font-family:'JetBrains Mono'; letter-spacing:2px; box-shadow:0 0 30px rgba(255,0,80,0.15);">
-        ✗ REQUEST DENIED
-    </div>
-    """, unsafe_allow_html=True)
-    st.session_state.clearance_status = None
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        conn.execute("UPDATE drivers SET clearance_status = NULL WHERE driver_id = ?", (st.session_state.driver_id,))
-        conn.commit()
-        conn.close()
+        st.session_state.clearance_status, st.session_state.clearance_until_ms = leases.clearance(st.session_state.driver_id)
     except Exception:
         pass
+    st.session_state.clearance_seeded_for = st.session_state.driver_id
+
+@st.fragment(run_every=3)
+def _clearance_live():
+    """Green-wave clearance result. Queries only while a request is outstanding; the lease expiry decides how
+    long GRANTED / DENIED stays up, so nothing is written back after it has been shown."""
+    status = st.session_state.clearance_status
+    if status is None:
+        return
+    if status == "PENDING":
+        try:
+            status, until_ms = leases.clearance(st.session_state.driver_id)
+        except Exception:
+            return
+        st.session_state.clearance_status = status
+        st.session_state.clearance_until_ms = until_ms
+    if status not in ("GRANTED", "DENIED"):
+        return
+    if db.now_ms() >= (st.session_state.get("clearance_until_ms") or 0):
+        st.session_state.clearance_status = None  # lease over: ready for the next request
+        return
+    if status == "GRANTED":
+        st.markdown("""
+        <div style="background:rgba(0,255,136,0.1); backdrop-filter:blur(8px); border:1px solid rgba(0,255,136,0.5); border-radius:14px; padding:14px 20px; color:#00ff88; font-weight:700; font-family:'JetBrains Mono'; letter-spacing:2px; box-shadow:0 0 30px rgba(0,255,136,0.15);">
+            ✓ GREEN WAVE GRANTED
+        </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.markdown("""
+        <div style="background:rgba(255,0,80,0.1); backdrop-filter:blur(8px); border:1px solid rgba(255,0,80,0.5); border-radius:14px; padding:14px 20px; color:#ff0050; font-weight:700; font-family:'JetBrains Mono'; letter-spacing:2px; box-shadow:0 0 30px rgba(255,0,80,0.15);">
+            ✗ REQUEST DENIED
+        </div>
+        """, unsafe_allow_html=True)
+
+_clearance_live()
 
 # Pending alert sound — show Play button when sound queued (HQ message or mission; fallback if autoplay blocked)
 if st.session_state.get("pending_sound_url") and st.session_state.get("sounds_enabled"):
@@ -984,8 +818,8 @@ with bar3:
     if st.button("🚪 Logout", key="logout_btn", use_container_width=True):
         # Clean up: mark driver offline in DB
         try:
-            with sqlite3.connect(DB_FILE) as conn:
-                conn.execute("UPDATE drivers SET status='OFFLINE', last_seen=? WHERE driver_id=?", (datetime.datetime.now(), st.session_state.driver_id))
+            telemetry.get_ingestor().flush()  # queued heartbeats must not land after OFFLINE
+            db.execute("UPDATE drivers SET status='OFFLINE', last_seen_ms=? WHERE driver_id=?", (db.now_ms(), st.session_state.driver_id))
         except Exception:
             pass
         st.session_state.driver_authenticated = False
@@ -1003,8 +837,7 @@ heartbeat()
 # Check if current mission was cancelled by HQ
 if st.session_state.active_mission_id:
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            row = conn.execute("SELECT status FROM missions WHERE mission_id=?", (st.session_state.active_mission_id,)).fetchone()
+        row = db.fetchone(queries.MISSION_STATUS_SQL, (st.session_state.active_mission_id,))
         if row and row[0] == "CANCELLED":
             mid_cancelled = st.session_state.active_mission_id
             st.session_state.active_mission_id = None
@@ -1046,10 +879,10 @@ if new_mission is not None and st.session_state.status == "IDLE" and st.session_
     prio_color = "#ff0050" if prio == "CRITICAL" else "#ff00ff" if prio == "HIGH" else "#00f5ff"
     
     # Mission countdown (30 min expiry)
-    created = pd.to_datetime(new_mission.get("created_at"), errors="coerce")
+    created_ms = new_mission.get("created_at_ms")
     mins_left = "—"
-    if pd.notna(created):
-        age_sec = (datetime.datetime.now() - created).total_seconds()
+    if created_ms is not None and pd.notna(created_ms):
+        age_sec = (db.now_ms() - int(created_ms)) / 1000
         remaining = max(0, 1800 - age_sec)
         mins_left = f"{int(remaining // 60)} min"
     # Build mission card HTML as single-line to avoid Streamlit multiline parsing
@@ -1098,16 +931,9 @@ if new_mission is not None and st.session_state.status == "IDLE" and st.session_
     with col_acc:
         if st.button("✓ Accept mission", key="accept_mission_btn", use_container_width=True):
             try:
-                conn = sqlite3.connect(DB_FILE)
-                c = conn.cursor()
                 # Atomic accept: only succeed if mission still unassigned or assigned to this driver
-                c.execute(
-                    "UPDATE missions SET status='ACCEPTED', accepted_at=?, assigned_driver_id=? WHERE mission_id=? AND (assigned_driver_id IS NULL OR assigned_driver_id=?)",
-                    (datetime.datetime.now(), st.session_state.driver_id, mid, st.session_state.driver_id),
-                )
-                rows = c.rowcount
-                conn.commit()
-                conn.close()
+                cur = db.execute(queries.ACCEPT_MISSION_SQL, (db.now_ms(), st.session_state.driver_id, mid, st.session_state.driver_id))
+                rows = cur.rowcount
                 if rows == 0:
                     st.warning("Mission was already accepted by another unit.")
                     st.rerun()
@@ -1137,19 +963,13 @@ if new_mission is not None and st.session_state.status == "IDLE" and st.session_
                 if st.button("Confirm decline", key="confirm_decline", use_container_width=True):
                     reason = decline_reason if decline_reason != "—" else ""
                     try:
-                        with sqlite3.connect(DB_FILE) as conn:
-                            conn.execute("PRAGMA journal_mode=WAL;")
-                            try:
-                                conn.execute("ALTER TABLE missions ADD COLUMN decline_reason TEXT")
-                            except sqlite3.OperationalError:
-                                pass
+                        with db.transaction() as conn:
                             conn.execute("UPDATE missions SET decline_reason=? WHERE mission_id=?", (reason, mid))
                             conn.execute("UPDATE missions SET assigned_driver_id=NULL WHERE mission_id=?", (mid,))
                             conn.execute(
-                                "INSERT OR REPLACE INTO mission_declines (mission_id, driver_id, declined_at, reason) VALUES (?, ?, ?, ?)",
-                                (mid, st.session_state.driver_id, datetime.datetime.now(), reason),
+                                "INSERT OR REPLACE INTO mission_declines (mission_id, driver_id, declined_at_ms, reason) VALUES (?, ?, ?, ?)",
+                                (mid, st.session_state.driver_id, db.now_ms(), reason),
                             )
-                            conn.commit()
                     except Exception:
                         st.error("Failed to update mission status.")
                     send_msg("DECLINE", f"Mission {mid} declined by {st.session_state.driver_id}. Reason: {reason}".strip())
@@ -1176,7 +996,7 @@ if st.session_state.route_selection_pending and st.session_state.route_alternati
     folium.Marker(dest, icon=folium.Icon(color="red", icon="flag", prefix="fa"), popup="TARGET").add_to(m)
     colors = ["#06b6d4", "#f59e0b", "#10b981", "#ec4899"]
     for i, r in enumerate(routes):
-        folium.PolyLine(r["coords"], color=colors[i % len(colors)], weight=4 if i == 0 else 2, opacity=0.8).add_to(m)
+        folium.PolyLine(geometry.map_coords(r, 13), color=colors[i % len(colors)], weight=4 if i == 0 else 2, opacity=0.8).add_to(m)
     st_folium(m, height=350, width=None, returned_objects=[])
     st.markdown("<div style='height:16px;'></div>", unsafe_allow_html=True)
     for i, r in enumerate(routes):
@@ -1209,14 +1029,11 @@ def _global_hq_notify():
     if not st.session_state.get("driver_authenticated"):
         return
     try:
-        conn = sqlite3.connect(DB_FILE)
-        row = conn.execute(
-            "SELECT id, message, status FROM driver_comms WHERE (status LIKE 'HQ%' OR driver_id='ALL' OR driver_id=?) ORDER BY id DESC LIMIT 1",
-            (st.session_state.driver_id,)
-        ).fetchone()
-        conn.close()
-        if row:
-            max_id, msg_text, msg_type = row[0], str(row[1] or "")[:50], str(row[2] or "")
+        feed = get_hq_feed()
+        feed.poll()
+        if feed.last_id:
+            latest = feed.latest(1)[0]
+            max_id, msg_text, msg_type = feed.last_id, str(latest["message"] or "")[:50], str(latest["status"] or "")
             last_seen = st.session_state.get("last_seen_hq_message_id", 0)
             if last_seen == 0:
                 st.session_state.last_seen_hq_message_id = max_id
@@ -1248,12 +1065,8 @@ with tab_drive:
     shift_dur = int((time.time() - st.session_state.get("shift_start", time.time())) / 60)
     completed = 0
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            row = conn.execute(
-                "SELECT COUNT(*) FROM missions WHERE assigned_driver_id=? AND status='COMPLETED'",
-                (st.session_state.driver_id,)
-            ).fetchone()
-            completed = row[0] if row else 0
+        row = db.fetchone(queries.COMPLETED_COUNT_SQL, (st.session_state.driver_id,))
+        completed = row[0] if row else 0
     except Exception:
         pass
 
@@ -1271,7 +1084,7 @@ with tab_drive:
     with dash_col2:
         if st.session_state.status == "EN_ROUTE" and st.session_state.active_dst:
             d_coords = HOSPITALS.get(st.session_state.active_dst)
-            dist = geodesic((st.session_state.gps_lat, st.session_state.gps_lon), d_coords).km if d_coords else 0
+            dist = distance_km(st.session_state.gps_lat, st.session_state.gps_lon, d_coords[0], d_coords[1]) if d_coords else 0
             eta = int(dist * 60 / 40)
             org_short = (st.session_state.active_org or "—")[:20]
             dst_short = (st.session_state.active_dst or "—")[:20]
@@ -1349,16 +1162,14 @@ with tab_drive:
     _rfh_lbl = "color:#8e8e93; font-size:10px; letter-spacing:4px; margin-bottom:8px"
     st.markdown(f"<div style='{_rfh_lbl}; font-family:JetBrains Mono,sans-serif'>RECENT FROM HQ</div>", unsafe_allow_html=True)
     try:
-        with sqlite3.connect(DB_FILE) as conn:
-            msgs = conn.execute(
-                "SELECT message, status, timestamp FROM driver_comms WHERE (status LIKE 'HQ%' OR driver_id='ALL' OR driver_id=?) ORDER BY id DESC LIMIT 4",
-                (st.session_state.driver_id,)
-            ).fetchall()
+        hq_feed = get_hq_feed()
+        hq_feed.poll()
+        msgs = hq_feed.latest(4)
         if msgs:
             for msg_row in msgs:
-                msg_txt = (msg_row[0] or "")[:60] + ("..." if len(str(msg_row[0] or "")) > 60 else "")
-                msg_type = str(msg_row[1] or "")
-                msg_time = str(msg_row[2] or "")[-8:] if msg_row[2] else ""
+                msg_txt = (msg_row["message"] or "")[:60] + ("..." if len(str(msg_row["message"] or "")) > 60 else "")
+                msg_type = str(msg_row["status"] or "")
+                msg_time = str(msg_row["timestamp"] or "")[-8:] if msg_row["timestamp"] else ""
                 icon = "🟢" if "GREENWAVE" in msg_type else "📡"
                 st.markdown(f"""
                 <div style="background:rgba(8,8,16,0.7); backdrop-filter:blur(8px); padding:14px 18px; border-radius:14px; margin-bottom:10px; border-left:4px solid rgba(0,245,255,0.5); font-size:13px; border:1px solid rgba(0,245,255,0.15); box-shadow:0 4px 20px rgba(0,0,0,0.3);">
@@ -1386,7 +1197,7 @@ with tab_map:
         m = folium.Map(location=start_pt, zoom_start=14, tiles="CartoDB dark_matter")
         folium.Marker(start_pt, icon=folium.Icon(color="blue", icon="ambulance", prefix="fa"), popup="YOU").add_to(m)
         folium.Marker(dest, icon=folium.Icon(color="red", icon="flag"), popup="TARGET").add_to(m)
-        folium.PolyLine(best["coords"], color="#00f3ff", weight=5, opacity=0.9).add_to(m)
+        folium.PolyLine(geometry.map_coords(best, 14), color="#00f3ff", weight=5, opacity=0.9).add_to(m)
 
         st_folium(m, height=350, width=None, returned_objects=[])
         
@@ -1479,22 +1290,17 @@ with tab_map:
                             org_d = st.session_state.active_org or "—"
                             dst_d = st.session_state.active_dst or "—"
                             try:
-                                with sqlite3.connect(DB_FILE) as conn:
-                                    conn.execute("UPDATE missions SET status='COMPLETED', completed_at=? WHERE mission_id=?", (datetime.datetime.now(), mid_complete))
-                                    row = conn.execute("SELECT accepted_at FROM missions WHERE mission_id=?", (mid_complete,)).fetchone()
+                                with db.transaction() as conn:
+                                    done_ms = db.now_ms()
+                                    conn.execute("UPDATE missions SET status='COMPLETED', completed_at_ms=? WHERE mission_id=?", (done_ms, mid_complete))
+                                    row = conn.execute("SELECT accepted_at_ms FROM missions WHERE mission_id=?", (mid_complete,)).fetchone()
                                     if row and row[0] and org_d in HOSPITALS and dst_d in HOSPITALS:
-                                        accepted = pd.to_datetime(row[0], errors="coerce")
-                                        if pd.notna(accepted):
-                                            actual_min = (datetime.datetime.now() - accepted).total_seconds() / 60
-                                            dist = distance_km(HOSPITALS[org_d][0], HOSPITALS[org_d][1], HOSPITALS[dst_d][0], HOSPITALS[dst_d][1])
-                                            avg_speed = round(dist / (actual_min / 60), 1) if actual_min > 0 else 0
-                                            time_saved = max(0, round(actual_min * 0.1, 1))
-                                            co2_saved = round(calculate_co2_savings(dist, time_saved), 2)
-                                            conn.execute(
-                                                "UPDATE mission_logs SET time_saved=?, co2_saved=?, avg_speed=? WHERE mission_id=?",
-                                                (time_saved, co2_saved, avg_speed, mid_complete),
-                                            )
-                                    conn.commit()
+                                        actual_min = (done_ms - row[0]) / 60000
+                                        dist = distance_km(HOSPITALS[org_d][0], HOSPITALS[org_d][1], HOSPITALS[dst_d][0], HOSPITALS[dst_d][1])
+                                        avg_speed = round(dist / (actual_min / 60), 1) if actual_min > 0 else 0
+                                        time_saved = max(0, round(actual_min * 0.1, 1))
+                                        co2_saved = round(calculate_co2_savings(dist, time_saved), 2)
+                                        conn.execute(queries.MISSION_LOG_RESULT_SQL, (time_saved, co2_saved, avg_speed, mid_complete))
                                 send_msg("STATUS", f"MISSION COMPLETE - {mid_complete} by {st.session_state.driver_id}. {org_d} → {dst_d}")
                             except Exception:
                                 pass
@@ -1645,9 +1451,10 @@ with tab_comms:
             st.rerun()
     with em2:
         if st.button("🟢 Green", use_container_width=True):
-            st.session_state.clearance_status = "PENDING"
-            heartbeat()
-            send_msg("REQUEST", f"GREEN WAVE REQUEST from {st.session_state.driver_id} - Location: {st.session_state.gps_lat:.4f}, {st.session_state.gps_lon:.4f}")
+            request_clearance()
+            junction, junction_km = spatial_index.nearest_junction(st.session_state.gps_lat, st.session_state.gps_lon)
+            near = f" - Nearest junction: {junction} ({junction_km:.1f} km)" if junction else ""
+            send_msg("REQUEST", f"GREEN WAVE REQUEST from {st.session_state.driver_id} - Location: {st.session_state.gps_lat:.4f}, {st.session_state.gps_lon:.4f}{near}")
             st.toast("Green Wave requested", icon="🟢")
             st.rerun()
     with em3:
@@ -1694,19 +1501,15 @@ with tab_comms:
     @st.fragment(run_every=3)
     def _hq_messages_live():
         try:
-            conn = sqlite3.connect(DB_FILE)
-            hq_msgs = pd.read_sql_query(
-                "SELECT * FROM driver_comms WHERE status LIKE 'HQ%' OR driver_id = 'ALL' OR driver_id = ? ORDER BY id DESC LIMIT 10",
-                conn,
-                params=(st.session_state.driver_id,)
-            )
-            conn.close()
+            feed = get_hq_feed()
+            feed.poll()
+            hq_msgs = feed.latest(10)
             
-            if not hq_msgs.empty:
-                max_id = int(hq_msgs.iloc[0].get('id', 0) or 0)
+            if hq_msgs:
+                max_id = feed.last_id
                 if st.session_state.get("last_seen_hq_message_id", 0) == 0:
                     st.session_state.last_seen_hq_message_id = max_id
-                for _, row in hq_msgs.iterrows():
+                for row in hq_msgs:
                     msg_time = row.get('timestamp', '')
                     msg_text = row.get('message', '')
                     msg_type = row.get('status', '')
@@ -1732,8 +1535,7 @@ with tab_comms:
     # Extra actions in expander (optional, when parked)
     with st.expander("More actions (when parked)"):
         if st.button("🔴 Emergency preempt", use_container_width=True, key="emerg_preempt"):
-            st.session_state.clearance_status = "PENDING"
-            heartbeat()
+            request_clearance()
             send_msg("REQUEST", f"⚠️ EMERGENCY PREEMPTION from {st.session_state.driver_id} - CRITICAL patient transport. Immediate signal clearance required!")
             st.toast("Emergency preemption requested", icon="🔴")
             st.rerun()
@@ -1764,12 +1566,7 @@ with tab_stats:
     shift_dur = int((time.time() - st.session_state.shift_start) / 60)
     
     try:
-        conn = sqlite3.connect(DB_FILE)
-        completed = conn.execute(
-            "SELECT COUNT(*) FROM missions WHERE status='COMPLETED' AND assigned_driver_id=?",
-            (st.session_state.driver_id,)
-        ).fetchone()[0]
-        conn.close()
+        completed = db.fetchone(queries.COMPLETED_COUNT_SQL, (st.session_state.driver_id,))[0]
     except Exception:
         completed = 0
     
@@ -1825,21 +1622,11 @@ with tab_alerts:
     @st.fragment(run_every=5)
     def _alerts_live():
         try:
-            conn = sqlite3.connect(DB_FILE)
-            hazards = pd.read_sql_query(
-                "SELECT * FROM hazards ORDER BY id DESC LIMIT 15",
-                conn
-            )
-            conn.close()
+            # Nearest recent hazards from the shared grid index (only new hazard rows are read per poll)
+            hazards = spatial_index.get_hazard_index(DB_FILE).nearest(st.session_state.gps_lat, st.session_state.gps_lon, 8)
             
-            if not hazards.empty:
-                hazards["dist_km"] = hazards.apply(
-                    lambda r: distance_km(st.session_state.gps_lat, st.session_state.gps_lon, r["lat"], r["lon"]),
-                    axis=1
-                )
-                hazards = hazards.sort_values("dist_km")
-                
-                for _, h in hazards.head(8).iterrows():
+            if hazards:
+                for h in hazards:
                     dist = h.get("dist_km", 0)
                     if dist < 2:
                         color = "#ff0050"
@@ -1895,19 +1682,7 @@ with tab_missions:
     st.markdown("### Mission history")
     
     try:
-        conn = sqlite3.connect(DB_FILE)
-        my_missions = pd.read_sql_query(
-            """
-            SELECT mission_id, created_at, origin, destination, priority, status, completed_at
-            FROM missions
-            WHERE assigned_driver_id = ?
-            ORDER BY id DESC
-            LIMIT 20
-            """,
-            conn,
-            params=(st.session_state.driver_id,)
-        )
-        conn.close()
+        my_missions = db.read_sql(queries.MISSION_HISTORY_SQL, (st.session_state.driver_id,))
         
         if not my_missions.empty:
             for i, (_, m) in enumerate(my_missions.iterrows()):
@@ -0,0 +1,177 @@
+"""
+Process-wide fleet state for the HQ dashboard.
+One background thread queries drivers / profiles / active missions at a fixed tick and publishes an
+immutable FleetSnapshot; every session and fragment reads the same object instead of querying SQLite.
+`version` only changes when the visible fleet state changes, so fragments can skip work on a no-op tick.
+"""
+import hashlib
+import threading
+import time
+from types import MappingProxyType
+
+import pandas as pd
+
+import db
+import spatial_index
+
+try:
+    from shared_utils import ONLINE_THRESHOLD_SEC
+except ImportError:
+    ONLINE_THRESHOLD_SEC = 60
+
+SNAPSHOT_TICK_SEC = 2.0
+SNAPSHOT_WINDOW_SEC = 300  # drivers seen within this window are kept; views filter narrower windows in memory
+
+DRIVER_FIELDS = ("driver_id", "status", "current_lat", "current_lon", "speed", "origin", "destination",
+                 "active_mission_id", "clearance_status", "selected_route_id", "last_seen_ms")
+DRIVERS_SQL = f"""
+    SELECT {", ".join("d." + c for c in DRIVER_FIELDS)} FROM drivers d
+    WHERE d.last_seen_ms >= ? AND EXISTS (SELECT 1 FROM driver_accounts a WHERE a.driver_id = d.driver_id)"""
+ACTIVE_MISSIONS_SQL = """
+    SELECT mission_id, origin, destination, status, assigned_driver_id FROM missions
+    WHERE status IN ('DISPATCHED', 'ACCEPTED') AND assigned_driver_id IS NOT NULL
+    ORDER BY id"""
+
+
+class FleetSnapshot:
+    """Immutable view of the fleet at `taken_ms`. DataFrames handed out are fresh copies."""
+
+    __slots__ = ("version", "taken_ms", "drivers", "profiles", "active_missions", "fingerprint")
+
+    def __init__(self, version, taken_ms, drivers, profiles, active_missions, fingerprint):
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "taken_ms", taken_ms)
+        object.__setattr__(self, "drivers", drivers)  # tuple of row tuples (DRIVER_FIELDS), registered drivers only
+        object.__setattr__(self, "profiles", profiles)  # driver_id -> {full_name, vehicle_id}
+        object.__setattr__(self, "active_missions", active_missions)  # driver_id -> latest DISPATCHED/ACCEPTED mission
+        object.__setattr__(self, "fingerprint", fingerprint)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FleetSnapshot is immutable")
+
+    def _frame(self, rows):
+        df = pd.DataFrame(list(rows), columns=list(DRIVER_FIELDS))
+        df["last_seen"] = [time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ms / 1000)) if ms else None
+                           for ms in df["last_seen_ms"]]
+        return df
+
+    def _online(self, online_within_seconds):
+        cutoff = self.taken_ms - int(online_within_seconds * 1000)
+        return [r for r in self.drivers if r[-1] is not None and r[-1] >= cutoff]
+
+    def available(self, online_within_seconds=ONLINE_THRESHOLD_SEC):
+        """Same rows/order as get_available_drivers(): online, has a fix, not on BREAK/INACTIVE."""
+        rows = [r for r in self._online(online_within_seconds)
+                if r[2] is not None and r[3] is not None and r[1] not in ("BREAK", "INACTIVE")]
+        rows.sort(key=lambda r: -r[-1])
+        rows.sort(key=lambda r: (r[1] is not None, r[1] or ""))
+        return self._frame(rows)
+
+    def live(self, online_within_seconds=60):
+        """Registered drivers seen within the window, with or without a GPS fix."""
+        return self._frame(self._online(online_within_seconds))
+
+    def driver(self, driver_id):
+        for r in self.drivers:
+            if r[0] == driver_id:
+                return dict(zip(DRIVER_FIELDS, r))
+        return None
+
+
+def _fingerprint(drivers, profiles, active_missions, taken_ms):
+    """Content hash of what the UI shows: positions/status/routes, who is online, names, missions (not last_seen ticks)."""
+    online_cutoff = taken_ms - ONLINE_THRESHOLD_SEC * 1000
+    h = hashlib.blake2b(digest_size=16)
+    for r in drivers:
+        h.update(repr(r[:-1]).encode())
+        h.update(b"1" if (r[-1] or 0) >= online_cutoff else b"0")
+    h.update(repr(sorted(profiles.items())).encode())
+    h.update(repr(sorted((k, tuple(v.items())) for k, v in active_missions.items())).encode())
+    return h.hexdigest()
+
+
+def load_snapshot(db_file=db.DB_FILE, previous=None, window_sec=SNAPSHOT_WINDOW_SEC):
+    """Query the fleet once. Reuses `previous` (same version) when nothing visible changed."""
+    taken_ms = db.now_ms()
+    drivers = [tuple(r) for r in db.fetchall(DRIVERS_SQL, (taken_ms - window_sec * 1000,), db_file=db_file)]
+    drivers = tuple(sorted(drivers, key=lambda r: r[0]))  # stable order for the fingerprint
+    profiles = {}
+    if drivers:
+        ids = [r[0] for r in drivers]
+        for did, name, vehicle in db.fetchall(
+            f"SELECT driver_id, full_name, vehicle_id FROM driver_accounts WHERE driver_id IN ({','.join('?' * len(ids))})",
+            ids,
+            db_file=db_file,
+        ):
+            profiles[did] = MappingProxyType({"full_name": name or "—", "vehicle_id": vehicle or "—"})
+    missions = {}
+    for mid, org, dst, status, did in db.fetchall(ACTIVE_MISSIONS_SQL, db_file=db_file):
+        missions[did] = MappingProxyType({"mission_id": mid, "origin": org, "destination": dst, "status": status})
+    fp = _fingerprint(drivers, profiles, missions, taken_ms)
+    version = 1
+    if previous is not None:
+        version = previous.version if previous.fingerprint == fp else previous.version + 1
+    return FleetSnapshot(version, taken_ms, drivers, MappingProxyType(profiles), MappingProxyType(missions), fp)
+
+
+class FleetSnapshotService(db.Worker):
+    """Refreshes the snapshot every `tick` seconds in a daemon thread; readers never touch SQLite.
+    driver_index (spatial_index.GridIndex) follows the snapshot: only drivers that moved are re-bucketed."""
+
+    def __init__(self, db_file=db.DB_FILE, tick=SNAPSHOT_TICK_SEC):
+        super().__init__(db_file, tick, name="titan-fleet-snapshot")
+        self.driver_index = spatial_index.GridIndex()
+        self.refreshes = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        try:
+            snap = load_snapshot(self.db_file, self._snapshot)
+        except Exception as e:
+            self.last_error = str(e)
+            return self._snapshot
+        if self._snapshot is None or snap.version != self._snapshot.version:
+            self._sync_index(snap)
+        self._snapshot = snap  # atomic reference swap
+        self.refreshes += 1
+        return snap
+
+    def _sync_index(self, snap):
+        present = set()
+        for r in snap.drivers:
+            if r[2] is not None and r[3] is not None:
+                self.driver_index.upsert(r[0], float(r[2]), float(r[3]))  # no-op unless the driver moved
+                present.add(r[0])
+        for did in self.driver_index.keys():
+            if did not in present:
+                self.driver_index.remove(did)
+
+    def nearest_drivers(self, lat, lon, k=10, where=None):
+        """[(driver_id, km)] nearest first, from the live driver index."""
+        self.current()
+        return self.driver_index.knn(lat, lon, k, where=where)
+
+    def tick(self):
+        return self.refresh()
+
+    def current(self):
+        """Latest snapshot (loaded synchronously on first use, then kept fresh by the thread)."""
+        snap = self._snapshot
+        if snap is not None:
+            return snap
+        with self._lock:
+            if self._snapshot is None:
+                self.refresh()
+            self.start()
+        return self._snapshot or FleetSnapshot(0, db.now_ms(), (), MappingProxyType({}), MappingProxyType({}), "")
+
+
+def get_service(db_file=db.DB_FILE):
+    """Process-wide service per database file; its thread starts on the first current()."""
+    return db.per_db("fleet_snapshot", db_file, FleetSnapshotService)
+
+
+def current(db_file=db.DB_FILE):
+    """Shortcut: the process-wide snapshot for db_file."""
+    return get_service(db_file).current()
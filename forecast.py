@@ -0,0 +1,201 @@
+"""
+Short-horizon congestion forecast per junction (5-30 min ahead).
+Model, vectorized across all junctions: a seasonal baseline per 15-minute slot of the week (running mean,
+then a slow EWMA once a slot has enough samples) plus an exponentially smoothed residual from that baseline
+that decays towards zero with the horizon:
+
+    flow(t + h) = baseline[slot(t + h)] + residual(t) * DAMPING_PER_MIN ** h
+
+Training is one vectorized update per sensor tick; baseline slots touched since the last save are upserted
+to `forecast_baseline` so the weekly profile survives restarts. rank_routes() uses the forecast along each
+route's corridor to re-rank alternatives.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import db
+import geometry
+import sensor_series
+from shared_utils import SENSORS_GRID
+
+SLOT_MIN = 15
+SLOTS_PER_WEEK = 7 * 24 * 60 // SLOT_MIN
+BASELINE_MEMORY = 2000          # samples per slot before the baseline becomes an EWMA (~4 weeks at 2s ticks)
+RESIDUAL_ALPHA = 0.1            # smoothing of the deviation from the baseline, per tick
+DAMPING_PER_MIN = 0.93          # residual half-life ~10 min
+HORIZONS_MIN = (5, 10, 15, 30)
+CORRIDOR_KM = 0.3               # junctions this close to a route are on its corridor
+JUNCTION_DELAY_MIN = (0.0, 1.0, 3.0, 0.0)  # expected extra minutes per junction, by status code (CLEAR, HEAVY, JAMMED, GREEN_WAVE)
+
+
+def slot_of(ts_ms):
+    """15-minute slot of the (local) week for an epoch-ms timestamp."""
+    t = time.localtime(ts_ms / 1000)
+    return (t.tm_wday * 1440 + t.tm_hour * 60 + t.tm_min) // SLOT_MIN
+
+
+class Forecaster:
+    """Per-junction seasonal baseline + damped residual. Thread-safe."""
+
+    def __init__(self, junctions=None):
+        junctions = dict(junctions or SENSORS_GRID)
+        self.names = list(junctions)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+        self.lat = np.array([junctions[k][0] for k in self.names], dtype=float)
+        self.lon = np.array([junctions[k][1] for k in self.names], dtype=float)
+        self.baseline = np.zeros((n, SLOTS_PER_WEEK))
+        self.samples = np.zeros((n, SLOTS_PER_WEEK), dtype=np.int64)
+        self.residual = np.zeros(n)
+        self.current = np.full(n, np.nan)  # last observed flow
+        self.last_ms = 0
+        self._dirty = set()                # slots changed since save()
+        self._corridors = OrderedDict()    # polyline -> junction rows (LRU)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------
+    # TRAINING
+    # ------------------------------------------
+    def update(self, ts_ms, rows, flows):
+        """One observation per junction row at ts_ms (vectorized)."""
+        rows = np.asarray(rows, dtype=np.int64)
+        flows = np.asarray(flows, dtype=float)
+        slot = slot_of(ts_ms)
+        with self._lock:
+            n = self.samples[rows, slot]
+            base = self.baseline[rows, slot]
+            resid = np.where(n > 0, flows - base, 0.0)
+            self.residual[rows] += RESIDUAL_ALPHA * (resid - self.residual[rows])
+            rate = 1.0 / np.minimum(n + 1, BASELINE_MEMORY)
+            self.baseline[rows, slot] = base + rate * (flows - base)
+            self.samples[rows, slot] = n + 1
+            self.current[rows] = flows
+            self.last_ms = max(self.last_ms, ts_ms)
+            self._dirty.add(slot)
+
+    def update_readings(self, ts_ms, readings):
+        """Train on sensors.py readings. GREEN_WAVE readings are a control override, not traffic, and are skipped."""
+        known = [r for r in readings if r[0] in self.index and r[1] != "GREEN_WAVE"]
+        if known:
+            self.update(ts_ms, [self.index[r[0]] for r in known], [r[2] for r in known])
+
+    # ------------------------------------------
+    # PREDICTION
+    # ------------------------------------------
+    def _expected(self, horizon_min, now_ms, with_residual):
+        slot = slot_of(now_ms + horizon_min * 60000)
+        n = self.samples[:, slot]
+        base = np.where(n > 0, self.baseline[:, slot], self.current)  # unseen slot: persistence
+        if with_residual:
+            base = base + np.where(n > 0, self.residual * DAMPING_PER_MIN ** horizon_min, 0.0)
+        return base
+
+    def predict(self, horizon_min, now_ms=None):
+        """Predicted flow (km/h) per junction, `horizon_min` ahead. NaN for junctions never observed."""
+        now_ms = now_ms or self.last_ms or db.now_ms()
+        with self._lock:
+            return self._expected(horizon_min, now_ms, True)
+
+    def typical(self, horizon_min, now_ms=None):
+        """Seasonal baseline alone (typical traffic for that time of week)."""
+        now_ms = now_ms or self.last_ms or db.now_ms()
+        with self._lock:
+            return self._expected(horizon_min, now_ms, False)
+
+    def outlook(self, horizons=HORIZONS_MIN):
+        """{junction: {horizon_min: (flow, status)}} for the UI."""
+        out = {name: {} for name in self.names}
+        for h in horizons:
+            flows = self.predict(h)
+            codes = sensor_series.classify(np.nan_to_num(flows, nan=100.0))
+            for i, name in enumerate(self.names):
+                if not math.isnan(flows[i]):
+                    out[name][h] = (float(flows[i]), sensor_series.STATUS_CODES[codes[i]])
+        return out
+
+    # ------------------------------------------
+    # ROUTE CORRIDORS
+    # ------------------------------------------
+    def corridor_rows(self, coords, radius_km=CORRIDOR_KM):
+        """Junction rows within radius_km of the polyline."""
+        if not coords or not self.names:
+            return np.zeros(0, dtype=np.int64)
+        dist, _ = geometry.project(coords, self.lat, self.lon)
+        return np.nonzero(dist <= radius_km)[0]
+
+    def _rows_for_route(self, route):
+        key = route.get("polyline")
+        if key is not None:
+            rows = self._corridors.get(key)
+            if rows is not None:
+                self._corridors.move_to_end(key)
+                return rows
+        rows = self.corridor_rows(route.get("coords") or [])
+        if key is not None:
+            self._corridors[key] = rows
+            if len(self._corridors) > 256:
+                self._corridors.popitem(last=False)
+        return rows
+
+    def route_outlook(self, route):
+        """Forecast along a route at the horizon it will be driven (half its ETA, 5-30 min):
+        {"horizon_min", "junctions", "status" (worst predicted), "delay_min" (vs the traffic its ETA already reflects)}.
+        Live routes are compared with current flow; precomputed (typical-traffic) routes with the seasonal baseline."""
+        rows = self._rows_for_route(route)
+        horizon = int(min(30, max(5, (route.get("eta") or 0) / 2)))
+        out = {"horizon_min": horizon, "junctions": [self.names[r] for r in rows], "status": None, "delay_min": 0.0}
+        if len(rows) == 0:
+            return out
+        pred = self.predict(horizon)[rows]
+        ref = self.typical(horizon)[rows] if route.get("fetched_at_ms") else self.current[rows]
+        seen = ~np.isnan(pred) & ~np.isnan(ref)
+        if not seen.any():
+            return out
+        delay = np.asarray(JUNCTION_DELAY_MIN)
+        p_codes = sensor_series.classify(pred[seen])
+        r_codes = sensor_series.classify(ref[seen])
+        out["status"] = sensor_series.STATUS_CODES[int(p_codes.max())]
+        out["delay_min"] = float(delay[p_codes].sum() - delay[r_codes].sum())
+        return out
+
+    # ------------------------------------------
+    # PERSISTENCE
+    # ------------------------------------------
+    def save(self, db_file=db.DB_FILE):
+        """Upsert baseline slots touched since the last save. Returns rows written."""
+        with self._lock:
+            slots, self._dirty = sorted(self._dirty), set()
+            params = [
+                (self.names[i], s, float(self.baseline[i, s]), int(self.samples[i, s]))
+                for s in slots for i in np.nonzero(self.samples[:, s])[0]
+            ]
+        if params:
+            db.executemany(
+                "INSERT INTO forecast_baseline (junction, slot, mean_flow, samples) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(junction, slot) DO UPDATE SET mean_flow=excluded.mean_flow, samples=excluded.samples",
+                params, db_file=db_file,
+            )
+        return len(params)
+
+    def load(self, db_file=db.DB_FILE):
+        rows = db.fetchall("SELECT junction, slot, mean_flow, samples FROM forecast_baseline", db_file=db_file)
+        with self._lock:
+            for name, slot, mean_flow, samples in rows:
+                i = self.index.get(name)
+                if i is not None and 0 <= slot < SLOTS_PER_WEEK:
+                    self.baseline[i, slot] = mean_flow
+                    self.samples[i, slot] = samples
+        return len(rows)
+
+
+def rank_routes(routes, forecaster):
+    """Annotate each route with "forecast" (route_outlook) and "eta_forecast" (eta + predicted delay), and
+    return them ordered by eta_forecast. Routes are updated in place; the input list is not reordered."""
+    for r in routes:
+        r["forecast"] = forecaster.route_outlook(r)
+        r["eta_forecast"] = max(0, int(round((r.get("eta") or 0) + r["forecast"]["delay_min"])))
+    return sorted(routes, key=lambda r: r["eta_forecast"])
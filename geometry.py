@@ -0,0 +1,164 @@
+"""
+Route geometry: Douglas-Peucker simplification and encoded-polyline storage.
+TomTom returns a point every few metres; routes are simplified once to STORE_TOLERANCE_DEG and kept as an
+encoded polyline string (CompactRoute). `route["coords"]` still works and decodes on access; maps ask for
+map_coords(route, zoom) to draw only the detail visible at that zoom.
+"""
+import math
+
+import numpy as np
+
+POLYLINE_PRECISION = 5            # 1e-5 deg ~ 1.1 m, the Google encoded-polyline default
+STORE_TOLERANCE_DEG = 2e-5        # ~2 m: invisible at street zoom, drops most of TomTom's points
+MAP_ZOOM_HEADROOM = 2             # map payloads keep 1-px accuracy this many zoom levels past the initial one
+_M_PER_DEG = 111320.0
+
+
+# ==========================================
+# SIMPLIFICATION
+# ==========================================
+def simplify(coords, tolerance_deg):
+    """Douglas-Peucker on [[lat, lon], ...] (planar, degrees). Always keeps both endpoints."""
+    pts = np.asarray(coords, dtype=float)
+    n = len(pts)
+    if n < 3 or tolerance_deg <= 0:
+        return pts.tolist()
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        seg = pts[i + 1:j]
+        a, b = pts[i], pts[j]
+        d = b - a
+        norm = math.hypot(d[0], d[1])
+        if norm == 0:
+            dist = np.hypot(seg[:, 0] - a[0], seg[:, 1] - a[1])
+        else:
+            dist = np.abs(d[0] * (seg[:, 1] - a[1]) - d[1] * (seg[:, 0] - a[0])) / norm
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance_deg:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return pts[keep].tolist()
+
+
+def tolerance_for_zoom(zoom, lat=10.0, pixels=1.0):
+    """Degrees spanned by `pixels` screen pixels at a web-mercator zoom level (256 px tiles)."""
+    m_per_px = 156543.03392 * math.cos(math.radians(lat)) / (2 ** zoom)
+    return pixels * m_per_px / _M_PER_DEG
+
+
+# ==========================================
+# ENCODED POLYLINE
+# ==========================================
+def encode(coords, precision=POLYLINE_PRECISION):
+    """Google encoded-polyline string for [[lat, lon], ...]."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lon = 0
+    for lat, lon in coords:
+        ilat, ilon = int(round(lat * factor)), int(round(lon * factor))
+        for delta in (ilat - prev_lat, ilon - prev_lon):
+            v = ~(delta << 1) if delta < 0 else delta << 1
+            while v >= 0x20:
+                out.append(chr((0x20 | (v & 0x1F)) + 63))
+                v >>= 5
+            out.append(chr(v + 63))
+        prev_lat, prev_lon = ilat, ilon
+    return "".join(out)
+
+
+def decode(polyline, precision=POLYLINE_PRECISION):
+    """Inverse of encode(): [[lat, lon], ...]."""
+    factor = 10 ** precision
+    coords = []
+    index = lat = lon = 0
+    length = len(polyline)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(polyline[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append([lat / factor, lon / factor])
+    return coords
+
+
+# ==========================================
+# COMPACT ROUTES
+# ==========================================
+class CompactRoute(dict):
+    """Route dict holding "polyline" instead of "coords"; route["coords"] / route.get("coords") decode on access."""
+
+    def __missing__(self, key):
+        if key == "coords" and "polyline" in self:
+            return decode(self["polyline"])
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key == "coords" and not dict.__contains__(self, "coords") and "polyline" in self:
+            return decode(self["polyline"])
+        return dict.get(self, key, default)
+
+    @property
+    def coords(self):
+        return self["coords"]
+
+
+def compact(route, tolerance_deg=STORE_TOLERANCE_DEG):
+    """Route dict with "coords" -> CompactRoute with a simplified encoded "polyline" (other keys kept)."""
+    if isinstance(route, CompactRoute):
+        return route
+    out = CompactRoute((k, v) for k, v in route.items() if k != "coords")
+    coords = route.get("coords")
+    if "polyline" not in out:
+        out["polyline"] = encode(simplify(coords or [], tolerance_deg))
+    return out
+
+
+def project(coords, lats, lons):
+    """Nearest point on the polyline for each query point: (distance_km, along_km) arrays, along_km measured
+    from the first vertex. Local equirectangular projection (fine at city scale)."""
+    pts = np.asarray(coords, dtype=float).reshape(-1, 2)
+    lats = np.atleast_1d(np.asarray(lats, dtype=float))
+    lons = np.atleast_1d(np.asarray(lons, dtype=float))
+    if len(pts) == 0:
+        return np.full(len(lats), np.inf), np.zeros(len(lats))
+    km_lat = _M_PER_DEG / 1000.0
+    km_lon = km_lat * math.cos(math.radians(float(pts[:, 0].mean())))
+    px, py = pts[:, 1] * km_lon, pts[:, 0] * km_lat
+    qx, qy = (lons * km_lon)[:, None], (lats * km_lat)[:, None]
+    if len(pts) == 1:
+        return np.hypot(qx[:, 0] - px[0], qy[:, 0] - py[0]), np.zeros(len(lats))
+    dx, dy = np.diff(px), np.diff(py)
+    seg_len = np.hypot(dx, dy)
+    cum = np.concatenate([[0.0], np.cumsum(seg_len)])
+    seg2 = np.where(seg_len > 0, seg_len ** 2, 1.0)
+    t = np.clip(((qx - px[:-1]) * dx + (qy - py[:-1]) * dy) / seg2, 0.0, 1.0)
+    d = np.hypot(qx - (px[:-1] + t * dx), qy - (py[:-1] + t * dy))
+    k = np.argmin(d, axis=1)
+    rows = np.arange(len(lats))
+    return d[rows, k], cum[k] + t[rows, k] * seg_len[k]
+
+
+def map_coords(route, zoom, headroom=MAP_ZOOM_HEADROOM):
+    """Points of a route worth sending to the browser for a map opened at `zoom`, with detail for
+    `headroom` further zoom-ins. Plain route dicts (older sessions, fallbacks) work too."""
+    coords = route.get("coords") or []
+    if len(coords) < 3:
+        return coords
+    return simplify(coords, tolerance_for_zoom(zoom + headroom, coords[0][0]))
+
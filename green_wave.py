@@ -0,0 +1,147 @@
+"""
+Automatic corridor green wave.
+For every ACCEPTED mission with a published route (missions.route_polyline), the scheduler finds the
+SENSORS_GRID junctions within CORRIDOR_KM of the route (cached per polyline), places the unit on the route
+from its live fix, and estimates arrival at each junction ahead from its speed. Junctions the unit will
+reach within WINDOW_AHEAD_SEC are set to GREEN_WAVE in `signal_status` (mission_id = owner); junctions it
+has passed, or whose mission ended, are cleared. Each tick diffs the wanted set against the rows it owns
+and applies the changes in one transaction, so the cost is one missions read per tick plus a few
+vectorized projections per mission. Rows carry a short lease (leases.SCHEDULED_GREEN_TTL_SEC) renewed while
+wanted, so they lapse if HQ stops. Unexpired manual overrides (mission_id NULL) are never touched.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+import db
+import fleet_snapshot
+import geometry
+import leases
+from shared_utils import SENSORS_GRID
+
+GW_TICK_SEC = 2.0
+CORRIDOR_KM = 0.2               # junction must be this close to the route to be preempted
+WINDOW_AHEAD_SEC = 90           # green from this long before the expected arrival
+PASSED_KM = 0.05                # keep green until the unit is this far past the junction
+OFF_ROUTE_KM = 0.5              # unit further than this from its route: no preemption (rerouting / bad fix)
+MIN_SPEED_KMH = 20              # stopped or unknown speed: assume a crawl, not "never arrives"
+CORRIDOR_CACHE_SIZE = 256
+
+MISSIONS_SQL = "SELECT mission_id, assigned_driver_id, route_polyline FROM missions WHERE status = 'ACCEPTED' AND route_polyline IS NOT NULL"
+OWNED_SQL = "SELECT stop_id, mission_id, expires_at_ms FROM signal_status WHERE mission_id IS NOT NULL"
+# A manual GREEN_WAVE (mission_id NULL) already does the job and stays under operator control
+UPSERT_SQL = (
+    "INSERT INTO signal_status (stop_id, status, mission_id, last_updated_ms, expires_at_ms) VALUES (?, 'GREEN_WAVE', ?, ?, ?) "
+    "ON CONFLICT(stop_id) DO UPDATE SET status='GREEN_WAVE', mission_id=excluded.mission_id, "
+    "last_updated_ms=excluded.last_updated_ms, expires_at_ms=excluded.expires_at_ms "
+    "WHERE signal_status.mission_id IS NOT NULL OR signal_status.status IS NOT 'GREEN_WAVE' OR signal_status.expires_at_ms <= excluded.last_updated_ms"
+)
+CLEAR_SQL = "DELETE FROM signal_status WHERE stop_id=? AND mission_id IS NOT NULL"
+
+
+class Corridor:
+    """Route polyline plus the junctions along it, sorted by distance from the start of the route."""
+    __slots__ = ("coords", "junctions", "along_km")
+
+    def __init__(self, coords, junctions=None, radius_km=CORRIDOR_KM):
+        junctions = SENSORS_GRID if junctions is None else junctions
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)  # converted once, reused every locate()
+        names = list(junctions)
+        if not len(self.coords) or not names:
+            self.junctions, self.along_km = [], np.zeros(0)
+            return
+        lats = [junctions[n][0] for n in names]
+        lons = [junctions[n][1] for n in names]
+        dist, along = geometry.project(self.coords, lats, lons)
+        hit = np.nonzero(dist <= radius_km)[0]
+        order = hit[np.argsort(along[hit], kind="stable")]
+        self.junctions = [names[i] for i in order]
+        self.along_km = along[order]
+
+    def locate(self, lat, lon):
+        """(along_km, off_route_km) of a position on this route."""
+        dist, along = geometry.project(self.coords, [lat], [lon])
+        return float(along[0]), float(dist[0])
+
+    def ahead(self, lat, lon, speed_kmh, window_sec=WINDOW_AHEAD_SEC):
+        """[(junction, eta_sec)] the unit reaches within window_sec (or has only just passed), nearest first."""
+        if not self.junctions:
+            return []
+        along, off = self.locate(lat, lon)
+        if off > OFF_ROUTE_KM:
+            return []
+        to_go = self.along_km - along
+        eta = np.maximum(to_go, 0.0) / max(speed_kmh or 0.0, MIN_SPEED_KMH) * 3600.0
+        sel = np.nonzero((to_go >= -PASSED_KM) & (eta <= window_sec))[0]
+        return [(self.junctions[i], float(eta[i])) for i in sel]
+
+
+class GreenWaveScheduler(db.Worker):
+    def __init__(self, db_file=db.DB_FILE, tick=GW_TICK_SEC, window_sec=WINDOW_AHEAD_SEC):
+        super().__init__(db_file, tick, name="titan-green-wave")
+        self.window_sec = window_sec
+        self.active = {}        # junction -> (mission_id, eta_sec) as of the last tick
+        self.set_count = 0
+        self.cleared_count = 0
+        self._corridors = OrderedDict()
+
+    def corridor(self, polyline):
+        c = self._corridors.get(polyline)
+        if c is None:
+            c = self._corridors[polyline] = Corridor(geometry.decode(polyline))
+            if len(self._corridors) > CORRIDOR_CACHE_SIZE:
+                self._corridors.popitem(last=False)
+        else:
+            self._corridors.move_to_end(polyline)
+        return c
+
+    def plan(self, missions, positions):
+        """{junction: (mission_id, eta_sec)} wanted green now. missions: [(mission_id, driver_id, polyline)];
+        positions: {driver_id: (lat, lon, speed_kmh)}. Shared junctions go to the earliest arrival."""
+        wanted = {}
+        for mission_id, driver_id, polyline in missions:
+            pos = positions.get(driver_id)
+            if not polyline or not pos or pos[0] is None or pos[1] is None:
+                continue
+            for junction, eta in self.corridor(polyline).ahead(float(pos[0]), float(pos[1]), pos[2], self.window_sec):
+                if junction not in wanted or eta < wanted[junction][1]:
+                    wanted[junction] = (mission_id, eta)
+        return wanted
+
+    def apply(self, wanted):
+        """Diff against the scheduler-owned signal_status rows and write the changes in one transaction."""
+        now = db.now_ms()
+        ttl_ms = leases.SCHEDULED_GREEN_TTL_SEC * 1000
+        with db.transaction(self.db_file) as conn:
+            owned = {j: (mid, exp or 0) for j, mid, exp in conn.execute(OWNED_SQL)}
+            # New / reassigned junctions, plus renewals of leases past half-life (rows lapse if HQ stops)
+            upserts = [(j, mid, now, now + ttl_ms) for j, (mid, _) in wanted.items()
+                       if j not in owned or owned[j][0] != mid or owned[j][1] - now < ttl_ms // 2]
+            clears = [(j,) for j in owned if j not in wanted]
+            if upserts:
+                conn.executemany(UPSERT_SQL, upserts)
+            if clears:
+                conn.executemany(CLEAR_SQL, clears)
+        self.set_count += len(upserts)
+        self.cleared_count += len(clears)
+        return len(upserts), len(clears)
+
+    def tick(self):
+        missions = db.fetchall(MISSIONS_SQL, db_file=self.db_file)
+        positions = {}
+        if missions:
+            snap = fleet_snapshot.current(self.db_file)
+            want = {m[1] for m in missions}
+            for r in snap.drivers:
+                if r[0] in want:
+                    d = dict(zip(fleet_snapshot.DRIVER_FIELDS, r))
+                    positions[r[0]] = (d["current_lat"], d["current_lon"], d["speed"])
+        wanted = self.plan(missions, positions)
+        changes = self.apply(wanted) if (wanted or self.active or self.runs == 0) else (0, 0)
+        self.active = wanted
+        return changes
+
+
+def ensure_worker(db_file=db.DB_FILE, tick=GW_TICK_SEC):
+    """Start the scheduler thread once per process; later calls return the running worker."""
+    return db.ensure_worker("green_wave", db_file, lambda path: GreenWaveScheduler(path, tick))
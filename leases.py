@@ -0,0 +1,97 @@
+"""
+Time-limited state for signal overrides and green-wave clearance.
+signal_status rows and drivers.clearance_status carry an expiry (expires_at_ms / clearance_expires_ms):
+writers set it, readers filter on it, and one sweeper thread per process deletes / clears what has
+lapsed, so an abandoned SET GREEN or an unanswered request drops out on its own. Nobody has to write
+again just to reset state after it has been shown.
+"""
+import db
+
+MANUAL_GREEN_TTL_SEC = 600         # operator SET GREEN from Traffic Signal Control
+SCHEDULED_GREEN_TTL_SEC = 30       # green_wave.py rows; renewed by the scheduler while still wanted
+CLEARANCE_REQUEST_TTL_SEC = 300    # PENDING request waits this long for HQ
+CLEARANCE_RESULT_TTL_SEC = 60      # GRANTED / DENIED is shown to the driver for this long
+SWEEP_INTERVAL_SEC = 15
+
+# Read-side filters (the sweeper may lag by up to SWEEP_INTERVAL_SEC)
+LIVE_SIGNAL = "expires_at_ms > ?"
+LIVE_CLEARANCE = "clearance_expires_ms > ?"
+GREEN_JUNCTIONS_SQL = f"SELECT stop_id FROM signal_status WHERE status = 'GREEN_WAVE' AND {LIVE_SIGNAL}"
+CLEARANCE_SQL = f"SELECT clearance_status, clearance_expires_ms FROM drivers WHERE driver_id = ? AND {LIVE_CLEARANCE}"
+SWEEP_SIGNALS_SQL = "DELETE FROM signal_status WHERE expires_at_ms <= ?"
+SWEEP_CLEARANCE_SQL = "UPDATE drivers SET clearance_status = NULL, clearance_expires_ms = NULL WHERE clearance_expires_ms <= ?"
+
+
+def expiry(ttl_sec):
+    return db.now_ms() + int(ttl_sec * 1000)
+
+
+# ==========================================
+# SIGNAL OVERRIDES
+# ==========================================
+def set_green(stop_id, ttl_sec=MANUAL_GREEN_TTL_SEC, db_file=db.DB_FILE):
+    """Manual GREEN_WAVE for a junction (mission_id NULL: the scheduler leaves it alone)."""
+    now = db.now_ms()
+    db.execute(
+        "INSERT OR REPLACE INTO signal_status (stop_id, status, mission_id, last_updated_ms, expires_at_ms) VALUES (?, 'GREEN_WAVE', NULL, ?, ?)",
+        (stop_id, now, now + int(ttl_sec * 1000)),
+        db_file=db_file,
+    )
+
+
+def reset_signal(stop_id, db_file=db.DB_FILE):
+    db.execute("DELETE FROM signal_status WHERE stop_id = ?", (stop_id,), db_file=db_file)
+
+
+def green_junctions(db_file=db.DB_FILE):
+    """Junctions currently under an unexpired GREEN_WAVE."""
+    rows = db.fetchall(GREEN_JUNCTIONS_SQL, (db.now_ms(),), db_file=db_file)
+    return {r[0] for r in rows}
+
+
+# ==========================================
+# CLEARANCE REQUESTS
+# ==========================================
+def request_clearance(driver_id, ttl_sec=CLEARANCE_REQUEST_TTL_SEC, db_file=db.DB_FILE):
+    """PENDING request. An upsert, so it lands even before the driver's first telemetry row is written."""
+    db.execute(
+        "INSERT INTO drivers (driver_id, clearance_status, clearance_expires_ms) VALUES (?, 'PENDING', ?) "
+        "ON CONFLICT(driver_id) DO UPDATE SET clearance_status = 'PENDING', clearance_expires_ms = excluded.clearance_expires_ms",
+        (driver_id, expiry(ttl_sec)),
+        db_file=db_file,
+    )
+
+
+def resolve_clearance(driver_id, status, ttl_sec=CLEARANCE_RESULT_TTL_SEC, db_file=db.DB_FILE):
+    """GRANTED / DENIED, visible to the driver until the lease runs out."""
+    if status not in ("GRANTED", "DENIED"):
+        return False
+    db.execute(
+        "UPDATE drivers SET clearance_status = ?, clearance_expires_ms = ? WHERE driver_id = ?",
+        (status, expiry(ttl_sec), driver_id),
+        db_file=db_file,
+    )
+    return True
+
+
+def clearance(driver_id, db_file=db.DB_FILE):
+    """(status, expires_at_ms) of the driver's unexpired clearance, or (None, None)."""
+    row = db.fetchone(CLEARANCE_SQL, (driver_id, db.now_ms()), db_file=db_file)
+    return (row[0], row[1]) if row and row[0] else (None, None)
+
+
+# ==========================================
+# SWEEPER (one per process per DB file)
+# ==========================================
+def sweep(db_file=db.DB_FILE):
+    """Delete expired signal overrides and clear lapsed clearance states. Returns counts."""
+    now = db.now_ms()
+    with db.transaction(db_file) as conn:
+        signals = conn.execute(SWEEP_SIGNALS_SQL, (now,)).rowcount
+        clearances = conn.execute(SWEEP_CLEARANCE_SQL, (now,)).rowcount
+    return {"signals": signals, "clearances": clearances}
+
+
+def ensure_worker(db_file=db.DB_FILE, interval=SWEEP_INTERVAL_SEC):
+    """Start the sweeper thread once per process (db.Worker running sweep); later calls return it."""
+    return db.ensure_worker("leases", db_file, lambda path: db.Worker(path, interval, sweep, name="titan-lease-sweeper"))
@@ -0,0 +1,251 @@
+"""
+Incremental live maps for streamlit-folium.
+The base map (tiles, routes, origin / destination) only changes with the route, so st_folium's content hash
+stays the same between ticks and the browser keeps its Leaflet map. Moving objects (drivers, hazards,
+green-wave zones, ghost trail) go through a LiveLayer: each tick diffs the current items against what was
+sent last and hands st_folium a feature group carrying only that diff (added features / moved coordinates /
+removed ids), which a small script applies to a persistent layer inside the iframe. Nothing changed: nothing
+is sent. The browser reports the seq of the last diff it applied through the st_folium return value (SEQ_FIELD),
+and reports -1 right away when it sees a gap or was remounted. A full keyframe (one GeoJSON FeatureCollection
+per layer, map_layers.py) goes out when the base map changes, when that report is missing or does not match,
+and every KEYFRAME_TICKS ticks as a backstop. LIVE_MAP_MODE=full sends a keyframe every tick (the old
+behaviour, for comparison).
+"""
+import json
+import math
+import os
+import time
+
+import folium
+from branca.element import MacroElement
+from jinja2 import Template
+
+import map_layers
+from map_layers import DRIVER, GREEN, HAZARD, TRAIL
+
+LIVE_MAP_MODE = os.environ.get("LIVE_MAP_MODE", "incremental")   # "incremental" or "full"
+KEYFRAME_TICKS = 60               # resend everything this often (~5 min at the 5 s map refresh)
+COORD_DECIMALS = 5                # ~1 m; finer jitter is not a move
+SEQ_FIELD = "last_geocoder_result"  # st_folium return key the browser reports its applied seq in (add to returned_objects)
+
+
+# ==========================================
+# ITEMS: key -> (kind, latlng, properties); popups come from map_layers.TEMPLATES[properties["tpl"]]
+# ==========================================
+def _ll(lat, lon):
+    return (round(float(lat), COORD_DECIMALS), round(float(lon), COORD_DECIMALS))
+
+
+def _text(v):
+    return "—" if v is None or (isinstance(v, float) and math.isnan(v)) else str(v)
+
+
+def driver(lat, lon, color, template="driver_line", **fields):
+    """Template fields are shown as text (escaped in the browser); None / NaN show as a dash."""
+    return (DRIVER, _ll(lat, lon), {"color": color, "tpl": template, **{k: _text(v) for k, v in fields.items()}})
+
+
+def hazard(lat, lon, type_):
+    return (HAZARD, _ll(lat, lon), {"color": "orange", "tpl": "hazard", "type": type_})
+
+
+def green_zone(lat, lon, area):
+    return (GREEN, _ll(lat, lon), {"color": "#00ff00", "tpl": "green", "area": area})
+
+
+def trail(coords, color="#00ff9d"):
+    return (TRAIL, tuple(_ll(p[0], p[1]) for p in coords), {"color": color})
+
+
+# ==========================================
+# BROWSER SIDE
+# ==========================================
+_APPLY_JS = """
+window.titanLiveApply = function (diff) {
+    var map = window.map, T = window.titanTemplates || {};
+    var reg = window.titanLive;
+    if (!reg || reg.map !== map || diff.full) {
+        if (reg && reg.map) { reg.map.removeLayer(reg.group); }
+        reg = window.titanLive = {map: map, group: L.layerGroup().addTo(map), items: {}, seq: 0};
+    }
+    if (!diff.full && reg.seq !== diff.prev) {
+        // Missed a diff (or the map was remounted): report seq -1 now so the server sends a keyframe
+        reg.seq = -1;
+        window.titanLiveReport(true);
+        return;
+    }
+    function esc(v) {
+        return v == null ? "" : String(v).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;");
+    }
+    function fill(t, p) { return t.replace(/\\{(\\w+)\\}/g, function (_, k) { return esc(p[k]); }); }
+    function drop(id) {
+        var o = reg.items[id];
+        if (o) { o.parent.removeLayer(o.layer); delete reg.items[id]; }
+    }
+    function add(fc) {
+        var g = L.geoJSON(null, {
+            pointToLayer: function (f, ll) {
+                var p = f.properties;
+                if (p.kind === "green") { return L.circle(ll, {radius: 300}); }
+                if (p.kind === "cluster") {
+                    var size = 26 + Math.min(24, 4 * Math.log2(p.count));
+                    return L.marker(ll, {icon: L.divIcon({className: "", iconSize: [size, size], html:
+                        '<div style="width:' + size + 'px; height:' + size + 'px; line-height:' + size + 'px; border-radius:50%; text-align:center; '
+                        + 'font:bold 12px sans-serif; color:#000; background:' + p.color + '; opacity:0.85;">' + p.count + '</div>'})});
+                }
+                return L.marker(ll, {icon: L.AwesomeMarkers.icon({
+                    icon: p.kind === "hazard" ? "exclamation-triangle" : "ambulance", prefix: "fa",
+                    markerColor: p.color, iconColor: "white", extraClasses: "fa-rotate-0"})});
+            },
+            style: function (f) {
+                var p = f.properties;
+                return p.kind === "trail" ? {color: p.color, weight: 3, dashArray: "5, 10", opacity: 0.7}
+                    : {color: p.color, fill: true, fillColor: p.color, fillOpacity: 0.3};
+            },
+            onEachFeature: function (f, layer) {
+                var t = T[f.properties.tpl] || {};
+                if (t.popup) { layer.bindPopup(fill(t.popup, f.properties), {maxWidth: 280}); }
+                if (t.tooltip) { layer.bindTooltip(fill(t.tooltip, f.properties)); }
+                if (f.properties.kind === "cluster") {
+                    layer.on("click", function () { map.setView(layer.getLatLng(), map.getZoom() + 2); });
+                }
+                drop(f.id);
+                reg.items[f.id] = {layer: layer, parent: g};
+            }
+        });
+        g.addData(fc).addTo(reg.group);
+    }
+    if (diff.full) {
+        Object.keys(diff.layers).forEach(function (k) { add(diff.layers[k]); });
+    } else {
+        diff.remove.forEach(drop);
+        if (diff.add.features.length) { add(diff.add); }
+        diff.move.forEach(function (m) {
+            var o = reg.items[m[0]];
+            if (!o) { return; }
+            if (Array.isArray(m[1][0])) { o.layer.setLatLngs(L.GeoJSON.coordsToLatLngs(m[1])); }
+            else { o.layer.setLatLng(L.GeoJSON.coordsToLatLng(m[1])); }
+        });
+    }
+    reg.seq = diff.seq;
+    window.titanLiveReport(false);
+};
+window.titanLiveReport = function (now) {
+    // st_folium returns a fixed set of keys; SEQ_FIELD is otherwise only written by the Geocoder plugin
+    var g = window.__GLOBAL_DATA__, reg = window.titanLive;
+    if (!g) { return; }
+    g.{{ this.seq_field }} = {seq: reg && reg.map === window.map ? reg.seq : -1, at: Date.now()};
+    if (now && window.map) { window.map.fire("moveend"); }  // st_folium reports its value on moveend
+};
+setTimeout(function () { window.titanLiveReport(true); }, 0);  // (re)mounted map: tell the server what it holds
+"""
+
+
+class _ApplyScript(MacroElement):
+    """Defines window.titanLiveApply and the shared popup templates; part of the (static) base map."""
+    _template = Template("{% macro script(this, kwargs) %}{{ this.templates }}" + _APPLY_JS + "{% endmacro %}")
+
+    def __init__(self):
+        super().__init__()
+        self.templates = map_layers.templates_js()
+        self.seq_field = SEQ_FIELD
+
+
+class _DiffScript(MacroElement):
+    _template = Template("{% macro script(this, kwargs) %}window.titanLiveApply({{ this.payload }});{% endmacro %}")
+
+    def __init__(self, payload):
+        super().__init__()
+        self._name = "TitanLiveDiff"
+        self.payload = payload   # JSON text (map_layers.dumps / cached collections)
+
+
+def attach(m):
+    """Add the diff applier to a base map. Call once per base map build."""
+    _ApplyScript().add_to(m)
+    return m
+
+
+# ==========================================
+# SERVER SIDE (one per map per session)
+# ==========================================
+class LiveLayer:
+    """Remembers what one browser map holds and produces the next diff."""
+
+    def __init__(self, keyframe_ticks=None):
+        if keyframe_ticks is None:
+            keyframe_ticks = 0 if LIVE_MAP_MODE == "full" else KEYFRAME_TICKS
+        self.keyframe_ticks = keyframe_ticks
+        self.items = {}
+        self.base_key = None
+        self.center = None
+        self.returned = None      # last st_folium return value (bounds / zoom when the map reports them)
+        self.seq = 0
+        self.report_at = None     # browser timestamp of the last seq report acted on
+        self.since_keyframe = 0
+        self.last_bytes = 0
+        self.last_ms = 0.0
+        self.total_bytes = 0
+
+    def anchor(self, base_key, center):
+        """Initial center of the base map: fixed while base_key is unchanged, so following a unit pans the
+        existing map (st_folium center=) instead of producing a different base map every tick."""
+        if base_key != self.base_key or self.center is None:
+            self.center = list(center)
+            self.returned = None  # the browser is about to show a different view
+        return self.center
+
+    def in_sync(self):
+        """False when the browser has not reported yet, or its latest report is not the seq we sent last. Reports
+        are only compared once: between them the browser keeps applying diffs in order."""
+        report = (self.returned or {}).get(SEQ_FIELD)
+        if not isinstance(report, dict):
+            return False
+        if report.get("at") == self.report_at:
+            return True
+        self.report_at = report.get("at")
+        return report.get("seq") == self.seq
+
+    def diff(self, items, base_key):
+        """JSON text of the next update, or None when nothing changed. Keyframe:
+        {"full": true, "seq", "prev", "layers": {kind: FeatureCollection}}; otherwise
+        {"full": false, "seq", "prev", "add": FeatureCollection, "move": [[id, coordinates]], "remove": [id]}."""
+        full = base_key != self.base_key or self.since_keyframe >= self.keyframe_ticks or not self.in_sync()
+        add, move, remove = [], [], []
+        if not full:
+            for k, v in items.items():
+                old = self.items.get(k)
+                if old is None or old[0] != v[0] or old[2] != v[2]:
+                    add.append(map_layers.feature(k, *v))
+                elif old[1] != v[1]:
+                    move.append([k, map_layers.coordinates(v[0], v[1])])
+            remove = [k for k in self.items if k not in items]
+        self.items = dict(items)
+        self.base_key = base_key
+        if not (full or add or move or remove):
+            self.since_keyframe += 1
+            return None
+        self.since_keyframe = 0 if full else self.since_keyframe + 1
+        prev, self.seq = self.seq, self.seq + 1
+        head = f'{{"full":{json.dumps(full)},"seq":{self.seq},"prev":{prev},'
+        if full:
+            layers = map_layers.layers_json(items)
+            return head + '"layers":{' + ",".join(f'"{k}":{v}' for k, v in layers.items()) + "}}"
+        return (head + '"add":' + map_layers.dumps(map_layers.collection(add)) + ',"move":' + map_layers.dumps(move)
+                + ',"remove":' + map_layers.dumps(remove) + "}")
+
+    def feature_group(self, items, base_key):
+        """folium.FeatureGroup for st_folium(feature_group_to_add=...), or None when nothing changed
+        (the browser keeps its layer; st_folium only re-evaluates a feature group that differs)."""
+        t0 = time.perf_counter()
+        payload = self.diff(items, base_key)
+        if payload is None:
+            self.last_bytes = 0
+            self.last_ms = (time.perf_counter() - t0) * 1000
+            return None
+        fg = folium.FeatureGroup(name="live", control=False)
+        _DiffScript(payload).add_to(fg)
+        self.last_bytes = len(payload)
+        self.total_bytes += self.last_bytes
+        self.last_ms = (time.perf_counter() - t0) * 1000
+        return fg
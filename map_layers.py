@@ -0,0 +1,193 @@
+"""
+GeoJSON layers for the HQ maps.
+Drivers, hazards, green-wave zones and the ghost trail are GeoJSON Features, one FeatureCollection per layer,
+whose properties carry raw fields only. Popups and tooltips are filled in the browser from one shared template
+per kind (TEMPLATES, shipped once with the base map), so no per-marker HTML is rendered or sent. Serialized
+collections are cached process-wide by content hash (LayerCache): a layer that has not changed since any
+session last serialized it costs one hash. For large fleets, cull() keeps only what is inside the browser's
+viewport (plus a margin) and cluster() aggregates the rest on a zoom-dependent grid, so overview zooms send
+cluster features instead of every marker.
+"""
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DRIVER, HAZARD, GREEN, TRAIL, CLUSTER = "driver", "hazard", "green", "trail", "cluster"
+LAYER_ORDER = (TRAIL, GREEN, HAZARD, DRIVER, CLUSTER)   # drawn bottom to top
+CACHE_SIZE = 64
+VIEW_MARGIN = 0.25                # cull outside the viewport grown by this fraction on each side
+VIEW_SIZE_PX = (1200, 600)        # assumed map size until the browser reports its bounds
+CLUSTER_CELL_PX = 60              # grid cell on screen; two or more markers in a cell become one cluster
+CLUSTER_MAX_ZOOM = 15             # from this zoom in, every marker is drawn
+CLUSTER_COLORS = {DRIVER: "#00ff9d", HAZARD: "#ffaa00"}
+MAX_HAZARDS_IN_VIEW = 500         # newest first
+
+# {field} placeholders, filled (HTML-escaped) from feature properties in the browser
+TEMPLATES = {
+    "driver_line": {"popup": "{driver_id} | {status}{speed}"},
+    "driver_card": {
+        "popup": (
+            '<div style="min-width:200px; font-family:sans-serif; font-size:12px;">'
+            '<div style="font-size:24px; margin-bottom:8px;">🚑 <b>{driver_id}</b>{tracked}</div>'
+            '<div style="border-bottom:1px solid #333; padding-bottom:6px; margin-bottom:6px;">'
+            "<div><b>Driver:</b> {full_name}</div><div><b>Vehicle:</b> {vehicle_id}</div><div><b>Unit ID:</b> {driver_id}</div></div>"
+            '<div style="color:#00f3ff;"><b>From:</b> {origin}</div>'
+            '<div style="color:#00ff9d;"><b>To:</b> {destination}</div>'
+            '<div style="margin-top:6px; color:#888;">{status}{speed}</div></div>'
+        ),
+        "tooltip": "🚑 {driver_id} — {full_name} ({status})",
+    },
+    "hazard": {"tooltip": "{type}"},
+    "green": {"popup": "GREEN WAVE: {area}"},
+    "cluster": {"tooltip": "{count} {label} (click to zoom in)"},
+}
+
+
+def templates_js():
+    return "window.titanTemplates = " + json.dumps(TEMPLATES, ensure_ascii=False) + ";"
+
+
+# ==========================================
+# FEATURES
+# ==========================================
+def feature(fid, kind, latlng, props):
+    """GeoJSON Feature for a live_map item. latlng is (lat, lon) or a sequence of them (trail)."""
+    if kind == TRAIL:
+        geom = {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in latlng]}
+    else:
+        geom = {"type": "Point", "coordinates": [latlng[1], latlng[0]]}
+    return {"type": "Feature", "id": fid, "geometry": geom, "properties": {"kind": kind, **props}}
+
+
+def coordinates(kind, latlng):
+    """GeoJSON coordinates alone (used for moves)."""
+    if kind == TRAIL:
+        return [[lon, lat] for lat, lon in latlng]
+    return [latlng[1], latlng[0]]
+
+
+def collection(features):
+    return {"type": "FeatureCollection", "features": features}
+
+
+def dumps(obj):
+    # Compact JSON; escape "</" so property values cannot close an enclosing <script>
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).replace("</", "<\\/")
+
+
+# ==========================================
+# VIEWPORT CULLING AND GRID CLUSTERING
+# ==========================================
+def viewport(returned=None, center=None, zoom=12):
+    """((south, west, north, east), zoom) from st_folium's returned bounds / zoom, or estimated from the
+    map's center and zoom (VIEW_SIZE_PX) before the browser has reported anything."""
+    returned = returned or {}
+    b = returned.get("bounds") or {}
+    sw, ne = b.get("_southWest") or {}, b.get("_northEast") or {}
+    zoom = returned.get("zoom") or zoom
+    if all(v is not None for v in (sw.get("lat"), sw.get("lng"), ne.get("lat"), ne.get("lng"))):
+        return (sw["lat"], sw["lng"], ne["lat"], ne["lng"]), zoom
+    if center is None:
+        return None, zoom
+    deg_per_px = 360.0 / (256 * 2 ** zoom)
+    half_w = VIEW_SIZE_PX[0] / 2 * deg_per_px
+    half_h = VIEW_SIZE_PX[1] / 2 * deg_per_px * math.cos(math.radians(center[0]))
+    return (center[0] - half_h, center[1] - half_w, center[0] + half_h, center[1] + half_w), zoom
+
+
+def expand(bbox, margin=VIEW_MARGIN):
+    south, west, north, east = bbox
+    dlat, dlon = (north - south) * margin, (east - west) * margin
+    return south - dlat, west - dlon, north + dlat, east + dlon
+
+
+def in_bbox(lats, lons, bbox):
+    """Boolean mask of points inside bbox (vectorized; NaN is outside)."""
+    south, west, north, east = bbox
+    lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    return (lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)
+
+
+def cull(items, bbox, keep=()):
+    """Point items inside bbox; lines (trail) and keys in `keep` always stay."""
+    if bbox is None:
+        return items
+    south, west, north, east = bbox
+    return {k: it for k, it in items.items()
+            if k in keep or it[0] == TRAIL or (south <= it[1][0] <= north and west <= it[1][1] <= east)}
+
+
+def cluster(items, zoom, kinds=(DRIVER, HAZARD), keep=(), cell_px=CLUSTER_CELL_PX, max_zoom=CLUSTER_MAX_ZOOM):
+    """Aggregate `kinds` on a grid of cell_px screen pixels at `zoom`: cells holding two or more markers become
+    one CLUSTER item at their centroid. Keys stay stable while the zoom is unchanged, so cluster moves diff
+    like marker moves."""
+    if zoom is None or zoom >= max_zoom:
+        return items
+    cell = cell_px * 360.0 / (256 * 2 ** zoom)
+    out, cells = {}, {}
+    for k, it in items.items():
+        if it[0] not in kinds or k in keep:
+            out[k] = it
+        else:
+            cells.setdefault((it[0], math.floor(it[1][0] / cell), math.floor(it[1][1] / cell)), []).append(k)
+    for (kind, i, j), keys in cells.items():
+        if len(keys) == 1:
+            out[keys[0]] = items[keys[0]]
+            continue
+        lat = sum(items[k][1][0] for k in keys) / len(keys)
+        lon = sum(items[k][1][1] for k in keys) / len(keys)
+        out[f"c:{kind}:{zoom}:{i}:{j}"] = (CLUSTER, (round(lat, 5), round(lon, 5)), {
+            "color": CLUSTER_COLORS.get(kind, "#ffffff"), "tpl": "cluster", "count": len(keys),
+            "label": "units" if kind == DRIVER else "hazards",
+        })
+    return out
+
+
+# ==========================================
+# CONTENT-HASH CACHE (process-wide)
+# ==========================================
+class LayerCache:
+    """Serialized FeatureCollections keyed by a hash of their items. Thread-safe LRU."""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(items):
+        return hashlib.blake2b(repr(items).encode(), digest_size=16).hexdigest()
+
+    def collection(self, items):
+        """items: [(fid, (kind, latlng, props)), ...] in a stable order. Returns FeatureCollection JSON."""
+        h = self.key(items)
+        with self._lock:
+            s = self._data.get(h)
+            if s is not None:
+                self._data.move_to_end(h)
+                self.hits += 1
+                return s
+        s = dumps(collection([feature(fid, *item) for fid, item in items]))
+        with self._lock:
+            self.misses += 1
+            self._data[h] = s
+            if len(self._data) > self.size:
+                self._data.popitem(last=False)
+        return s
+
+
+_cache = LayerCache()
+
+
+def layers_json(items):
+    """{kind: FeatureCollection JSON} for a live_map item dict, via the shared cache."""
+    by_kind = {}
+    for fid, item in sorted(items.items()):
+        by_kind.setdefault(item[0], []).append((fid, item))
+    return {kind: _cache.collection(by_kind[kind]) for kind in LAYER_ORDER if kind in by_kind}
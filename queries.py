@@ -0,0 +1,88 @@
+"""
+SQL run by the Streamlit apps (App.py, driverapp.py). It lives here rather than in the scripts so that
+schema.hot_queries() can import it without starting a page: the query plan check runs on the exact
+strings the apps execute.
+"""
+import db
+import leases
+
+DRIVER_COLS = ("d.driver_id, d.status, d.current_lat, d.current_lon, d.speed, d.origin, d.destination, d.active_mission_id, "
+               "d.clearance_status, d.selected_route_id, d.last_seen_ms, " + db.local_ts("d.last_seen_ms", "last_seen"))
+COMMS_COLS = "id, " + db.local_ts("timestamp_ms", "timestamp") + ", driver_id, status, message"
+_STATE_COLS = "driver_id, origin, destination, current_lat, current_lon, speed, status, " + db.local_ts("timestamp_ms")
+
+# ==========================================
+# HQ (App.py)
+# ==========================================
+LATEST_DRIVER_STATE_SQL = f"SELECT {_STATE_COLS} FROM driver_state ORDER BY id DESC LIMIT 1"
+DRIVER_STATE_BY_ID_SQL = f"SELECT {_STATE_COLS} FROM driver_state WHERE driver_id=? ORDER BY id DESC LIMIT 1"
+GHOST_TRAIL_SQL = """
+    SELECT current_lat, current_lon FROM driver_state
+    WHERE driver_id=? AND current_lat IS NOT NULL AND current_lon IS NOT NULL
+    ORDER BY id DESC LIMIT ?"""
+RECENT_HAZARDS_SQL = "SELECT lat, lon, type, id FROM hazards ORDER BY id DESC LIMIT 50"
+HAZARD_LOG_SQL = f"SELECT id, lat, lon, type, {db.local_ts('timestamp_ms', 'timestamp')} FROM hazards ORDER BY id DESC LIMIT 50"
+SIGNAL_STATUS_SQL = "SELECT stop_id, status FROM signal_status WHERE " + leases.LIVE_SIGNAL
+ONLINE_DRIVERS_SQL = f"""
+    SELECT {DRIVER_COLS} FROM drivers d
+    WHERE d.last_seen_ms >= ?
+      AND d.current_lat IS NOT NULL AND d.current_lon IS NOT NULL
+      AND (d.status IS NULL OR d.status NOT IN ('BREAK', 'INACTIVE'))
+      AND EXISTS (SELECT 1 FROM driver_accounts a WHERE a.driver_id = d.driver_id)
+    ORDER BY d.status, d.last_seen_ms DESC"""
+LIVE_MAP_DRIVERS_SQL = f"""
+    SELECT d.driver_id, d.status, d.current_lat, d.current_lon, d.origin, d.destination, d.speed,
+           {db.local_ts("d.last_seen_ms", "last_seen")}, d.last_seen_ms, d.active_mission_id
+    FROM drivers d
+    WHERE d.last_seen_ms >= ? AND EXISTS (SELECT 1 FROM driver_accounts a WHERE a.driver_id = d.driver_id)"""
+PENDING_CLEARANCE_SQL = ("SELECT driver_id, status, current_lat, current_lon, " + db.local_ts("last_seen_ms", "last_seen")
+                         + " FROM drivers WHERE clearance_status = 'PENDING' AND " + leases.LIVE_CLEARANCE)
+CURRENT_MISSION_SQL = ("SELECT mission_id, origin, destination, status FROM missions "
+                       "WHERE assigned_driver_id = ? AND status IN ('DISPATCHED','ACCEPTED') ORDER BY id DESC LIMIT 1")
+EXPIRE_MISSIONS_SQL = "UPDATE missions SET status='EXPIRED' WHERE status='DISPATCHED' AND created_at_ms < ?"
+OFFLINE_ALERTS_SQL = """
+    SELECT m.mission_id, m.assigned_driver_id, (? - d.last_seen_ms) / 1000
+    FROM missions m
+    INNER JOIN drivers d ON m.assigned_driver_id = d.driver_id
+    WHERE m.status = 'ACCEPTED' AND d.last_seen_ms < ?"""
+# HQ messages are matched as 'HQ' <= status < 'HR' (same as LIKE 'HQ%') so the driver_comms indexes apply
+ALL_COMMS_SQL = f"SELECT {COMMS_COLS} FROM driver_comms ORDER BY id DESC LIMIT ?"
+CONVERSATION_SQL = f"""
+    SELECT {COMMS_COLS} FROM driver_comms
+    WHERE ((status < 'HQ' OR status >= 'HR') AND driver_id=?) OR (status >= 'HQ' AND status < 'HR' AND driver_id IN (?, 'ALL'))
+    ORDER BY id DESC LIMIT ?"""
+DRIVER_MESSAGES_SQL = f"SELECT {COMMS_COLS} FROM driver_comms WHERE driver_id=? AND (status < 'HQ' OR status >= 'HR') ORDER BY id DESC LIMIT ?"
+DRIVERS_WITH_MESSAGES_SQL = "SELECT DISTINCT driver_id FROM driver_comms WHERE (status < 'HQ' OR status >= 'HR') ORDER BY driver_id"
+ACTIVITY_LOG_SQL = f"SELECT id, {db.local_ts('timestamp_ms', 'timestamp')}, action, actor, details FROM activity_log ORDER BY id DESC LIMIT ?"
+MISSIONS_PER_DAY_SQL = """
+    SELECT date(completed_at_ms / 1000, 'unixepoch', 'localtime') as day, COUNT(*) as count
+    FROM missions WHERE status='COMPLETED' AND completed_at_ms >= ?
+    GROUP BY day ORDER BY day"""
+
+# ==========================================
+# DRIVER APP (driverapp.py)
+# ==========================================
+PENDING_ORDERS_SQL = f"""
+    SELECT m.id, m.mission_id, m.origin, m.destination, m.priority, m.assigned_driver_id, m.status, m.notes,
+           m.created_at_ms, {db.local_ts("m.created_at_ms", "created_at")}
+    FROM missions m
+    WHERE m.status = 'DISPATCHED'
+      AND m.created_at_ms >= ?
+      AND (m.assigned_driver_id IS NULL OR m.assigned_driver_id = ?)
+      AND NOT EXISTS (SELECT 1 FROM mission_declines d WHERE d.mission_id = m.mission_id AND d.driver_id = ?)
+    ORDER BY m.id DESC
+    LIMIT 5"""
+MISSION_STATUS_SQL = "SELECT status FROM missions WHERE mission_id=?"
+# Atomic accept: only succeeds if the mission is still unassigned or assigned to this driver
+ACCEPT_MISSION_SQL = ("UPDATE missions SET status='ACCEPTED', accepted_at_ms=?, assigned_driver_id=? "
+                      "WHERE mission_id=? AND (assigned_driver_id IS NULL OR assigned_driver_id=?)")
+PUBLISH_ROUTE_SQL = "UPDATE missions SET route_polyline=? WHERE mission_id=? AND assigned_driver_id=?"
+COMPLETED_COUNT_SQL = "SELECT COUNT(*) FROM missions WHERE assigned_driver_id=? AND status='COMPLETED'"
+MISSION_LOG_RESULT_SQL = "UPDATE mission_logs SET time_saved=?, co2_saved=?, avg_speed=? WHERE mission_id=?"
+MISSION_HISTORY_SQL = f"""
+    SELECT mission_id, {db.local_ts("created_at_ms", "created_at")}, origin, destination, priority, status,
+           {db.local_ts("completed_at_ms", "completed_at")}
+    FROM missions
+    WHERE assigned_driver_id = ?
+    ORDER BY id DESC
+    LIMIT 20"""
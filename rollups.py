@@ -0,0 +1,168 @@
+"""
+Telemetry downsampling: raw driver_state rows -> per-driver per-minute and per-hour aggregates.
+Runs incrementally from a watermark (rollup_state.last_id) and prunes raw rows past the retention
+window, so fleet metrics read a bounded number of rollup rows however long the history gets.
+"""
+import db
+from shared_utils import distance_km
+
+BUCKETS = (("driver_state_1m", 60 * 1000), ("driver_state_1h", 3600 * 1000))
+BATCH_ROWS = 5000
+MAX_GAP_SEC = 300  # no distance credited across gaps longer than this (new trip / app restart)
+
+RAW_RETENTION_HOURS = 24      # ghost trails only need recent raw points
+MINUTE_RETENTION_DAYS = 7
+HOUR_RETENTION_DAYS = 365
+ROLLUP_INTERVAL_SEC = 30
+
+RAW_BATCH_SQL = "SELECT id, driver_id, current_lat, current_lon, speed, timestamp_ms FROM driver_state WHERE id > ? ORDER BY id LIMIT ?"
+PRUNE_RAW_SQL = "DELETE FROM driver_state WHERE timestamp_ms < ? AND id <= ?"
+PRUNE_BUCKETS_SQL = "DELETE FROM {table} WHERE bucket_ms < ?"
+FLEET_AVG_SPEED_SQL = "SELECT SUM(speed_sum), SUM(speed_n) FROM driver_state_1m WHERE bucket_ms >= ?"
+SPEED_SERIES_SQL = f"""
+    SELECT driver_id, {db.local_ts("bucket_ms", "timestamp")},
+           avg_speed AS speed, max_speed, distance_km, samples
+    FROM driver_state_1m WHERE bucket_ms >= ? ORDER BY bucket_ms"""
+
+_UPSERT_SQL = """
+    INSERT INTO {table} (driver_id, bucket_ms, samples, speed_n, speed_sum, avg_speed, max_speed,
+                         first_lat, first_lon, first_ms, last_lat, last_lon, last_ms, distance_km)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(driver_id, bucket_ms) DO UPDATE SET
+      samples = samples + excluded.samples,
+      speed_n = speed_n + excluded.speed_n,
+      speed_sum = speed_sum + excluded.speed_sum,
+      avg_speed = CASE WHEN speed_n + excluded.speed_n > 0
+                       THEN (speed_sum + excluded.speed_sum) / (speed_n + excluded.speed_n) END,
+      max_speed = MAX(COALESCE(max_speed, excluded.max_speed), COALESCE(excluded.max_speed, max_speed)),
+      first_lat = COALESCE(first_lat, excluded.first_lat),
+      first_lon = COALESCE(first_lon, excluded.first_lon),
+      first_ms = COALESCE(first_ms, excluded.first_ms),
+      last_lat = COALESCE(excluded.last_lat, last_lat),
+      last_lon = COALESCE(excluded.last_lon, last_lon),
+      last_ms = COALESCE(excluded.last_ms, last_ms),
+      distance_km = distance_km + excluded.distance_km
+"""
+
+
+def _last_positions(conn, driver_ids):
+    """Last rolled-up fix per driver, so distance continues across batches."""
+    out = {}
+    for did in driver_ids:
+        row = conn.execute(
+            "SELECT last_lat, last_lon, last_ms FROM driver_state_1m WHERE driver_id=? ORDER BY bucket_ms DESC LIMIT 1",
+            (did,),
+        ).fetchone()
+        if row and row[0] is not None:
+            out[did] = row
+    return out
+
+
+def _aggregate(rows, last_pos):
+    """rows: (id, driver_id, lat, lon, speed, ts_ms) ordered by id. Returns {table: {(driver_id, bucket_ms): agg}}."""
+    out = {table: {} for table, _ in BUCKETS}
+    prev = dict(last_pos)
+    for _, did, lat, lon, speed, ts_ms in rows:
+        if did is None or ts_ms is None:
+            continue
+        step_km = 0.0
+        if lat is not None and lon is not None:
+            p = prev.get(did)
+            if p is not None and p[2] is not None and 0 <= ts_ms - p[2] <= MAX_GAP_SEC * 1000:
+                step_km = distance_km(p[0], p[1], lat, lon)
+            prev[did] = (lat, lon, ts_ms)
+        for table, width in BUCKETS:
+            key = (did, ts_ms - ts_ms % width)
+            a = out[table].get(key)
+            if a is None:
+                a = out[table][key] = {"samples": 0, "speed_n": 0, "speed_sum": 0.0, "max_speed": None,
+                                       "first": None, "last": None, "distance_km": 0.0}
+            a["samples"] += 1
+            if speed is not None:
+                a["speed_n"] += 1
+                a["speed_sum"] += speed
+                a["max_speed"] = speed if a["max_speed"] is None else max(a["max_speed"], speed)
+            if lat is not None and lon is not None:
+                if a["first"] is None:
+                    a["first"] = (lat, lon, ts_ms)
+                a["last"] = (lat, lon, ts_ms)
+            a["distance_km"] += step_km
+    return out
+
+
+def _params(aggs):
+    for (did, bucket_ms), a in aggs.items():
+        first = a["first"] or (None, None, None)
+        last = a["last"] or (None, None, None)
+        avg = a["speed_sum"] / a["speed_n"] if a["speed_n"] else None
+        yield (did, bucket_ms, a["samples"], a["speed_n"], a["speed_sum"], avg, a["max_speed"],
+               first[0], first[1], first[2], last[0], last[1], last[2], a["distance_km"])
+
+
+def rollup_once(db_file=db.DB_FILE, batch_rows=BATCH_ROWS):
+    """Fold raw rows past the watermark into the rollup tables. Returns raw rows consumed."""
+    total = 0
+    while True:
+        # Read + upsert + watermark in one write transaction: concurrent runners can't double count
+        with db.transaction(db_file) as conn:
+            row = conn.execute("SELECT last_id FROM rollup_state WHERE name='driver_state'").fetchone()
+            last_id = row[0] if row else 0
+            raw = conn.execute(RAW_BATCH_SQL, (last_id, batch_rows)).fetchall()
+            if not raw:
+                return total
+            aggs = _aggregate(raw, _last_positions(conn, {r[1] for r in raw if r[1] is not None}))
+            for table, _ in BUCKETS:
+                conn.executemany(_UPSERT_SQL.format(table=table), list(_params(aggs[table])))
+            conn.execute(
+                "INSERT INTO rollup_state (name, last_id) VALUES ('driver_state', ?) "
+                "ON CONFLICT(name) DO UPDATE SET last_id=excluded.last_id",
+                (raw[-1][0],),
+            )
+        total += len(raw)
+        if len(raw) < batch_rows:
+            return total
+
+
+def prune(db_file=db.DB_FILE, raw_hours=RAW_RETENTION_HOURS, minute_days=MINUTE_RETENTION_DAYS, hour_days=HOUR_RETENTION_DAYS):
+    """Retention: drop raw rows older than raw_hours (only once rolled up) and expired rollup buckets."""
+    now_ms = db.now_ms()
+    with db.transaction(db_file) as conn:
+        row = conn.execute("SELECT last_id FROM rollup_state WHERE name='driver_state'").fetchone()
+        last_id = row[0] if row else 0
+        raw = conn.execute(PRUNE_RAW_SQL, (now_ms - raw_hours * 3600000, last_id)).rowcount
+        minute = conn.execute(PRUNE_BUCKETS_SQL.format(table="driver_state_1m"), (now_ms - minute_days * 86400000,)).rowcount
+        hour = conn.execute(PRUNE_BUCKETS_SQL.format(table="driver_state_1h"), (now_ms - hour_days * 86400000,)).rowcount
+    return {"raw": raw, "minute": minute, "hour": hour}
+
+
+def run_maintenance(db_file=db.DB_FILE):
+    """Roll up pending telemetry, then apply retention. Returns a summary dict."""
+    rolled = rollup_once(db_file)
+    pruned = prune(db_file)
+    return {"rolled_up": rolled, "pruned": pruned}
+
+
+# ==========================================
+# BACKGROUND WORKER (one per process per DB file)
+# ==========================================
+def ensure_worker(db_file=db.DB_FILE, interval=ROLLUP_INTERVAL_SEC):
+    """Start the rollup thread once per process (db.Worker running run_maintenance); later calls (every rerun)
+    return it."""
+    return db.ensure_worker("rollups", db_file, lambda path: db.Worker(path, interval, run_maintenance, name="titan-telemetry-rollup"))
+
+
+# ==========================================
+# READERS (bounded by time window, not by raw history size)
+# ==========================================
+def fleet_avg_speed(minutes=60, db_file=db.DB_FILE):
+    since_ms = db.ago_ms(minutes * 60)
+    row = db.fetchone(FLEET_AVG_SPEED_SQL, (since_ms,), db_file=db_file)
+    if not row or not row[1]:
+        return 0
+    return row[0] / row[1]
+
+
+def speed_series(hours=6, db_file=db.DB_FILE):
+    """Per-driver per-minute average speed for charts: driver_id, timestamp (local), speed, max_speed, distance_km."""
+    since_ms = db.ago_ms(hours * 3600)
+    return db.read_sql(SPEED_SERIES_SQL, (since_ms,), db_file=db_file)
@@ -0,0 +1,147 @@
+"""
+Precomputed hospital -> hospital route matrix.
+Every Mission Center / Quick Dispatch route is between two HOSPITALS, so routes (geometry, ETA, distance,
+instructions) are fetched ahead of time per time-of-day bucket and stored in `route_matrix`. Previews read
+one row; live TomTom lookups are only needed for pairs not yet in the matrix.
+
+    python route_matrix.py                # fill/refresh the current time-of-day bucket
+    python route_matrix.py --all-buckets  # offline job: every bucket (departAt = next occurrence)
+"""
+import datetime
+import json
+import os
+import sys
+
+import db
+import geometry
+from shared_utils import HOSPITALS, fetch_routes_uncached
+
+TOD_BUCKET_HOURS = 3                    # 8 buckets per day
+MATRIX_MAX_AGE_SEC = 3 * 86400          # typical traffic for a bucket is re-fetched after this
+REFRESH_BATCH = 20                      # pairs per worker tick (bounds TomTom usage)
+REFRESH_INTERVAL_SEC = 60
+REFRESH_IN_APP = os.environ.get("ROUTE_MATRIX_REFRESH") == "1"  # off: HQ only reads what the offline job stored
+MAX_FAILURES_PER_BATCH = 3
+
+PREVIEW_SQL = "SELECT routes_json, fetched_at_ms FROM route_matrix WHERE origin=? AND destination=? AND tod_bucket=?"
+BUCKET_SQL = "SELECT origin, destination, fetched_at_ms FROM route_matrix WHERE tod_bucket=?"
+COVERAGE_SQL = "SELECT COUNT(*) FROM route_matrix WHERE tod_bucket=? AND fetched_at_ms >= ?"
+
+
+def bucket_for(ts=None):
+    """Time-of-day bucket (0..7) for a local datetime (default now)."""
+    ts = ts or datetime.datetime.now()
+    return ts.hour // TOD_BUCKET_HOURS
+
+
+def depart_at_for(bucket, now=None):
+    """Next future local time at the middle of `bucket`, as ISO 8601 with offset (TomTom departAt)."""
+    now = (now or datetime.datetime.now()).astimezone()
+    minutes = bucket * TOD_BUCKET_HOURS * 60 + TOD_BUCKET_HOURS * 30
+    t = now.replace(hour=minutes // 60, minute=minutes % 60, second=0, microsecond=0)
+    if t <= now:
+        t += datetime.timedelta(days=1)
+    return t.isoformat(timespec="seconds")
+
+
+def all_pairs():
+    return [(o, d) for o in HOSPITALS for d in HOSPITALS if o != d]
+
+
+# ==========================================
+# READ / WRITE
+# ==========================================
+def preview(origin, destination, priority_factor=1.0, bucket=None, db_file=db.DB_FILE):
+    """Stored routes for a hospital pair (same shape as fetch_routes, eta scaled by priority_factor), or []."""
+    if bucket is None:
+        bucket = bucket_for()
+    try:
+        row = db.fetchone(PREVIEW_SQL, (origin, destination, bucket), db_file=db_file)
+    except Exception:
+        return []
+    if not row or not row[0]:
+        return []
+    routes = [geometry.CompactRoute(r) for r in json.loads(row[0])]
+    for r in routes:
+        r["eta"] = int((r["travel_sec"] * priority_factor) / 60)
+        r["fetched_at_ms"] = row[1]
+    return routes
+
+
+def store(origin, destination, bucket, routes, db_file=db.DB_FILE):
+    db.execute(
+        "INSERT INTO route_matrix (origin, destination, tod_bucket, routes_json, fetched_at_ms) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(origin, destination, tod_bucket) DO UPDATE SET routes_json=excluded.routes_json, fetched_at_ms=excluded.fetched_at_ms",
+        (origin, destination, bucket, json.dumps(routes, separators=(",", ":")), db.now_ms()),
+        db_file=db_file,
+    )
+
+
+def refresh_pair(origin, destination, bucket=None, db_file=db.DB_FILE):
+    """Fetch one pair for `bucket` (departAt = next occurrence) and store it. Returns False on TomTom failure."""
+    if bucket is None:
+        bucket = bucket_for()
+    routes = fetch_routes_uncached(HOSPITALS[origin], HOSPITALS[destination], max_alternatives=3,
+                                   depart_at=depart_at_for(bucket))
+    if not routes:
+        return False
+    store(origin, destination, bucket, routes, db_file)
+    return True
+
+
+def stale_pairs(bucket, max_age_sec=MATRIX_MAX_AGE_SEC, db_file=db.DB_FILE):
+    """Pairs missing from `bucket` first, then entries older than max_age_sec, oldest first."""
+    fetched = dict(((o, d), ms) for o, d, ms in db.fetchall(BUCKET_SQL, (bucket,), db_file=db_file))
+    cutoff = db.ago_ms(max_age_sec)
+    pairs = all_pairs()
+    missing = [p for p in pairs if p not in fetched]
+    valid = set(pairs)  # hospitals renamed/removed since the row was stored are ignored
+    old = sorted((ms or 0, p) for p, ms in fetched.items() if p in valid and (ms or 0) < cutoff)
+    return missing + [p for _, p in old]
+
+
+def refresh_stale(bucket=None, limit=REFRESH_BATCH, db_file=db.DB_FILE):
+    """Refresh up to `limit` stale pairs of `bucket`. Returns (refreshed, failed)."""
+    if bucket is None:
+        bucket = bucket_for()
+    ok = failed = 0
+    for origin, destination in stale_pairs(bucket, db_file=db_file)[:limit]:
+        if refresh_pair(origin, destination, bucket, db_file):
+            ok += 1
+        else:
+            failed += 1
+            if failed >= MAX_FAILURES_PER_BATCH and not ok:
+                break  # TomTom unreachable / quota: try again next tick
+    return ok, failed
+
+
+def coverage(bucket=None, db_file=db.DB_FILE):
+    """(fresh pairs, total pairs) for a bucket."""
+    if bucket is None:
+        bucket = bucket_for()
+    row = db.fetchone(COVERAGE_SQL, (bucket, db.ago_ms(MATRIX_MAX_AGE_SEC)), db_file=db_file)
+    return (row[0] if row else 0), len(all_pairs())
+
+
+# ==========================================
+# BACKGROUND REFRESH (one per process per DB file)
+# ==========================================
+def refresh_batch(db_file=db.DB_FILE, batch=REFRESH_BATCH):
+    """Worker tick: refresh a small batch of missing/stale pairs for the current time-of-day bucket."""
+    return refresh_stale(limit=batch, db_file=db_file)
+
+
+def ensure_worker(db_file=db.DB_FILE, interval=REFRESH_INTERVAL_SEC):
+    """Start the refresh thread once per process (db.Worker running refresh_batch); later calls return it."""
+    return db.ensure_worker("route_matrix", db_file, lambda path: db.Worker(path, interval, refresh_batch, name="titan-route-matrix"))
+
+
+if __name__ == "__main__":
+    import schema
+
+    schema.migrate()
+    buckets = range(24 // TOD_BUCKET_HOURS) if "--all-buckets" in sys.argv else [bucket_for()]
+    for b in buckets:
+        ok, failed = refresh_stale(b, limit=len(all_pairs()))
+        fresh, total = coverage(b)
+        print(f"bucket {b}: refreshed {ok}, failed {failed}, coverage {fresh}/{total}")
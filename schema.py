@@ -0,0 +1,519 @@
+"""
+Single source of truth for the Titan database schema, shared by App.py (HQ) and driverapp.py (Driver).
+Ordered migrations are recorded in a `schema_version` table and applied once per process per DB file,
+so a Streamlit rerun costs one set lookup instead of a round of CREATE/ALTER statements.
+"""
+import datetime
+import os
+import threading
+
+import db
+from shared_utils import hash_password
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _add_missing_columns(conn, table, cols):
+    """ALTER TABLE only for columns an older database is actually missing (no try/except per column)."""
+    have = _columns(conn, table)
+    for col, typ in cols:
+        if col not in have:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {typ}")
+
+
+# ==========================================
+# MIGRATIONS (append only - never edit a shipped step)
+# ==========================================
+def _m001_baseline(conn):
+    """Union of the schemas App.py and driverapp.py used to create on every rerun, plus default accounts."""
+    # 1. MISSION LOGS
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS mission_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME,
+            mission_id TEXT,
+            origin TEXT,
+            destination TEXT,
+            priority TEXT,
+            time_saved REAL,
+            co2_saved REAL,
+            avg_speed REAL
+        )
+    ''')
+    # 2. DRIVER STATE (Telemetry history: lat, lon, speed per push)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS driver_state (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            driver_id TEXT,
+            origin TEXT,
+            destination TEXT,
+            current_lat REAL,
+            current_lon REAL,
+            speed REAL,
+            status TEXT,
+            timestamp DATETIME
+        )
+    ''')
+    _add_missing_columns(conn, "driver_state", [("speed", "REAL")])
+    # 3. COMMUNICATIONS
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS driver_comms (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME,
+            driver_id TEXT,
+            status TEXT,
+            message TEXT
+        )
+    ''')
+    # 4. DRIVER REGISTRY (Master state: syncs with driverapp)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS drivers (
+            driver_id TEXT PRIMARY KEY,
+            status TEXT,
+            current_lat REAL,
+            current_lon REAL,
+            last_seen DATETIME,
+            speed REAL,
+            origin TEXT,
+            destination TEXT,
+            active_mission_id TEXT,
+            clearance_status TEXT,
+            selected_route_id INTEGER
+        )
+    ''')
+    _add_missing_columns(conn, "drivers", [
+        ("speed", "REAL"), ("origin", "TEXT"), ("destination", "TEXT"),
+        ("active_mission_id", "TEXT"), ("clearance_status", "TEXT"), ("selected_route_id", "INTEGER"),
+    ])
+    # 5. MISSIONS
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS missions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at DATETIME,
+            mission_id TEXT,
+            origin TEXT,
+            destination TEXT,
+            priority TEXT,
+            assigned_driver_id TEXT,
+            status TEXT,
+            accepted_at DATETIME,
+            completed_at DATETIME,
+            notes TEXT,
+            decline_reason TEXT
+        )
+    ''')
+    _add_missing_columns(conn, "missions", [("notes", "TEXT"), ("decline_reason", "TEXT")])
+    # 6. OPERATORS
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS operators (
+            username TEXT PRIMARY KEY,
+            password TEXT,
+            display_name TEXT
+        )
+    ''')
+    # 7. DRIVER ACCOUNTS
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS driver_accounts (
+            driver_id TEXT PRIMARY KEY,
+            username TEXT UNIQUE,
+            password TEXT,
+            full_name TEXT,
+            phone TEXT,
+            vehicle_id TEXT,
+            base_hospital TEXT,
+            created_at DATETIME
+        )
+    ''')
+    _add_missing_columns(conn, "driver_accounts", [("vehicle_id", "TEXT"), ("base_hospital", "TEXT")])
+    # 8. SIGNAL STATUS (For Green Wave)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS signal_status (
+            stop_id TEXT PRIMARY KEY,
+            status TEXT,
+            last_updated DATETIME
+        )
+    ''')
+    # 9. HAZARDS (For Hazard Mapping)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS hazards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            lat REAL,
+            lon REAL,
+            type TEXT,
+            timestamp DATETIME
+        )
+    ''')
+    # 10. ACTIVITY LOG
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp DATETIME,
+            action TEXT,
+            actor TEXT,
+            details TEXT
+        )
+    ''')
+    # 11. MISSION DECLINES: persist driver declines so they don't see same mission after refresh
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS mission_declines (
+            mission_id TEXT,
+            driver_id TEXT,
+            declined_at DATETIME,
+            reason TEXT,
+            PRIMARY KEY (mission_id, driver_id)
+        )
+    ''')
+    # Seed defaults (hashed passwords)
+    conn.execute(
+        "INSERT OR IGNORE INTO operators (username, password, display_name) VALUES (?, ?, ?)",
+        ("COMMANDER", hash_password("TITAN-X"), "HQ Commander"),
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO driver_accounts (driver_id, username, password, full_name, created_at) VALUES (?, ?, ?, ?, ?)",
+        ("UNIT-07", "UNIT-07", hash_password("TITAN-DRIVER"), "Unit 7", datetime.datetime.now()),
+    )
+
+
+# Secondary indexes for the hot query shapes (see HOT_QUERIES below).
+# driver_state/driver_comms indexes end in the implicit rowid, so "WHERE driver_id=? ORDER BY id DESC" needs no sort.
+INDEXES = [
+    ("idx_missions_mission_id", "missions(mission_id)"),
+    ("idx_missions_status_driver", "missions(status, assigned_driver_id)"),
+    ("idx_missions_driver_status", "missions(assigned_driver_id, status)"),
+    ("idx_missions_status_created", "missions(status, created_at)"),
+    ("idx_missions_status_completed", "missions(status, completed_at)"),
+    ("idx_mission_logs_mission_id", "mission_logs(mission_id)"),
+    ("idx_driver_state_driver", "driver_state(driver_id)"),
+    ("idx_driver_state_timestamp", "driver_state(timestamp)"),
+    ("idx_driver_comms_status", "driver_comms(status)"),
+    ("idx_driver_comms_driver_status", "driver_comms(driver_id, status)"),
+    ("idx_drivers_clearance", "drivers(clearance_status)"),
+]
+
+
+def _m002_hot_query_indexes(conn):
+    for name, target in INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    conn.execute("ANALYZE")
+
+
+def _m003_telemetry_rollups(conn):
+    """Per-driver per-minute / per-hour telemetry aggregates (filled by rollups.py) and its watermark."""
+    for table in ("driver_state_1m", "driver_state_1h"):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                driver_id TEXT,
+                bucket_ms INTEGER,
+                samples INTEGER,
+                speed_n INTEGER,
+                speed_sum REAL,
+                avg_speed REAL,
+                max_speed REAL,
+                first_lat REAL,
+                first_lon REAL,
+                first_ms INTEGER,
+                last_lat REAL,
+                last_lon REAL,
+                last_ms INTEGER,
+                distance_km REAL,
+                PRIMARY KEY (driver_id, bucket_ms)
+            )
+        ''')
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table}(bucket_ms)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER
+        )
+    ''')
+
+
+# (table, legacy DATETIME column, epoch-ms replacement)
+EPOCH_MS_COLUMNS = [
+    ("mission_logs", "timestamp", "timestamp_ms"),
+    ("driver_state", "timestamp", "timestamp_ms"),
+    ("driver_comms", "timestamp", "timestamp_ms"),
+    ("drivers", "last_seen", "last_seen_ms"),
+    ("missions", "created_at", "created_at_ms"),
+    ("missions", "accepted_at", "accepted_at_ms"),
+    ("missions", "completed_at", "completed_at_ms"),
+    ("driver_accounts", "created_at", "created_at_ms"),
+    ("signal_status", "last_updated", "last_updated_ms"),
+    ("hazards", "timestamp", "timestamp_ms"),
+    ("activity_log", "timestamp", "timestamp_ms"),
+    ("mission_declines", "declined_at", "declined_at_ms"),
+]
+EPOCH_MS_INDEXES = [
+    ("idx_drivers_last_seen_ms", "drivers(last_seen_ms)"),
+    ("idx_missions_status_created_ms", "missions(status, created_at_ms)"),
+    ("idx_missions_status_completed_ms", "missions(status, completed_at_ms)"),
+    ("idx_driver_state_timestamp_ms", "driver_state(timestamp_ms)"),
+    ("idx_hazards_timestamp_ms", "hazards(timestamp_ms)"),
+    ("idx_activity_log_timestamp_ms", "activity_log(timestamp_ms)"),
+]
+
+
+def _m004_epoch_ms_timestamps(conn):
+    """DATETIME strings (naive local time) -> INTEGER epoch ms. Backfills, then drops the string columns."""
+    for name in ("idx_missions_status_created", "idx_missions_status_completed", "idx_driver_state_timestamp"):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    for table, old, new in EPOCH_MS_COLUMNS:
+        cols = _columns(conn, table)
+        if new not in cols:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {new} INTEGER")
+        if old in cols:
+            conn.execute(
+                f"UPDATE {table} SET {new} = CAST(ROUND((julianday({old}, 'utc') - 2440587.5) * 86400000) AS INTEGER) "
+                f"WHERE {old} IS NOT NULL AND {new} IS NULL"
+            )
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN {old}")  # SQLite >= 3.35
+    for name, target in EPOCH_MS_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    conn.execute("ANALYZE")
+
+
+def _m005_route_matrix(conn):
+    """Precomputed hospital -> hospital routes per time-of-day bucket (filled by route_matrix.py)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS route_matrix (
+            origin TEXT,
+            destination TEXT,
+            tod_bucket INTEGER,
+            routes_json TEXT,
+            fetched_at_ms INTEGER,
+            PRIMARY KEY (origin, destination, tod_bucket)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_route_matrix_bucket_fetched ON route_matrix(tod_bucket, fetched_at_ms)")
+
+
+def _m006_sensor_readings(conn):
+    """Junction flow readings appended by the sensor ingestion loop (sensors.py)."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sensor_readings (
+            id INTEGER PRIMARY KEY,
+            junction TEXT,
+            ts_ms INTEGER,
+            flow INTEGER,
+            status TEXT,
+            source TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sensor_readings_junction_ts ON sensor_readings(junction, ts_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sensor_readings_ts ON sensor_readings(ts_ms)")
+
+
+def _m007_forecast_baseline(conn):
+    """Seasonal (15-min slot of the week) flow baseline per junction, saved by forecast.py."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_baseline (
+            junction TEXT,
+            slot INTEGER,
+            mean_flow REAL,
+            samples INTEGER,
+            PRIMARY KEY (junction, slot)
+        )
+    ''')
+
+
+def _m008_green_wave_corridors(conn):
+    """missions.route_polyline: the driver's selected route (encoded polyline), published by driverapp.py.
+    signal_status.mission_id: set by the green-wave scheduler (green_wave.py); NULL for manual HQ overrides."""
+    _add_missing_columns(conn, "missions", [("route_polyline", "TEXT")])
+    _add_missing_columns(conn, "signal_status", [("mission_id", "TEXT")])
+
+
+def _m009_leases(conn):
+    """Expiry for signal overrides and clearance state (swept by leases.py). Rows that predate leases get a
+    short one so nothing left over from before stays green or pending forever."""
+    _add_missing_columns(conn, "signal_status", [("expires_at_ms", "INTEGER")])
+    _add_missing_columns(conn, "drivers", [("clearance_expires_ms", "INTEGER")])
+    now_ms = db.now_ms()
+    conn.execute("UPDATE signal_status SET expires_at_ms = ? WHERE expires_at_ms IS NULL", (now_ms + 600000,))
+    conn.execute("UPDATE drivers SET clearance_expires_ms = ? WHERE clearance_status IS NOT NULL AND clearance_expires_ms IS NULL", (now_ms + 60000,))
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_signal_status_expires ON signal_status(expires_at_ms)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_drivers_clearance_expires ON drivers(clearance_expires_ms)")
+
+
+def _m010_schema_version_epoch_ms(conn):
+    """schema_version.applied_at (DATETIME string, naive local time) -> applied_at_ms, like migration 4.
+    The runner already writes applied_at_ms (current_version() adds the column), so this backfills older rows."""
+    if "applied_at" in _columns(conn, "schema_version"):
+        conn.execute(
+            "UPDATE schema_version SET applied_at_ms = CAST(ROUND((julianday(applied_at, 'utc') - 2440587.5) * 86400000) AS INTEGER) "
+            "WHERE applied_at IS NOT NULL AND applied_at_ms IS NULL"
+        )
+        conn.execute("ALTER TABLE schema_version DROP COLUMN applied_at")
+
+
+# (version, description, fn) - applied in order, each in its own transaction
+MIGRATIONS = [
+    (1, "baseline schema + default accounts", _m001_baseline),
+    (2, "secondary indexes for hot queries", _m002_hot_query_indexes),
+    (3, "telemetry rollup tables", _m003_telemetry_rollups),
+    (4, "epoch-ms timestamps", _m004_epoch_ms_timestamps),
+    (5, "hospital route matrix", _m005_route_matrix),
+    (6, "sensor readings", _m006_sensor_readings),
+    (7, "forecast baseline", _m007_forecast_baseline),
+    (8, "green-wave corridors", _m008_green_wave_corridors),
+    (9, "signal / clearance leases", _m009_leases),
+    (10, "epoch-ms schema_version.applied_at", _m010_schema_version_epoch_ms),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ==========================================
+# RUNNER
+# ==========================================
+def current_version(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, description TEXT, applied_at_ms INTEGER)")
+    _add_missing_columns(conn, "schema_version", [("applied_at_ms", "INTEGER")])  # created before migration 10
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return (row[0] or 0) if row else 0
+
+
+def migrate(db_file=db.DB_FILE):
+    """Apply pending migrations to db_file. Returns the list of versions applied."""
+    mgr = db.get_manager(db_file)
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        with mgr.transaction() as conn:
+            # Re-check inside the write lock: another process may have migrated meanwhile
+            if version <= current_version(conn):
+                continue
+            fn(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, description, applied_at_ms) VALUES (?, ?, ?)",
+                (version, description, db.now_ms()),
+            )
+            applied.append(version)
+    return applied
+
+
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def ensure_schema(db_file=db.DB_FILE):
+    """Run migrations once per process per DB file; later calls (every Streamlit rerun) are a set lookup."""
+    key = os.path.abspath(db_file)
+    if key in _ready:
+        return
+    with _ready_lock:
+        if key in _ready:
+            return
+        migrate(key)
+        _ready.add(key)
+
+
+# ==========================================
+# QUERY PLAN REGRESSION CHECK
+# ==========================================
+def hot_queries():
+    """[(name, sql, params, allowed_scan)] for every hot query, using the SQL constants the call sites execute.
+    Any "SCAN ..." plan step fails the check unless it equals allowed_scan: "SCAN <table>" alone is a reverse
+    rowid walk stopped by LIMIT, which is the cheapest plan for "latest N rows"."""
+    # Imported here: every app imports schema, which must not pull in the feature modules at import time
+    import comms
+    import fleet_snapshot
+    import green_wave
+    import leases
+    import queries
+    import rollups
+    import route_matrix
+    import sensors
+    import spatial_index
+
+    unit = "UNIT-07"
+    out = [
+        # HQ
+        ("latest_driver_state", queries.LATEST_DRIVER_STATE_SQL, (), "SCAN driver_state"),
+        ("driver_status_by_id", queries.DRIVER_STATE_BY_ID_SQL, (unit,), None),
+        ("ghost_trail_for_driver", queries.GHOST_TRAIL_SQL, (unit, 80), None),
+        ("recent_hazards", queries.RECENT_HAZARDS_SQL, (), "SCAN hazards"),
+        ("hazard_log", queries.HAZARD_LOG_SQL, (), "SCAN hazards"),
+        ("signal_status", queries.SIGNAL_STATUS_SQL, (0,), None),
+        ("online_drivers", queries.ONLINE_DRIVERS_SQL, (0,), None),
+        ("live_map_drivers", queries.LIVE_MAP_DRIVERS_SQL, (0,), None),
+        ("drivers_pending_clearance", queries.PENDING_CLEARANCE_SQL, (0,), None),
+        ("current_mission_for_driver", queries.CURRENT_MISSION_SQL, (unit,), None),
+        ("mark_expired_missions", queries.EXPIRE_MISSIONS_SQL, (0,), None),
+        ("driver_offline_alerts", queries.OFFLINE_ALERTS_SQL, (0, 0), None),
+        ("all_comms", queries.ALL_COMMS_SQL, (100,), "SCAN driver_comms"),
+        ("driver_conversation", queries.CONVERSATION_SQL, (unit, unit, 100), None),
+        ("driver_messages", queries.DRIVER_MESSAGES_SQL, (unit, 100), None),
+        ("driver_ids_with_messages", queries.DRIVERS_WITH_MESSAGES_SQL, (), "SCAN driver_comms USING COVERING INDEX idx_driver_comms_driver_status"),
+        ("recent_activity", queries.ACTIVITY_LOG_SQL, (30,), "SCAN activity_log"),
+        ("missions_per_day", queries.MISSIONS_PER_DAY_SQL, (0,), None),
+        # Driver app
+        ("check_orders", queries.PENDING_ORDERS_SQL, (0, unit, unit), None),
+        ("mission_by_id", queries.MISSION_STATUS_SQL, ("CMD-1",), None),
+        ("accept_mission", queries.ACCEPT_MISSION_SQL, (None, unit, "CMD-1", unit), None),
+        ("publish_route", queries.PUBLISH_ROUTE_SQL, ("", "CMD-1", unit), None),
+        ("completed_count_for_driver", queries.COMPLETED_COUNT_SQL, (unit,), None),
+        ("complete_mission_log", queries.MISSION_LOG_RESULT_SQL, (0, 0, 0, "CMD-1"), None),
+        ("mission_history", queries.MISSION_HISTORY_SQL, (unit,), None),
+        # Telemetry rollups and retention
+        ("rollup_raw_batch", rollups.RAW_BATCH_SQL, (0, 5000), None),
+        ("prune_raw_telemetry", rollups.PRUNE_RAW_SQL, (0, 0), None),
+        *((f"prune_{table}", rollups.PRUNE_BUCKETS_SQL.format(table=table), (0,), None) for table, _ in rollups.BUCKETS),
+        ("fleet_avg_speed", rollups.FLEET_AVG_SPEED_SQL, (0,), None),
+        ("fleet_speed_series", rollups.SPEED_SERIES_SQL, (0,), None),
+        # Fleet snapshot
+        ("fleet_snapshot", fleet_snapshot.DRIVERS_SQL, (0,), None),
+        ("fleet_snapshot_missions", fleet_snapshot.ACTIVE_MISSIONS_SQL, (), None),
+        # Route matrix
+        ("route_matrix_preview", route_matrix.PREVIEW_SQL, ("A", "B", 0), None),
+        ("route_matrix_bucket", route_matrix.BUCKET_SQL, (0,), None),
+        ("route_matrix_coverage", route_matrix.COVERAGE_SQL, (0, 0), None),
+        # Sensors and green wave
+        ("sensor_window", sensors.WINDOW_SQL, (0,), None),
+        ("prune_sensor_readings", sensors.PRUNE_SQL, (0,), None),
+        ("green_wave_missions", green_wave.MISSIONS_SQL, (), None),
+        ("green_wave_owned", green_wave.OWNED_SQL, (), "SCAN signal_status"),
+        ("green_wave_clear", green_wave.CLEAR_SQL, ("Vyttila Hub",), None),
+        # Leases
+        ("green_junctions", leases.GREEN_JUNCTIONS_SQL, (0,), None),
+        ("driver_clearance", leases.CLEARANCE_SQL, (unit, 0), None),
+        ("sweep_signal_leases", leases.SWEEP_SIGNALS_SQL, (0,), None),
+        ("sweep_clearance_leases", leases.SWEEP_CLEARANCE_SQL, (0,), None),
+        # Spatial index
+        ("hazards_since", spatial_index.HAZARDS_SINCE_SQL, (0, 0), None),
+    ]
+    for scope in comms.SCOPES:
+        # Comms feed polls: cursor id, one driver_id per placeholder of the filter, limit
+        sql, n = comms.fetch_sql(scope)
+        out.append((f"comms_since_{scope}", sql, (0, *[unit] * n, 10), None))
+    return out
+
+
+def explain(conn, sql, params=()):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+
+
+def check_query_plans(db_file=db.DB_FILE):
+    """Return [(name, plan_step)] for every hot query that falls back to a table scan. Empty list == pass."""
+    ensure_schema(db_file)
+    conn = db.get_manager(db_file).connection()
+    failures = []
+    for name, sql, params, allowed_scan in hot_queries():
+        for step in explain(conn, sql, params):
+            if step.startswith("SCAN ") and step != allowed_scan:
+                failures.append((name, step))
+    return failures
+
+
+if __name__ == "__main__":
+    import sys
+
+    if "--check-plans" in sys.argv:
+        bad = check_query_plans()
+        for name, step in bad:
+            print(f"FULL SCAN  {name}: {step}")
+        total = len(hot_queries())
+        print(f"{total - len({n for n, _ in bad})}/{total} hot queries avoid a full table scan")
+        sys.exit(1 if bad else 0)
+    done = migrate()
+    print(f"schema at v{LATEST_VERSION}; applied now: {done or 'nothing'}")
@@ -0,0 +1,165 @@
+"""
+Fixed-memory flow history per junction.
+SeriesBank keeps one row per junction in preallocated NumPy arrays (timestamp / flow / status ring buffers)
+plus running aggregates updated on every push: window sum, a per-junction flow histogram (1 km/h bins) for
+min and percentiles, fast/slow EWMAs for trend, and a congested-since timestamp. A tick for every junction
+is a handful of vectorized array operations - no Python object per sample - and every statistic costs the
+same however long the window is.
+"""
+import threading
+
+import numpy as np
+
+STATUS_CODES = ("CLEAR", "HEAVY", "JAMMED", "GREEN_WAVE")
+CONGESTED = (1, 2)              # HEAVY, JAMMED
+JAMMED_BELOW_KMH = 15
+HEAVY_BELOW_KMH = 35
+SERIES_CAPACITY = 900           # samples per junction (30 min at the 2s sensor tick)
+FLOW_MAX_KMH = 200              # histogram range; faster readings land in the top bin
+EWMA_FAST = 0.3
+EWMA_SLOW = 0.05
+_STATUS_INDEX = {s: i for i, s in enumerate(STATUS_CODES)}
+
+
+class SeriesBank:
+    """Ring buffers for a fixed set of junctions. Thread-safe; readers get copies."""
+
+    def __init__(self, junctions, capacity=SERIES_CAPACITY, alpha_fast=EWMA_FAST, alpha_slow=EWMA_SLOW):
+        self.names = list(junctions)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.capacity = capacity
+        self.alpha_fast = alpha_fast
+        self.alpha_slow = alpha_slow
+        n = len(self.names)
+        self.ts = np.zeros((n, capacity), dtype=np.int64)
+        self.flow = np.zeros((n, capacity), dtype=np.float32)
+        self.status = np.zeros((n, capacity), dtype=np.int8)
+        self.head = np.zeros(n, dtype=np.int64)       # next write slot
+        self.count = np.zeros(n, dtype=np.int64)      # samples held (<= capacity)
+        self.total = np.zeros(n, dtype=np.float64)    # window sum of flow
+        self.hist = np.zeros((n, FLOW_MAX_KMH + 1), dtype=np.int32)
+        self.ewma_fast = np.full(n, np.nan)
+        self.ewma_slow = np.full(n, np.nan)
+        self.congested_since = np.zeros(n, dtype=np.int64)  # 0 = not congested
+        self.last_ts = np.zeros(n, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def rows_for(self, names):
+        return np.fromiter((self.index[n] for n in names), dtype=np.int64, count=len(names))
+
+    # ------------------------------------------
+    # WRITE
+    # ------------------------------------------
+    def push(self, ts_ms, rows, flows, statuses):
+        """One sample for each junction row in `rows` (unique) at ts_ms. flows km/h, statuses int codes."""
+        rows = np.asarray(rows, dtype=np.int64)
+        flows = np.asarray(flows, dtype=np.float32)
+        statuses = np.asarray(statuses, dtype=np.int8)
+        bins_in = np.clip(flows, 0, FLOW_MAX_KMH).astype(np.int64)
+        with self._lock:
+            slot = self.head[rows]
+            full = self.count[rows] == self.capacity
+            if full.any():
+                out_rows, out_slot = rows[full], slot[full]
+                old = self.flow[out_rows, out_slot]
+                self.total[out_rows] -= old
+                self.hist[out_rows, np.clip(old, 0, FLOW_MAX_KMH).astype(np.int64)] -= 1
+            self.ts[rows, slot] = ts_ms
+            self.flow[rows, slot] = flows
+            self.status[rows, slot] = statuses
+            self.total[rows] += flows
+            self.hist[rows, bins_in] += 1
+            self.head[rows] = (slot + 1) % self.capacity
+            self.count[rows] = np.minimum(self.count[rows] + 1, self.capacity)
+
+            fast, slow = self.ewma_fast[rows], self.ewma_slow[rows]
+            first = np.isnan(fast)
+            self.ewma_fast[rows] = np.where(first, flows, fast + self.alpha_fast * (flows - fast))
+            self.ewma_slow[rows] = np.where(first, flows, slow + self.alpha_slow * (flows - slow))
+
+            congested = np.isin(statuses, CONGESTED)
+            since = self.congested_since[rows]
+            self.congested_since[rows] = np.where(congested, np.where(since == 0, ts_ms, since), 0)
+            self.last_ts[rows] = ts_ms
+
+    def push_readings(self, ts_ms, readings):
+        """Push sensors.py readings: iterable of (Area, Status, Flow, ...) tuples. Unknown junctions are skipped."""
+        known = [r for r in readings if r[0] in self.index]
+        if not known:
+            return
+        self.push(
+            ts_ms,
+            self.rows_for([r[0] for r in known]),
+            np.fromiter((r[2] for r in known), dtype=np.float32, count=len(known)),
+            np.fromiter((_STATUS_INDEX.get(r[1], 0) for r in known), dtype=np.int8, count=len(known)),
+        )
+
+    # ------------------------------------------
+    # READ
+    # ------------------------------------------
+    def _percentiles(self, rows, qs):
+        """Per-row nearest-rank flow at each quantile in qs (from the histogram, 1 km/h resolution). NaN where empty."""
+        cum = np.cumsum(self.hist[rows], axis=1)
+        n = self.count[rows]
+        out = np.full((len(rows), len(qs)), np.nan)
+        has = n > 0
+        for j, q in enumerate(qs):
+            target = np.maximum(1, np.ceil(q * n)).astype(np.int64)
+            out[has, j] = np.argmax(cum[has] >= target[has, None], axis=1)
+        return out
+
+    def stats(self, names=None):
+        """{name: {samples, mean, min, p10, p50, p90, ewma, trend, congested_sec}} for the current window.
+        trend = fast EWMA - slow EWMA (km/h): positive means traffic is speeding up."""
+        names = self.names if names is None else [n for n in names if n in self.index]
+        rows = self.rows_for(names)
+        with self._lock:
+            n = self.count[rows]
+            mean = np.divide(self.total[rows], n, out=np.full(len(rows), np.nan), where=n > 0)
+            pct = self._percentiles(rows, (0.0, 0.1, 0.5, 0.9))
+            fast, slow = self.ewma_fast[rows].copy(), self.ewma_slow[rows].copy()
+            since, last = self.congested_since[rows], self.last_ts[rows]
+            congested_sec = np.where(since > 0, (last - since) / 1000.0, 0.0)
+        out = {}
+        for i, name in enumerate(names):
+            out[name] = {
+                "samples": int(n[i]),
+                "mean": float(mean[i]),
+                "min": float(pct[i, 0]),
+                "p10": float(pct[i, 1]),
+                "p50": float(pct[i, 2]),
+                "p90": float(pct[i, 3]),
+                "ewma": float(fast[i]),
+                "trend": float(fast[i] - slow[i]),
+                "congested_sec": float(congested_sec[i]),
+            }
+        return out
+
+    def series(self, name):
+        """(ts_ms, flow, status codes) oldest first, as array copies."""
+        r = self.index[name]
+        with self._lock:
+            n, head = int(self.count[r]), int(self.head[r])
+            order = (np.arange(head - n, head) % self.capacity)
+            return self.ts[r, order].copy(), self.flow[r, order].copy(), self.status[r, order].copy()
+
+    def sparkline(self, name, points=30):
+        """Window downsampled to at most `points` bucket means, oldest first (for inline charts)."""
+        _, flow, _ = self.series(name)
+        if len(flow) <= points:
+            return flow.astype(float).tolist()
+        edges = np.linspace(0, len(flow), points + 1).astype(np.int64)
+        return (np.add.reduceat(flow, edges[:-1]) / np.diff(edges)).astype(float).tolist()
+
+
+def status_code(status):
+    return _STATUS_INDEX.get(status, 0)
+
+
+def classify(flows):
+    """Vectorized flow (km/h) -> status codes (CLEAR / HEAVY / JAMMED)."""
+    flows = np.asarray(flows, dtype=float)
+    return np.where(flows < JAMMED_BELOW_KMH, 2, np.where(flows < HEAVY_BELOW_KMH, 1, 0)).astype(np.int8)
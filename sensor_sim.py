@@ -0,0 +1,168 @@
+"""
+Deterministic city-scale traffic simulator, usable as a sensors.py source (SENSOR_SOURCE=citysim).
+Flow at a junction is a pure function of (seed, junction, timestamp), computed for every junction at once:
+
+    flow = free_flow * (1 - sensitivity * rush_hour(t)) * (1 + spatial_field(x, t)) * incident_factor(x, t)
+
+- spatial_field: low-rank random field (RANDOM_FEATURES cosine features over position) whose weights are
+  interpolated between seeded knots every FIELD_KNOT_SEC, so neighbouring junctions move together.
+- rush_hour: weekday morning / evening peaks (weaker at weekends); central junctions are more sensitive.
+- incidents: inject_incident() plus optional seeded random incidents; flow drops with distance falloff.
+
+The same seed and timestamps always give the same readings, so runs are reproducible for load tests.
+"""
+import math
+import os
+import time
+
+import numpy as np
+
+from shared_utils import SENSORS_GRID
+
+SIM_SEED = 42
+RANDOM_FEATURES = 24
+FIELD_KNOT_SEC = 300              # spatial field weights change smoothly over ~5 min
+FIELD_LENGTH_KM = 3.0             # correlation length of the spatial field
+FIELD_AMPLITUDE = 0.25
+SPREAD_KM = 1.5                   # synthetic junctions scatter this far around the real ones
+RUSH_PEAKS = ((8.75, 1.2), (18.0, 1.5))  # (local hour, width in hours)
+RUSH_DEPTH = 0.6
+WEEKEND_RUSH = 0.4
+INCIDENTS_PER_HOUR = 0.5          # seeded random incidents (0 disables)
+INCIDENT_RADIUS_KM = 1.0
+INCIDENT_DURATION_SEC = 1800
+_KM_PER_DEG = 111.32
+
+
+def _rng(seed, *key):
+    return np.random.default_rng([seed, *key])
+
+
+def make_junctions(n, seed=SIM_SEED, base=None):
+    """{name: (lat, lon)}: the first n real junctions, then seeded synthetic ones clustered around them."""
+    base = dict(base or SENSORS_GRID)
+    names = list(base)
+    out = {k: base[k] for k in names[:n]}
+    extra = n - len(out)
+    if extra > 0:
+        rng = _rng(seed, 0)
+        anchors = np.array([base[k] for k in names])
+        pick = anchors[rng.integers(len(anchors), size=extra)]
+        lat0 = float(anchors[:, 0].mean())
+        off = rng.normal(0, SPREAD_KM, (extra, 2))
+        lats = pick[:, 0] + off[:, 0] / _KM_PER_DEG
+        lons = pick[:, 1] + off[:, 1] / (_KM_PER_DEG * math.cos(math.radians(lat0)))
+        for i in range(extra):
+            out[f"SIM-{i + 1:05d}"] = (round(float(lats[i]), 5), round(float(lons[i]), 5))
+    return out
+
+
+class Incident:
+    __slots__ = ("lat", "lon", "radius_km", "severity", "start_ms", "end_ms")
+
+    def __init__(self, lat, lon, radius_km, severity, start_ms, end_ms):
+        self.lat, self.lon = lat, lon
+        self.radius_km, self.severity = radius_km, severity
+        self.start_ms, self.end_ms = start_ms, end_ms
+
+
+class CitySimulator:
+    """Vectorized, seeded flow field. `read(junctions)` matches the sensors.py source interface."""
+    name = "citysim"
+
+    def __init__(self, junctions=None, n=None, seed=SIM_SEED, incidents_per_hour=INCIDENTS_PER_HOUR, clock=None):
+        self.seed = seed
+        self.junctions = dict(junctions) if junctions else make_junctions(n or len(SENSORS_GRID), seed)
+        self.names = list(self.junctions)
+        self.incidents_per_hour = incidents_per_hour
+        self.clock = clock or (lambda: int(time.time() * 1000))
+        self.incidents = []
+        pos = np.array([self.junctions[k] for k in self.names], dtype=float)
+        lat0, lon0 = pos[:, 0].mean(), pos[:, 1].mean()
+        self._x = (pos[:, 1] - lon0) * _KM_PER_DEG * math.cos(math.radians(lat0))
+        self._y = (pos[:, 0] - lat0) * _KM_PER_DEG
+        self._lat, self._lon = pos[:, 0], pos[:, 1]
+        rng = _rng(seed, 1)
+        r = np.hypot(self._x, self._y)
+        self.free_flow = rng.uniform(45, 75, len(self.names))
+        self.sensitivity = np.clip(0.9 - r / (r.max() + 1e-9) * 0.6 + rng.normal(0, 0.08, len(self.names)), 0.1, 1.0)
+        w = rng.normal(0, 1.0 / FIELD_LENGTH_KM, (RANDOM_FEATURES, 2))
+        b = rng.uniform(0, 2 * np.pi, RANDOM_FEATURES)
+        self._features = np.cos(np.outer(self._x, w[:, 0]) + np.outer(self._y, w[:, 1]) + b) * math.sqrt(2.0 / RANDOM_FEATURES)
+
+    # ------------------------------------------
+    # COMPONENTS
+    # ------------------------------------------
+    def _knot(self, k):
+        return _rng(self.seed, 2, k).normal(0, 1, RANDOM_FEATURES)
+
+    def _field(self, ts_ms):
+        pos = ts_ms / 1000 / FIELD_KNOT_SEC
+        k = math.floor(pos)
+        f = pos - k
+        f = f * f * (3 - 2 * f)  # smoothstep between knots
+        weights = (1 - f) * self._knot(k) + f * self._knot(k + 1)
+        return np.clip(FIELD_AMPLITUDE * (self._features @ weights), -0.6, 0.6)
+
+    @staticmethod
+    def rush_hour(ts_ms):
+        """0..1 rush intensity at a local timestamp."""
+        t = time.localtime(ts_ms / 1000)
+        hour = t.tm_hour + t.tm_min / 60 + t.tm_sec / 3600
+        level = max(math.exp(-0.5 * ((hour - h) / w) ** 2) for h, w in RUSH_PEAKS)
+        return level * (WEEKEND_RUSH if t.tm_wday >= 5 else 1.0)
+
+    def inject_incident(self, lat, lon, radius_km=INCIDENT_RADIUS_KM, severity=0.8, start_ms=None, duration_sec=INCIDENT_DURATION_SEC):
+        """Cut flow by up to `severity` (0..1) around (lat, lon) from start_ms (default now) for duration_sec."""
+        start_ms = self.clock() if start_ms is None else start_ms
+        inc = Incident(lat, lon, radius_km, severity, start_ms, start_ms + int(duration_sec * 1000))
+        self.incidents.append(inc)
+        return inc
+
+    def _random_incidents(self, ts_ms):
+        """Seeded incidents active at ts_ms: each hour slot draws its own count and places them at junctions."""
+        if self.incidents_per_hour <= 0 or not self.names:
+            return []
+        out = []
+        hour = int(ts_ms // 3600000)
+        for h in range(hour - math.ceil(INCIDENT_DURATION_SEC / 3600), hour + 1):
+            rng = _rng(self.seed, 3, h)
+            for _ in range(rng.poisson(self.incidents_per_hour)):
+                j = int(rng.integers(len(self.names)))
+                start = h * 3600000 + int(rng.integers(3600000))
+                inc = Incident(self._lat[j], self._lon[j], INCIDENT_RADIUS_KM, float(rng.uniform(0.4, 0.9)),
+                               start, start + INCIDENT_DURATION_SEC * 1000)
+                if inc.start_ms <= ts_ms < inc.end_ms:
+                    out.append(inc)
+        return out
+
+    def _incident_factor(self, ts_ms):
+        factor = np.ones(len(self.names))
+        self.incidents = [i for i in self.incidents if i.end_ms > ts_ms - 3600000]  # drop long-finished ones
+        for inc in self.incidents + self._random_incidents(ts_ms):
+            if not inc.start_ms <= ts_ms < inc.end_ms:
+                continue
+            dy = (self._lat - inc.lat) * _KM_PER_DEG
+            dx = (self._lon - inc.lon) * _KM_PER_DEG * math.cos(math.radians(inc.lat))
+            d = np.hypot(dx, dy)
+            factor *= 1 - inc.severity * np.exp(-0.5 * (d / inc.radius_km) ** 2)
+        return factor
+
+    # ------------------------------------------
+    # OUTPUT
+    # ------------------------------------------
+    def flows_at(self, ts_ms):
+        """Flow (km/h) for every junction, in self.names order."""
+        flow = self.free_flow * (1 - RUSH_DEPTH * self.sensitivity * self.rush_hour(ts_ms))
+        flow = flow * (1 + self._field(ts_ms)) * self._incident_factor(ts_ms)
+        return np.clip(np.rint(flow), 3, 120)
+
+    def read(self, junctions=None):
+        flows = self.flows_at(self.clock()).astype(int).tolist()
+        return dict(zip(self.names, flows))
+
+
+def from_env():
+    """CitySimulator configured by SENSOR_SIM_JUNCTIONS / SENSOR_SIM_SEED (used by sensors.make_source)."""
+    return CitySimulator(n=int(os.environ.get("SENSOR_SIM_JUNCTIONS", len(SENSORS_GRID))),
+                         seed=int(os.environ.get("SENSOR_SIM_SEED", SIM_SEED)))
@@ -0,0 +1,213 @@
+"""
+Sensor ingestion: one background loop per process reads every junction in SENSORS_GRID from a pluggable
+source on a fixed cadence, appends the readings to `sensor_readings` and publishes an immutable latest-value
+table. Unexpired GREEN_WAVE rows in signal_status override the published reading only; the table, series and
+forecast keep the measured flow. Sessions and fragments call latest() instead of generating readings per
+render, so every viewer sees the same values.
+
+Sources (SENSOR_SOURCE env var): "sim" (default, bounded random walk per junction), "tomtom" (Traffic
+Flow API current speed at the junction) or "citysim" (sensor_sim.py: seeded city-scale field, which also
+supplies its own junction set). Anything with a `name` and `read(junctions) -> {name: km/h}`
+can be passed to ensure_worker(). Each tick is also pushed into a sensor_series.SeriesBank (rolling history
+per junction), reloaded from the table on start, and trains the forecast.Forecaster (congestion outlook).
+"""
+import itertools
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import db
+import forecast
+import leases
+import sensor_series
+import sensor_sim
+from shared_utils import SENSORS_GRID, TOMTOM_API_KEY, tomtom
+
+SENSOR_TICK_SEC = 2.0
+SENSOR_RETENTION_HOURS = 24
+PRUNE_EVERY_TICKS = 300          # retention pass every ~10 min at the default tick
+FORECAST_SAVE_TICKS = 150        # forecast baseline slots are persisted every ~5 min
+GREEN_WAVE_FLOW = 80             # junctions under green-wave control report free flow
+FLOW_URL = "https://api.tomtom.com/traffic/services/4/flowSegmentData/absolute/10/json"
+FLOW_BUDGET_SEC = 1.5            # per junction per tick; a slow junction keeps its previous reading
+
+FIELDS = ("Area", "Status", "Flow", "Lat", "Lon")
+WINDOW_SQL = "SELECT junction, ts_ms, flow, status FROM sensor_readings WHERE ts_ms >= ? ORDER BY ts_ms"
+PRUNE_SQL = "DELETE FROM sensor_readings WHERE ts_ms < ?"
+
+
+def classify(flow):
+    return "JAMMED" if flow < sensor_series.JAMMED_BELOW_KMH else "HEAVY" if flow < sensor_series.HEAVY_BELOW_KMH else "CLEAR"
+
+
+# ==========================================
+# SOURCES
+# ==========================================
+class SimulatedSource:
+    """Bounded random walk per junction (km/h), so consecutive readings look like a traffic stream."""
+    name = "sim"
+
+    def __init__(self, low=10, high=70, step=6, seed=None):
+        self.low = low
+        self.high = high
+        self.step = step
+        self._rng = random.Random(seed)
+        self._flow = {}
+
+    def read(self, junctions):
+        out = {}
+        for name in junctions:
+            prev = self._flow.get(name)
+            if prev is None:
+                flow = self._rng.randint(self.low, self.high)
+            else:
+                flow = min(self.high, max(self.low, prev + self._rng.randint(-self.step, self.step)))
+            self._flow[name] = out[name] = flow
+        return out
+
+
+class TomTomFlowSource:
+    """Current speed of the road segment nearest each junction (TomTom Traffic Flow, via the shared client)."""
+    name = "tomtom"
+
+    def __init__(self, workers=8, budget=FLOW_BUDGET_SEC):
+        self.budget = budget
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="titan-sensor-flow")
+
+    def _one(self, lat, lon):
+        data = tomtom.get_json(f"{FLOW_URL}?point={lat},{lon}&unit=KMPH&key={TOMTOM_API_KEY}", budget=self.budget)
+        seg = (data or {}).get("flowSegmentData") or {}
+        return seg.get("currentSpeed")
+
+    def read(self, junctions):
+        futures = {name: self._pool.submit(self._one, lat, lon) for name, (lat, lon) in junctions.items()}
+        out = {}
+        for name, f in futures.items():
+            speed = f.result()
+            if speed is not None:
+                out[name] = int(speed)
+        return out
+
+
+SOURCES = {"sim": SimulatedSource, "tomtom": TomTomFlowSource, "citysim": sensor_sim.from_env}
+
+
+def make_source(name=None):
+    return SOURCES[name or os.environ.get("SENSOR_SOURCE", "sim")]()
+
+
+# ==========================================
+# INGESTION LOOP (one per process per DB file)
+# ==========================================
+class SensorSnapshot:
+    """Latest reading per junction. `version` increments on every tick."""
+    __slots__ = ("version", "taken_ms", "readings")
+
+    def __init__(self, version, taken_ms, readings):
+        self.version = version
+        self.taken_ms = taken_ms
+        self.readings = readings  # tuple of (Area, Status, Flow, Lat, Lon)
+
+
+class SensorIngestor(db.Worker):
+    def __init__(self, db_file=db.DB_FILE, source=None, tick=SENSOR_TICK_SEC, junctions=None):
+        super().__init__(db_file, tick, name="titan-sensor-ingest", fixed_rate=True)
+        self.source = source or make_source()
+        self.junctions = dict(junctions or getattr(self.source, "junctions", None) or SENSORS_GRID)
+        self.series = sensor_series.SeriesBank(self.junctions)
+        self.forecaster = forecast.Forecaster(self.junctions)
+        self.rows_written = 0
+        self._measured = {}  # last flow the source reported per junction
+        self._snapshot = None
+        self._ready = threading.Event()
+
+    def tick(self):
+        """Read the source, persist the measured values, publish them with green-wave overrides. Returns the new snapshot."""
+        flows = self.source.read(self.junctions)
+        green = leases.green_junctions(self.db_file)
+        ts = db.now_ms()
+        measured, readings, rows = [], [], []
+        for name, (lat, lon) in self.junctions.items():
+            flow = flows.get(name)
+            fresh = flow is not None
+            if fresh:
+                self._measured[name] = flow = int(flow)
+            elif name in self._measured:
+                flow = self._measured[name]  # source had nothing this tick: keep the last value, don't persist it
+            else:
+                continue
+            status = classify(flow)
+            if fresh:
+                rows.append((name, ts, flow, status, self.source.name))
+            measured.append((name, status, flow))
+            readings.append((name, "GREEN_WAVE", GREEN_WAVE_FLOW, lat, lon) if name in green else (name, status, flow, lat, lon))
+        if rows:
+            db.executemany(
+                "INSERT INTO sensor_readings (junction, ts_ms, flow, status, source) VALUES (?, ?, ?, ?, ?)",
+                rows, db_file=self.db_file,
+            )
+            self.rows_written += len(rows)
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        self._snapshot = SensorSnapshot(version, ts, tuple(readings))  # atomic reference swap
+        self.series.push_readings(ts, measured)
+        self.forecaster.update_readings(ts, [r for r in measured if r[0] in flows])
+        self._ready.set()
+        n = self.runs + 1  # counting this tick
+        if n % FORECAST_SAVE_TICKS == 0:
+            self.forecaster.save(self.db_file)
+        if n % PRUNE_EVERY_TICKS == 0:
+            prune(db_file=self.db_file)
+        return self._snapshot
+
+    def _backfill(self):
+        """Reload the series window from sensor_readings so history survives a restart."""
+        since = db.ago_ms(self.series.capacity * self.interval)
+        rows = db.fetchall(WINDOW_SQL, (since,), db_file=self.db_file)
+        # One vectorized push per tick (rows of a tick share ts_ms); a junction seen twice at one ts_ms starts
+        # a new push, since push() takes each junction once
+        for ts, group in itertools.groupby(rows, key=lambda r: r[1]):
+            batch = {}
+            for name, _, flow, status in group:
+                if name in batch:
+                    self.series.push_readings(ts, batch.values())
+                    batch = {}
+                batch[name] = (name, status, flow)
+            self.series.push_readings(ts, batch.values())
+        return len(rows)
+
+    def setup(self):
+        self.forecaster.load(self.db_file)
+        self._backfill()
+
+    def snapshot(self, wait_sec=2.0):
+        """Current SensorSnapshot; the first call waits up to wait_sec for the first tick."""
+        if self._snapshot is None:
+            self._ready.wait(wait_sec)
+        return self._snapshot
+
+    def latest(self):
+        """[{"Area", "Status", "Flow", "Lat", "Lon"}] - fresh dicts, safe for callers to sort/mutate."""
+        snap = self.snapshot()
+        return [dict(zip(FIELDS, r)) for r in snap.readings] if snap else []
+
+    def stats(self, names=None):
+        """Rolling window statistics per junction (see sensor_series.SeriesBank.stats)."""
+        return self.series.stats(names)
+
+    def sparkline(self, name, points=30):
+        return self.series.sparkline(name, points) if name in self.series.index else []
+
+
+def prune(hours=SENSOR_RETENTION_HOURS, db_file=db.DB_FILE):
+    return db.execute(PRUNE_SQL, (db.ago_ms(hours * 3600),), db_file=db_file).rowcount
+
+
+def ensure_worker(db_file=db.DB_FILE, source=None, tick=SENSOR_TICK_SEC):
+    """Start the ingestion thread once per process; later calls return the running worker."""
+    return db.ensure_worker("sensors", db_file, lambda path: SensorIngestor(path, source, tick))
+
+
+def latest(db_file=db.DB_FILE):
+    """Shared latest-value table for db_file (starts the ingestion loop on first use)."""
+    return ensure_worker(db_file).latest()
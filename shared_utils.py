@@ -5,7 +5,17 @@ Single source of truth for API calls, route alternatives, and shared config.
 import math
 import hashlib
 import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+
+import geometry
 
 TOMTOM_API_KEY = os.environ.get("TOMTOM_API_KEY", "EH7SOW12eDLJn2bR6UvfEbnpNvnrx8o4")
 BASE_URL = "https://api.tomtom.com/routing/1/calculateRoute"
@@ -36,105 +46,408 @@ HOSPITALS = {
 }
 
 
-def _build_url(start, end, route_type="fastest", max_alternatives=0, instructions=True):
+# Traffic sensor / signal junctions (sensor grid, green wave control)
+SENSORS_GRID = {
+    "Edappally Toll": (10.0261, 76.3085), "Palarivattom Junc": (10.0033, 76.3063),
+    "Vyttila Hub": (9.9660, 76.3185), "Kundannoor Junc": (9.9482, 76.3180),
+    "Madhava Pharmacy": (9.9850, 76.2830), "MG Road (North)": (9.9790, 76.2760),
+    "MG Road (South)": (9.9630, 76.2880), "High Court Junc": (9.9790, 76.2760),
+    "Kaloor Stadium": (9.9940, 76.2920), "Kadavanthra Junc": (9.9670, 76.2980),
+    "SA Road": (9.9650, 76.3000), "Panampilly Nagar": (9.9600, 76.2950),
+    "Thevara Ferry": (9.9400, 76.2900), "Thoppumpady Junc": (9.9312, 76.2673),
+    "Fort Kochi": (9.9650, 76.2400), "Mattancherry": (9.9550, 76.2550),
+    "Willingdon Island": (9.9500, 76.2650), "Container Road": (10.0155, 76.2555),
+    "Kalamassery Premier": (10.0510, 76.3550), "Aluva Bypass": (10.1076, 76.3516),
+    "Aluva Pump Junc": (10.1100, 76.3500), "Companypady": (10.0800, 76.3500),
+    "HMT Junction": (10.0450, 76.3400), "Seaport-Airport Rd": (10.0384, 76.3458),
+    "Kakkanad Civil Stn": (10.0150, 76.3400), "Infopark Phase 1": (10.0100, 76.3600),
+    "Infopark Phase 2": (10.0050, 76.3700), "Tripunithura Statue": (9.9500, 76.3400),
+    "Pettah Junc": (9.9550, 76.3300), "Maradu Junc": (9.9400, 76.3200),
+    "Kumbalam Toll": (9.9100, 76.3100), "Aroor Bypass": (9.8730, 76.3070),
+    "Cheranallur Signal": (10.0400, 76.2800), "Varapuzha Bridge": (10.0600, 76.2700),
+    "Paravur Junc": (10.1500, 76.2300), "Angamaly KSRTC": (10.1900, 76.3800),
+    "Nedumbassery (Airport)": (10.1500, 76.4000), "Desom Junc": (10.1300, 76.3600),
+    "Bolgatty Junc": (9.9800, 76.2700), "Goshree Bridge": (9.9900, 76.2600)
+}
+
+def _build_url(start, end, route_type="fastest", max_alternatives=0, instructions=True, depart_at=None):
     start_s = f"{start[0]},{start[1]}"
     end_s = f"{end[0]},{end[1]}"
     url = f"{BASE_URL}/{start_s}:{end_s}/json?key={TOMTOM_API_KEY}&traffic=true&routeType={route_type}"
     if max_alternatives > 0:
         url += f"&maxAlternatives={max_alternatives}"
+    if depart_at:
+        url += f"&departAt={depart_at}"  # ISO 8601, future: TomTom uses historic traffic for that time
     if instructions:
         url += "&instructionsType=text&language=en-US"
     return url
 
 
-def fetch_routes(start, end, priority_factor=1.0, max_alternatives=3):
-    """
-    Fetches up to 4 route alternatives (1 main + 3 alt) - Fastest type.
-    Returns list of {id, coords, eta, raw_eta, dist, instructions}.
-    """
-    url = _build_url(start, end, route_type="fastest", max_alternatives=max_alternatives)
+# ==========================================
+# TOMTOM HTTP CLIENT (keep-alive pool, deadline, retries)
+# ==========================================
+TOMTOM_TIMEOUT_SEC = 10        # per attempt
+TOMTOM_DEADLINE_SEC = 12       # per call, across all attempts
+TOMTOM_MAX_RETRIES = 2
+TOMTOM_BACKOFF_SEC = 0.3       # base for jittered exponential backoff
+TOMTOM_POOL_SIZE = 8
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class TomTomClient:
+    """Shared requests.Session for TomTom. get_json() never raises; failures are counted and kept in last_error."""
+
+    def __init__(self, timeout=TOMTOM_TIMEOUT_SEC, deadline=TOMTOM_DEADLINE_SEC, max_retries=TOMTOM_MAX_RETRIES,
+                 backoff=TOMTOM_BACKOFF_SEC, pool_size=TOMTOM_POOL_SIZE):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.bytes_in = 0
+        self.latency_sec = 0.0
+        self.max_latency_sec = 0.0
+        self.last_error = None
+
+    def _count(self, **inc):
+        with self._lock:
+            for name, n in inc.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def _fail(self, msg):
+        with self._lock:
+            self.errors += 1
+            self.last_error = msg
+
+    def get_json(self, url, budget=None):
+        """GET url, retrying 429/5xx/connection errors with jittered backoff until `budget` seconds
+        (default self.deadline) are spent. Returns the decoded JSON, or None on failure."""
+        t0 = time.monotonic()
+        deadline = t0 + (self.deadline if budget is None else budget)
+        self._count(calls=1)
+        try:
+            for attempt in range(self.max_retries + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count(timeouts=1)
+                    self._fail("deadline exceeded")
+                    return None
+                if attempt:
+                    self._count(retries=1)
+                self._count(attempts=1)
+                retry_msg = None
+                try:
+                    resp = self.session.get(url, timeout=min(self.timeout, remaining))
+                except requests.Timeout:
+                    self._count(timeouts=1)
+                    retry_msg = "timeout"
+                except requests.ConnectionError as e:
+                    retry_msg = f"connection error: {e.__class__.__name__}"
+                except requests.RequestException as e:
+                    self._fail(f"request error: {e.__class__.__name__}")
+                    return None
+                else:
+                    self._count(bytes_in=len(resp.content))
+                    if resp.status_code == 200:
+                        try:
+                            return resp.json()
+                        except ValueError:
+                            self._fail("invalid JSON")
+                            return None
+                    if resp.status_code not in RETRYABLE_STATUS:
+                        self._fail(f"HTTP {resp.status_code}")
+                        return None
+                    retry_msg = f"HTTP {resp.status_code}"
+                if attempt == self.max_retries:
+                    self._fail(retry_msg)
+                    return None
+                pause = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                time.sleep(max(0.0, min(pause, deadline - time.monotonic())))
+            return None
+        finally:
+            elapsed = time.monotonic() - t0
+            with self._lock:
+                self.latency_sec += elapsed
+                self.max_latency_sec = max(self.max_latency_sec, elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.retries,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "bytes_in": self.bytes_in,
+                "avg_latency_ms": round(self.latency_sec * 1000 / self.calls, 1) if self.calls else 0.0,
+                "max_latency_ms": round(self.max_latency_sec * 1000, 1),
+                "last_error": self.last_error,
+            }
+
+
+tomtom = TomTomClient()
+
+
+# ==========================================
+# ROUTE CACHE (process-wide, shared by every session and fragment)
+# ==========================================
+ROUTE_CACHE_TTL_SEC = float(os.environ.get("ROUTE_CACHE_TTL_SEC", 120))  # how stale live-traffic ETAs may get
+ROUTE_CACHE_MAX_ENTRIES = int(os.environ.get("ROUTE_CACHE_MAX_ENTRIES", 256))
+ROUTE_KEY_DECIMALS = 4  # ~11 m: GPS jitter around the same point reuses the entry
+ROUTE_CACHE_PARTIAL_TTL_SEC = 10  # results missing a strategy (deadline / error) are retried soon
+
+
+class RouteCache:
+    """TTL + LRU cache of routing results with hit/miss/latency counters. Only non-empty results are stored.
+    Concurrent misses on one key share a single fetch (the others wait for its result)."""
+
+    def __init__(self, ttl=ROUTE_CACHE_TTL_SEC, max_entries=ROUTE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (stored_at, value, ttl); most recently used last
+        self._lock = threading.Lock()
+        self._inflight = {}         # key -> Future of the fetch running for it
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.expired = 0
+        self.evictions = 0
+        self.fetches = 0
+        self.fetch_seconds = 0.0
+        self.max_fetch_seconds = 0.0
+
+    @staticmethod
+    def key(start, end, route_type, max_alternatives):
+        return (round(float(start[0]), ROUTE_KEY_DECIMALS), round(float(start[1]), ROUTE_KEY_DECIMALS),
+                round(float(end[0]), ROUTE_KEY_DECIMALS), round(float(end[1]), ROUTE_KEY_DECIMALS),
+                route_type, max_alternatives)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - item[0] > item[2]:
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value, self.ttl if ttl is None else ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_fetch(self, key, fetch):
+        """fetch() returns the value, or (value, ttl) to store it for ttl seconds instead of self.ttl."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and time.monotonic() - item[0] <= item[2]:
+                return item[1]  # stored by a fetch that finished after our miss
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result()  # another caller is fetching this key: wait for it
+        try:
+            t0 = time.perf_counter()
+            value, ttl = fetch(), None
+            if isinstance(value, tuple):
+                value, ttl = value
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.fetches += 1
+                self.fetch_seconds += elapsed
+                self.max_fetch_seconds = max(self.max_fetch_seconds, elapsed)
+            if value:
+                self.put(key, value, ttl)
+            fut.set_result(value)
+            return value
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "fetches": self.fetches,
+                "coalesced": self.coalesced,
+                "avg_fetch_ms": round(self.fetch_seconds * 1000 / self.fetches, 1) if self.fetches else 0.0,
+                "max_fetch_ms": round(self.max_fetch_seconds * 1000, 1),
+            }
+
+
+route_cache = RouteCache()
+
+
+def _copy_routes(routes):
+    """Callers get their own dicts so edits never leak into the cached entry."""
+    return [type(r)(r) for r in routes]
+
+
+def fetch_routes_uncached(start, end, max_alternatives=3, depart_at=None):
+    """Direct TomTom call (no cache, no priority factor). Routes carry travel_sec so callers can scale ETAs."""
+    url = _build_url(start, end, route_type="fastest", max_alternatives=max_alternatives, depart_at=depart_at)
     data = []
     try:
-        r = requests.get(url, timeout=10).json()
-        if "routes" not in r:
+        r = tomtom.get_json(url)
+        if not r or "routes" not in r:
             return data
         for idx, route in enumerate(r["routes"]):
             summ = route.get("summary", {})
-            adjusted_eta = int((summ.get("travelTimeInSeconds", 0) * priority_factor) / 60)
-            raw_eta = int(summ.get("travelTimeInSeconds", 0) / 60)
             coords = [[p["latitude"], p["longitude"]] for p in route["legs"][0]["points"]]
             instr = []
             for ins in route.get("guidance", {}).get("instructions", []):
                 msg = ins.get("message")
                 if msg:
                     instr.append(msg)
-            data.append({
+            data.append(geometry.compact({
                 "id": idx,
                 "coords": coords,
-                "eta": adjusted_eta,
-                "raw_eta": raw_eta,
+                "travel_sec": summ.get("travelTimeInSeconds", 0),
+                "raw_eta": int(summ.get("travelTimeInSeconds", 0) / 60),
                 "dist": round(summ.get("lengthInMeters", 0) / 1000, 1),
                 "instructions": instr,
                 "route_type": "Fastest" if idx == 0 else f"Alternative {idx + 1}",
-            })
+            }))
     except Exception:
         pass
     return data
 
 
+def fetch_routes(start, end, priority_factor=1.0, max_alternatives=3):
+    """
+    Fetches up to 4 route alternatives (1 main + 3 alt) - Fastest type.
+    Returns list of {id, coords, eta, raw_eta, dist, instructions} (geometry.CompactRoute: coords decode on access).
+    Served from route_cache; priority_factor is applied after the lookup so it does not split cache keys.
+    """
+    if not start or not end:
+        return []
+    key = RouteCache.key(start, end, "fastest", max_alternatives)
+    routes = _copy_routes(route_cache.get_or_fetch(key, lambda: fetch_routes_uncached(start, end, max_alternatives)))
+    for r in routes:
+        r["eta"] = int((r["travel_sec"] * priority_factor) / 60)
+    return routes
+
+
+ALT_DEADLINE_SEC = 8           # fetch_route_alternatives_4 returns whatever arrived by then
+ROUTE_SIMILARITY = 0.9         # grid-cell overlap above which two alternatives count as the same road
+_SIMILARITY_GRID = 3           # decimals (~110 m cells)
+_route_pool = ThreadPoolExecutor(max_workers=TOMTOM_POOL_SIZE, thread_name_prefix="titan-route")
+
+
+def _parse_route(route, route_type):
+    summ = route.get("summary", {})
+    coords = [[p["latitude"], p["longitude"]] for p in route["legs"][0]["points"]]
+    instr = []
+    for ins in route.get("guidance", {}).get("instructions", []):
+        msg = ins.get("message")
+        if msg:
+            instr.append(msg)
+    return {
+        "route_type": route_type,
+        "coords": coords,
+        "eta": int(summ.get("travelTimeInSeconds", 0) / 60),
+        "dist": round(summ.get("lengthInMeters", 0) / 1000, 1),
+        "instructions": instr,
+    }
+
+
+def _route_cells(coords):
+    return {(round(lat, _SIMILARITY_GRID), round(lon, _SIMILARITY_GRID)) for lat, lon in coords}
+
+
+def _similar(cells_a, cells_b, threshold=ROUTE_SIMILARITY):
+    """Jaccard overlap of the grid cells two polylines pass through."""
+    if not cells_a or not cells_b:
+        return False
+    return len(cells_a & cells_b) / len(cells_a | cells_b) >= threshold
+
+
+def _fetch_strategy(start, end, route_type, max_alternatives, budget):
+    """Routes of one strategy; None when the call failed."""
+    r = tomtom.get_json(_build_url(start, end, route_type=route_type, max_alternatives=max_alternatives), budget=budget)
+    return None if r is None else r.get("routes", [])
+
+
+def _fetch_alternatives_4(start, end, deadline_sec=ALT_DEADLINE_SEC):
+    """Uncached: fastest (+3 alternatives), shortest and eco requested concurrently; near-duplicate
+    geometries are dropped. After deadline_sec, whatever has arrived is returned.
+    Returns (routes, ttl): ttl is ROUTE_CACHE_PARTIAL_TTL_SEC when a strategy missed the deadline or failed."""
+    strategies = [
+        ("fastest", 3, ["Fastest", "Alternative 2", "Alternative 3", "Alternative 4"]),
+        ("shortest", 0, ["Shortest"]),
+        ("eco", 0, ["Eco"]),
+    ]
+    futures = [_route_pool.submit(_fetch_strategy, start, end, rtype, n_alt, deadline_sec) for rtype, n_alt, _ in strategies]
+    wait(futures, timeout=deadline_sec)
+    results, seen, complete = [], [], True
+    # Merge in preference order (TomTom's fastest set first), skipping strategies that missed the deadline
+    for fut, (_, _, labels) in zip(futures, strategies):
+        if not fut.done() or fut.exception() is not None or fut.result() is None:
+            complete = False
+            continue
+        for idx, route in enumerate(fut.result()[:len(labels)]):
+            try:
+                parsed = _parse_route(route, labels[idx])
+            except (KeyError, IndexError, TypeError):
+                continue
+            cells = _route_cells(parsed["coords"])
+            if any(_similar(cells, other) for other in seen):
+                continue
+            seen.append(cells)
+            parsed["id"] = len(results)
+            results.append(geometry.compact(parsed))
+    return results[:4], (None if complete else ROUTE_CACHE_PARTIAL_TTL_SEC)
+
+
 def fetch_route_alternatives_4(start, end):
     """
     Fetches 4 route alternatives: Fastest, Shortest, Eco, and Fastest Alternate.
     Returns list of 4 dicts: {id, route_type, coords, eta, dist, instructions}.
+    Served from route_cache; the straight-line placeholder used when TomTom fails is never cached, and a
+    partial set (a strategy timed out or failed) only for ROUTE_CACHE_PARTIAL_TTL_SEC.
     """
-    results = []
-    try:
-        url = _build_url(start, end, route_type="fastest", max_alternatives=3)
-        r = requests.get(url, timeout=10).json()
-        routes = r.get("routes", [])[:4]
-        labels = ["Fastest", "Alternative 2", "Alternative 3", "Alternative 4"]
-        for idx, route in enumerate(routes):
-            summ = route.get("summary", {})
-            coords = [[p["latitude"], p["longitude"]] for p in route["legs"][0]["points"]]
-            instr = []
-            for ins in route.get("guidance", {}).get("instructions", []):
-                msg = ins.get("message")
-                if msg:
-                    instr.append(msg)
-            results.append({
-                "id": idx,
-                "route_type": labels[idx] if idx < len(labels) else f"Route {idx + 1}",
-                "coords": coords,
-                "eta": int(summ.get("travelTimeInSeconds", 0) / 60),
-                "dist": round(summ.get("lengthInMeters", 0) / 1000, 1),
-                "instructions": instr,
-            })
-        if len(results) < 4:
-            for rtype, label in [("shortest", "Shortest"), ("eco", "Eco")]:
-                if len(results) >= 4:
-                    break
-                url = _build_url(start, end, route_type=rtype, max_alternatives=0)
-                r = requests.get(url, timeout=10).json()
-                route_list = r.get("routes", [])
-                if route_list:
-                    route = route_list[0]
-                    summ = route.get("summary", {})
-                    coords = [[p["latitude"], p["longitude"]] for p in route["legs"][0]["points"]]
-                    instr = []
-                    for ins in route.get("guidance", {}).get("instructions", []):
-                        msg = ins.get("message")
-                        if msg:
-                            instr.append(msg)
-                    results.append({
-                        "id": len(results),
-                        "route_type": label,
-                        "coords": coords,
-                        "eta": int(summ.get("travelTimeInSeconds", 0) / 60),
-                        "dist": round(summ.get("lengthInMeters", 0) / 1000, 1),
-                        "instructions": instr,
-                    })
-    except Exception:
-        pass
+    if not start or not end:
+        return []
+    key = RouteCache.key(start, end, "alternatives_4", 4)
+    results = _copy_routes(route_cache.get_or_fetch(key, lambda: _fetch_alternatives_4(start, end)))
     if not results and start and end:
         results = [{
             "id": 0,
@@ -158,6 +471,32 @@ def distance_km(lat1, lon1, lat2, lon2):
     return meters / 1000.0
 
 
+EARTH_RADIUS_KM = 6371.0
+
+
+def distances_km(lat, lon, lats, lons):
+    """One-to-many haversine: km from (lat, lon) to each of lats/lons (array-likes). NaN in, NaN out."""
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    lon2 = np.radians(np.asarray(lons, dtype=float))
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    x = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(x, 0.0, 1.0)))
+
+
+def distance_matrix_km(lats1, lons1, lats2, lons2, method="haversine"):
+    """Many-to-many distances, shape (len(lats1), len(lats2)). method="equirect" is ~2x cheaper and within
+    0.1% of haversine at city scale (tens of km)."""
+    a_lat = np.radians(np.asarray(lats1, dtype=float))[:, None]
+    a_lon = np.radians(np.asarray(lons1, dtype=float))[:, None]
+    b_lat = np.radians(np.asarray(lats2, dtype=float))[None, :]
+    b_lon = np.radians(np.asarray(lons2, dtype=float))[None, :]
+    if method == "equirect":
+        x = (b_lon - a_lon) * np.cos((a_lat + b_lat) / 2)
+        return EARTH_RADIUS_KM * np.hypot(x, b_lat - a_lat)
+    h = np.sin((b_lat - a_lat) / 2) ** 2 + np.cos(a_lat) * np.cos(b_lat) * np.sin((b_lon - a_lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
 def hash_password(password):
     """Return SHA-256 hash of password as hex string."""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -0,0 +1,271 @@
+"""
+In-memory spatial index (uniform lat/lon grid buckets) for drivers, hospitals, hazards and junctions.
+upsert() moves a point between buckets in O(1), so indexes stay current as heartbeats arrive; knn(),
+radius() and bbox() only look at the buckets around the query instead of scanning every point. Below
+KNN_SCAN_BELOW points, knn() does one vectorized haversine over a dense positions array instead.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+
+import db
+from shared_utils import HOSPITALS, SENSORS_GRID, distances_km
+
+CELL_DEG = 0.01            # ~1.1 km buckets
+HAZARD_WINDOW_SEC = 86400  # hazards older than this drop out of the live hazard index
+HAZARD_POLL_SEC = 1.0      # at most one DB poll per second however many sessions ask
+KNN_SCAN_BELOW = 2000      # smaller indexes: one vectorized scan beats walking the grid rings
+_KM_PER_DEG = 111.32
+HAZARDS_SINCE_SQL = "SELECT id, lat, lon, type, timestamp_ms FROM hazards WHERE id > ? AND timestamp_ms >= ? ORDER BY id"
+
+
+class GridIndex:
+    """Points keyed by id, bucketed by (floor(lat / cell), floor(lon / cell)). Thread-safe."""
+
+    def __init__(self, cell_deg=CELL_DEG):
+        self.cell_deg = cell_deg
+        self._cells = {}   # cell -> set(keys)
+        self._pos = {}     # key -> (lat, lon, cell)
+        self._data = {}    # key -> payload
+        self._bounds = None  # (min_i, max_i, min_j, max_j) of cells ever used
+        self._keys = []      # dense key list + positions array for the small-index scan in knn()
+        self._slot = {}      # key -> row in _keys / _xy
+        self._xy = np.empty((16, 2))
+        self._lock = threading.RLock()
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def __len__(self):
+        return len(self._pos)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def get(self, key):
+        """(lat, lon, data) or None."""
+        with self._lock:
+            p = self._pos.get(key)
+            return (p[0], p[1], self._data.get(key)) if p else None
+
+    def keys(self):
+        with self._lock:
+            return list(self._pos)
+
+    def upsert(self, key, lat, lon, data=None):
+        """Insert or move a point. Returns True if the position changed."""
+        cell = self._cell(lat, lon)
+        with self._lock:
+            old = self._pos.get(key)
+            self._data[key] = data
+            if old is not None and old[0] == lat and old[1] == lon:
+                return False
+            if old is not None and old[2] != cell:
+                bucket = self._cells[old[2]]
+                bucket.discard(key)
+                if not bucket:
+                    del self._cells[old[2]]
+            self._cells.setdefault(cell, set()).add(key)
+            self._pos[key] = (lat, lon, cell)
+            slot = self._slot.get(key)
+            if slot is None:
+                slot = self._slot[key] = len(self._keys)
+                self._keys.append(key)
+                if slot == len(self._xy):
+                    self._xy = np.concatenate([self._xy, np.empty_like(self._xy)])
+            self._xy[slot] = (lat, lon)
+            i, j = cell
+            b = self._bounds
+            self._bounds = (i, i, j, j) if b is None else (min(b[0], i), max(b[1], i), min(b[2], j), max(b[3], j))
+            return True
+
+    def remove(self, key):
+        with self._lock:
+            old = self._pos.pop(key, None)
+            self._data.pop(key, None)
+            if old is None:
+                return False
+            slot, last = self._slot.pop(key), self._keys.pop()
+            if last != key:  # move the last row into the freed one
+                self._keys[slot], self._slot[last] = last, slot
+                self._xy[slot] = self._xy[len(self._keys)]
+            bucket = self._cells.get(old[2])
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._cells[old[2]]
+            return True
+
+    def _distances(self, lat, lon, keys):
+        pts = np.array([self._pos[k][:2] for k in keys], dtype=float).reshape(-1, 2)
+        return distances_km(lat, lon, pts[:, 0], pts[:, 1])
+
+    def _ring(self, ci, cj, r):
+        if r == 0:
+            yield (ci, cj)
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield (ci - r, j)
+            yield (ci + r, j)
+        for i in range(ci - r + 1, ci + r):
+            yield (i, cj - r)
+            yield (i, cj + r)
+
+    def knn(self, lat, lon, k=1, where=None, max_km=None):
+        """k nearest [(key, km)], nearest first. `where(key)` filters candidates; max_km caps the search."""
+        with self._lock:
+            if not self._pos or k <= 0:
+                return []
+            if len(self._pos) < KNN_SCAN_BELOW:
+                return self._knn_scan(lat, lon, k, where, max_km)
+            ci, cj = self._cell(lat, lon)
+            b = self._bounds
+            max_r = max(abs(ci - b[0]), abs(b[1] - ci), abs(cj - b[2]), abs(b[3] - cj))
+            found_keys, found_d = [], np.empty(0)
+            for r in range(max_r + 1):
+                ring = [key for cell in self._ring(ci, cj, r) for key in self._cells.get(cell, ())
+                        if where is None or where(key)]
+                if ring:
+                    found_keys += ring
+                    found_d = np.concatenate([found_d, self._distances(lat, lon, ring)])
+                # Every point within covered_km of the query lies in rings 0..r (lon cells shrink with latitude)
+                far_lat = min(89.0, abs(lat) + (r + 1) * self.cell_deg)
+                covered_km = r * self.cell_deg * _KM_PER_DEG * math.cos(math.radians(far_lat))
+                if max_km is not None and covered_km >= max_km:
+                    break
+                if len(found_keys) >= k and np.partition(found_d, k - 1)[k - 1] <= covered_km:
+                    break
+            order = np.argsort(found_d, kind="stable")
+            out = [(found_keys[i], float(found_d[i])) for i in order[:k]]
+            if max_km is not None:
+                out = [(key, d) for key, d in out if d <= max_km]
+            return out
+
+    def _knn_scan(self, lat, lon, k, where, max_km):
+        n = len(self._keys)
+        d = distances_km(lat, lon, self._xy[:n, 0], self._xy[:n, 1])
+        if where is not None:
+            d[~np.fromiter((where(key) for key in self._keys), dtype=bool, count=n)] = np.inf
+        top = np.argpartition(d, k - 1)[:k] if k < n else np.arange(n)
+        top = top[np.argsort(d[top], kind="stable")]
+        return [(self._keys[i], float(d[i])) for i in top if np.isfinite(d[i]) and (max_km is None or d[i] <= max_km)]
+
+    def bbox(self, south, west, north, east):
+        """Keys inside the box (inclusive)."""
+        with self._lock:
+            i0, j0 = self._cell(south, west)
+            i1, j1 = self._cell(north, east)
+            out = []
+            if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self._cells):
+                cells = [c for c in self._cells if i0 <= c[0] <= i1 and j0 <= c[1] <= j1]
+            else:
+                cells = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+            for cell in cells:
+                for key in self._cells.get(cell, ()):
+                    la, lo, _ = self._pos[key]
+                    if south <= la <= north and west <= lo <= east:
+                        out.append(key)
+            return out
+
+    def radius(self, lat, lon, km):
+        """[(key, km)] within `km` of the point, nearest first."""
+        dlat = km / _KM_PER_DEG
+        dlon = km / (_KM_PER_DEG * max(math.cos(math.radians(lat)), 0.01))
+        with self._lock:
+            keys = self.bbox(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+            if not keys:
+                return []
+            d = self._distances(lat, lon, keys)
+        order = np.argsort(d, kind="stable")
+        return [(keys[i], float(d[i])) for i in order if d[i] <= km]
+
+
+def from_points(points, cell_deg=CELL_DEG):
+    """GridIndex from {key: (lat, lon)}."""
+    idx = GridIndex(cell_deg)
+    for key, (lat, lon) in points.items():
+        idx.upsert(key, float(lat), float(lon))
+    return idx
+
+
+# ==========================================
+# STATIC INDEXES (built once per process)
+# ==========================================
+hospital_index = from_points(HOSPITALS)
+junction_index = from_points(SENSORS_GRID)
+
+
+def nearest_hospital(lat, lon):
+    """(name, km) or (None, None)."""
+    hit = hospital_index.knn(lat, lon, 1)
+    return hit[0] if hit else (None, None)
+
+
+def nearest_junction(lat, lon, max_km=None):
+    """(junction name, km) or (None, None)."""
+    hit = junction_index.knn(lat, lon, 1, max_km=max_km)
+    return hit[0] if hit else (None, None)
+
+
+# ==========================================
+# LIVE HAZARD INDEX (one per process per DB file, fed by id cursor)
+# ==========================================
+class HazardIndex:
+    """Recent hazards in a GridIndex. refresh() reads only rows newer than the last id and expires old ones."""
+
+    def __init__(self, db_file=db.DB_FILE, window_sec=HAZARD_WINDOW_SEC, poll_sec=HAZARD_POLL_SEC):
+        self.db_file = db_file
+        self.window_sec = window_sec
+        self.poll_sec = poll_sec
+        self.index = GridIndex()
+        self.last_id = 0
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_poll < self.poll_sec:
+            return 0
+        with self._lock:
+            if not force and now - self._last_poll < self.poll_sec:
+                return 0
+            self._last_poll = now
+            cutoff = db.ago_ms(self.window_sec)
+            rows = db.fetchall(HAZARDS_SINCE_SQL, (self.last_id, cutoff), db_file=self.db_file)
+            for hid, lat, lon, htype, ts_ms in rows:
+                if lat is not None and lon is not None:
+                    self.index.upsert(hid, float(lat), float(lon), {"type": htype, "timestamp_ms": ts_ms})
+            if rows:
+                self.last_id = rows[-1][0]
+            for key in self.index.keys():
+                item = self.index.get(key)
+                if item and (item[2] or {}).get("timestamp_ms", 0) < cutoff:
+                    self.index.remove(key)
+            return len(rows)
+
+    def nearest(self, lat, lon, k=8, max_km=None):
+        """[{id, lat, lon, type, timestamp_ms, dist_km}], nearest first."""
+        self.refresh()
+        out = []
+        for key, km in self.index.knn(lat, lon, k, max_km=max_km):
+            item = self.index.get(key)
+            if item:
+                out.append({"id": key, "lat": item[0], "lon": item[1], **(item[2] or {}), "dist_km": km})
+        return out
+
+    def within(self, south, west, north, east, limit=None):
+        """[{id, lat, lon, type, timestamp_ms}] inside the box, newest first."""
+        self.refresh()
+        keys = sorted(self.index.bbox(south, west, north, east), reverse=True)[:limit]
+        out = []
+        for key in keys:
+            item = self.index.get(key)
+            if item:
+                out.append({"id": key, "lat": item[0], "lon": item[1], **(item[2] or {})})
+        return out
+
+
+def get_hazard_index(db_file=db.DB_FILE):
+    return db.per_db("hazard_index", db_file, HazardIndex)
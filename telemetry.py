@@ -0,0 +1,183 @@
+"""
+Write-behind telemetry ingestion for driver heartbeats.
+heartbeat()/update_server() enqueue rows; a background thread flushes them in one
+transaction per batch (executemany), collapsing repeated driver upserts to the latest row.
+A batch whose transaction fails is kept and written ahead of the next one (up to max_queue rows).
+"""
+import itertools
+import queue
+import threading
+import time
+
+import db
+
+DRIVER_UPSERT_SQL = """
+    INSERT INTO drivers (driver_id, status, current_lat, current_lon, last_seen_ms, speed, origin, destination, active_mission_id, selected_route_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(driver_id) DO UPDATE SET
+      status=excluded.status,
+      current_lat=excluded.current_lat,
+      current_lon=excluded.current_lon,
+      last_seen_ms=excluded.last_seen_ms,
+      speed=excluded.speed,
+      origin=excluded.origin,
+      destination=excluded.destination,
+      active_mission_id=excluded.active_mission_id,
+      selected_route_id=excluded.selected_route_id
+"""
+# clearance_status is not part of the heartbeat: it is a lease written by leases.py (request / grant / deny)
+DRIVER_STATE_SQL = "INSERT INTO driver_state (driver_id, origin, destination, current_lat, current_lon, speed, status, timestamp_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+MAX_QUEUE = 10000         # bounded: producers wait (then drop) when the writer falls behind
+FLUSH_ROWS = 200          # size trigger
+FLUSH_INTERVAL_SEC = 0.5  # time trigger
+PUT_TIMEOUT_SEC = 0.25    # backpressure: how long a producer waits for room before dropping
+
+
+class TelemetryIngestor:
+    """Bounded queue + flush thread. Driver upserts collapse per driver_id within a flush window."""
+
+    def __init__(self, db_file=db.DB_FILE, max_queue=MAX_QUEUE, flush_rows=FLUSH_ROWS,
+                 flush_interval=FLUSH_INTERVAL_SEC, put_timeout=PUT_TIMEOUT_SEC):
+        self.db_file = db_file
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()  # one writer at a time keeps upserts in arrival order
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # counters below are updated by producers and the writer, read by stats()
+        self.max_retry_rows = max_queue
+        self._retry_drivers = {}  # collapsed batch of a failed flush, written first next time
+        self._retry_states = []
+        self.enqueued = 0
+        self.dropped = 0
+        self.lost = 0             # rows given up after failed flushes (retry batch over max_retry_rows)
+        self.collapsed = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.flush_seconds = 0.0
+        self.last_error = None
+
+    # --- producers ---
+    def _put(self, item):
+        self._ensure_started()
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            self._wake.set()
+            return False
+        with self._stats_lock:
+            self.enqueued += 1
+        if self._queue.qsize() >= self.flush_rows:
+            self._wake.set()
+        return True
+
+    def upsert_driver(self, row):
+        """row matches DRIVER_UPSERT_SQL params (driver_id first). Returns False if dropped under backpressure."""
+        return self._put(("driver", row))
+
+    def append_state(self, row):
+        """row matches DRIVER_STATE_SQL params. Returns False if dropped under backpressure."""
+        return self._put(("state", row))
+
+    # --- writer ---
+    def _drain(self):
+        with self._stats_lock:
+            drivers, states = self._retry_drivers, self._retry_states
+            self._retry_drivers, self._retry_states = {}, []
+        collapsed = 0
+        while True:
+            try:
+                kind, row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "driver":
+                collapsed += drivers.pop(row[0], None) is not None
+                drivers[row[0]] = row  # latest wins, and moves to the end (most recently reported)
+            else:
+                states.append(row)
+        with self._stats_lock:
+            self.collapsed += collapsed
+        return drivers, states
+
+    def flush(self):
+        """Write everything queued so far in a single transaction. Safe to call from any thread."""
+        with self._flush_lock:
+            drivers, states = self._drain()
+            if not drivers and not states:
+                return 0
+            t0 = time.perf_counter()
+            try:
+                with db.transaction(self.db_file) as conn:
+                    if drivers:
+                        conn.executemany(DRIVER_UPSERT_SQL, list(drivers.values()))
+                    if states:
+                        conn.executemany(DRIVER_STATE_SQL, states)
+            except Exception as e:
+                self._keep_for_retry(drivers, states, str(e))
+                return 0
+            with self._stats_lock:
+                self.flush_seconds += time.perf_counter() - t0
+                self.flushes += 1
+                self.rows_written += len(drivers) + len(states)
+            return len(drivers) + len(states)
+
+    def _keep_for_retry(self, drivers, states, error):
+        """Keep a failed batch for the next flush, at most max_retry_rows: the oldest state rows go first,
+        then the drivers that have not reported for longest (earliest in the collapsed dict)."""
+        drop_states = min(max(0, len(drivers) + len(states) - self.max_retry_rows), len(states))
+        drop_drivers = max(0, len(drivers) - self.max_retry_rows)
+        if drop_drivers:
+            drivers = dict(itertools.islice(drivers.items(), drop_drivers, None))
+        with self._stats_lock:
+            self.last_error = error
+            self.lost += drop_states + drop_drivers
+            self._retry_drivers, self._retry_states = drivers, states[drop_states:]
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="titan-telemetry-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "queued": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "retrying": len(self._retry_drivers) + len(self._retry_states),
+                "lost": self.lost,
+                "collapsed": self.collapsed,
+                "rows_written": self.rows_written,
+                "flushes": self.flushes,
+                "inserts_per_sec": round(self.rows_written / self.flush_seconds) if self.flush_seconds else 0,
+                "last_error": self.last_error,
+            }
+
+
+def get_ingestor(db_file=db.DB_FILE):
+    """Process-wide ingestor per database file (survives Streamlit reruns)."""
+    return db.per_db("telemetry", db_file, TelemetryIngestor)
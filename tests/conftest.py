@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import schema  # noqa: E402
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    """Fresh database with every migration applied; pooled connections are closed afterwards."""
+    path = str(tmp_path / "titan_test.db")
+    schema.migrate(path)
+    yield path
+    db.get_manager(path).close_all()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import db
+
+
+def test_per_db_builds_once_per_kind_and_path(tmp_path):
+    built = []
+
+    def make(path):
+        built.append(path)
+        return object()
+
+    a = db.per_db("test-kind", str(tmp_path / "a.db"), make)
+    assert db.per_db("test-kind", str(tmp_path / "sub" / ".." / "a.db"), make) is a  # same absolute path
+    assert db.per_db("other-kind", str(tmp_path / "a.db"), make) is not a
+    assert len(built) == 2
+
+
+def test_per_db_concurrent_first_calls_share_one_object(tmp_path):
+    path = str(tmp_path / "race.db")
+    start = threading.Barrier(8)
+    out = []
+
+    def call():
+        start.wait()
+        out.append(db.per_db("race", path, lambda p: object()))
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(o) for o in out}) == 1
+
+
+def test_worker_ticks_until_stopped(db_file):
+    calls = []
+    w = db.Worker(db_file, 0.01, tick=lambda path: calls.append(path) or len(calls)).start()
+    deadline = time.monotonic() + 2
+    while w.runs < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    w.stop()
+    w._thread.join(1)
+    assert w.runs >= 3 and w.last_result == w.runs
+    assert set(calls) == {db_file}
+    assert not w._thread.is_alive()
+
+
+def test_worker_keeps_running_after_tick_errors(db_file):
+    def tick(path):
+        raise RuntimeError("boom")
+
+    w = db.Worker(db_file, 0.01, tick=tick).start()
+    time.sleep(0.05)
+    w.stop()
+    assert w.last_error == "boom" and w.runs == 0
+    assert w.start() is w  # start() is idempotent
+
+
+def test_ensure_worker_starts_once(db_file):
+    made = []
+
+    def make(path):
+        made.append(path)
+        return db.Worker(path, 60, tick=lambda p: None)
+
+    w = db.ensure_worker("test-worker", db_file, make)
+    try:
+        assert db.ensure_worker("test-worker", db_file, make) is w
+        assert len(made) == 1 and w._thread.is_alive()
+    finally:
+        w.stop()
+
+
+def test_pooled_manager_reuses_one_connection_per_thread(db_file):
+    mgr = db.ConnectionManager(db_file)
+    try:
+        for i in range(40):
+            mgr.fetchone("SELECT status FROM drivers WHERE driver_id=?", (f"UNIT-{i}",))
+        assert mgr.opened == 1 and mgr.stats()["checkouts"] >= 40
+    finally:
+        mgr.close_all()
@@ -0,0 +1,32 @@
+import json
+
+import pandas as pd
+
+import deck_map
+
+
+def _drivers():
+    return pd.DataFrame({
+        "driver_id": ["UNIT-1", "UNIT-2", "UNIT-3", "<img src=x onerror=alert(1)>"],
+        "status": ["EN_ROUTE", "IDLE", "OFFLINE", "IDLE"],
+        "current_lat": [10.0, 10.01, 10.02, None],
+        "current_lon": [76.3, 76.31, 76.32, 76.33],
+        "speed": [50, None, 0, 10],
+    })
+
+
+def test_drivers_split_by_status_and_focus():
+    frames = deck_map.drivers_frames(_drivers(), focus="UNIT-2")
+    assert set(frames) == {"EN_ROUTE", "FOCUS", "OTHER"}   # the row without a position is dropped
+    assert frames["EN_ROUTE"].iloc[0]["info"] == "EN_ROUTE 50 km/h"
+    assert frames["FOCUS"].iloc[0]["info"] == "IDLE"
+    assert deck_map.drivers_frames(None) == {}
+
+
+def test_tooltip_fields_are_escaped():
+    sensors = [{"Area": "<b>Junction</b>", "Status": "JAMMED", "Flow": 5, "Lat": 10.0, "Lon": 76.3}]
+    deck = deck_map.fleet_deck((10.0, 76.3), 12, sensors=sensors, hazards=[{"lat": 10.0, "lon": 76.3, "type": "<script>"}])
+    text = deck.to_json()
+    assert "<b>Junction" not in text and "<script>" not in text
+    ids = [layer["id"] for layer in json.loads(text)["layers"]]
+    assert ids == ["sensors-JAMMED", "hazards"]
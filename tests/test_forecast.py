@@ -0,0 +1,36 @@
+import numpy as np
+
+import forecast
+
+
+def test_backtest_beats_persistence():
+    """Two weeks of synthetic daily traffic: the 15-min forecast beats "flow stays as it is now"."""
+    rng = np.random.default_rng(0)
+    n, tick_sec = 50, 300
+    fc = forecast.Forecaster({f"J{i}": (9.9 + rng.random() * 0.2, 76.25 + rng.random() * 0.15) for i in range(n)})
+    rows = np.arange(n)
+    phase = rng.random(n) * 2 * np.pi
+    start = 1_700_000_000_000
+    steps = 14 * 86400 // tick_sec
+
+    def truth(ts):
+        day = (ts / 86400000) * 2 * np.pi
+        return 45 + 20 * np.sin(day + phase) - 15 * (np.sin(2 * day + phase) > 0.7)
+
+    errs_model, errs_persist = [], []
+    for k in range(steps):
+        ts = start + k * tick_sec * 1000
+        obs = truth(ts) + rng.normal(0, 4, n)
+        if k > steps // 2 and k % 12 == 0:
+            future = truth(ts + 15 * 60000)
+            errs_model.append(np.abs(fc.predict(15, now_ms=ts) - future).mean())
+            errs_persist.append(np.abs(obs - future).mean())
+        fc.update(ts, rows, obs)
+    assert np.mean(errs_model) < 0.8 * np.mean(errs_persist)
+
+
+def test_unseen_slot_falls_back_to_persistence():
+    fc = forecast.Forecaster({"A": (10.0, 76.3), "B": (10.01, 76.31)})
+    fc.update(1_700_000_000_000, [0], [42.0])
+    pred = fc.predict(30)
+    assert pred[0] == 42.0 and np.isnan(pred[1])
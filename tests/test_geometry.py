@@ -0,0 +1,32 @@
+import numpy as np
+
+import geometry
+
+
+def _route(n=2000):
+    # TomTom density: a point every ~5 m, with a little GPS noise
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, 1, n)
+    raw = np.column_stack([10.0 + 0.09 * t + 0.002 * np.sin(t * 40), 76.28 + 0.07 * t]) + rng.normal(0, 2e-6, (n, 2))
+    return raw.tolist()
+
+
+def test_polyline_roundtrip():
+    coords = [[round(lat, 5), round(lon, 5)] for lat, lon in _route(200)]
+    assert np.allclose(geometry.decode(geometry.encode(coords)), coords, atol=1e-5)
+
+
+def test_compact_simplifies_within_tolerance():
+    coords = _route()
+    route = geometry.compact({"coords": coords, "eta": 12})
+    stored = route["coords"]
+    assert route["eta"] == 12 and "coords" not in dict(route)
+    assert 2 < len(stored) < len(coords) // 10
+    assert stored[0] == [round(v, 5) for v in coords[0]] and stored[-1] == [round(v, 5) for v in coords[-1]]
+    assert geometry.compact(route) is route
+
+
+def test_map_coords_grows_with_zoom():
+    route = geometry.compact({"coords": _route()})
+    sizes = [len(geometry.map_coords(route, z, headroom=0)) for z in (12, 14, 16)]
+    assert sizes == sorted(sizes) and sizes[-1] <= len(route["coords"])
@@ -0,0 +1,41 @@
+import numpy as np
+
+import geometry
+import green_wave
+from shared_utils import SENSORS_GRID
+
+
+def _route_through(a, b, lead_km=0.2):
+    """Straight route starting lead_km before junction a and ending at junction b."""
+    a, b = np.asarray(SENSORS_GRID[a]), np.asarray(SENSORS_GRID[b])
+    step = (b - a) / np.linalg.norm(b - a)
+    start = a - step * lead_km / 111.32
+    coords = start + (b - start) * np.linspace(0, 1, 200)[:, None]
+    return geometry.compact({"coords": coords.tolist()})["polyline"], start
+
+
+def test_shared_junction_goes_to_the_earliest_arrival():
+    a, b = list(SENSORS_GRID)[:2]
+    polyline, start = _route_through(a, b)
+    sched = green_wave.GreenWaveScheduler(tick=0)
+    missions = [("CMD-SLOW", "UNIT-1", polyline), ("CMD-FAST", "UNIT-2", polyline)]
+    positions = {"UNIT-1": (*start, 20), "UNIT-2": (*start, 80)}
+    wanted = sched.plan(missions, positions)
+    assert wanted[a][0] == "CMD-FAST"
+    assert wanted[a][1] < sched.corridor(polyline).ahead(*start, 20)[0][1]
+    assert sched.plan(missions[:1], positions)[a][0] == "CMD-SLOW"
+
+
+def test_no_preemption_off_route_or_without_position():
+    a, b = list(SENSORS_GRID)[:2]
+    polyline, start = _route_through(a, b)
+    sched = green_wave.GreenWaveScheduler(tick=0)
+    missions = [("CMD-1", "UNIT-1", polyline), ("CMD-2", "UNIT-2", polyline)]
+    assert sched.plan(missions, {"UNIT-1": (start[0] + 0.05, start[1], 50)}) == {}
+    assert len(sched._corridors) == 1
+
+
+def test_green_wave_tick_without_missions(db_file):
+    sched = green_wave.GreenWaveScheduler(db_file)
+    assert sched.tick_once() == (0, 0)
+    assert sched.runs == 1 and sched.active == {}
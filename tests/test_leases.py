@@ -0,0 +1,26 @@
+import time
+
+import db
+import leases
+
+
+def test_lease_sweeper_is_a_db_worker(db_file):
+    leases.set_green("Edappally Toll", ttl_sec=-1, db_file=db_file)   # already lapsed
+    w = leases.ensure_worker(db_file, interval=60)
+    try:
+        assert isinstance(w, db.Worker) and leases.ensure_worker(db_file) is w
+        deadline = time.monotonic() + 2
+        while w.runs == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert w.last_result["signals"] == 1
+        assert db.fetchone("SELECT COUNT(*) FROM signal_status", db_file=db_file)[0] == 0
+    finally:
+        w.stop()
+
+
+def test_clearance_request_lands_before_the_first_telemetry_row(db_file):
+    leases.request_clearance("UNIT-NEW", db_file=db_file)
+    assert leases.clearance("UNIT-NEW", db_file=db_file)[0] == "PENDING"
+    leases.resolve_clearance("UNIT-NEW", "GRANTED", db_file=db_file)
+    leases.request_clearance("UNIT-NEW", db_file=db_file)
+    assert leases.clearance("UNIT-NEW", db_file=db_file)[0] == "PENDING"
@@ -0,0 +1,50 @@
+import json
+import random
+
+import live_map
+from live_map import SEQ_FIELD
+
+
+def _fleet(n, seed=0):
+    rng = random.Random(seed)
+    return {f"UNIT-{i}": (10.0 + rng.random() * 0.05, 76.3 + rng.random() * 0.05) for i in range(n)}
+
+
+def _items(pos):
+    return {f"d:{k}": live_map.driver(lat, lon, "green", driver_id=k, status="EN_ROUTE", speed=" 50 km/h")
+            for k, (lat, lon) in pos.items()}
+
+
+def _ack(layer, at):
+    layer.returned = {SEQ_FIELD: {"seq": layer.seq, "at": at}}   # the browser applied it and reported
+
+
+def test_incremental_diff_only_sends_changes():
+    pos = _fleet(200)
+    layer, full = live_map.LiveLayer(), live_map.LiveLayer(keyframe_ticks=0)
+    first = json.loads(layer.diff(_items(pos), "base"))
+    assert first["full"] and len(first["layers"]["driver"]) and first["seq"] == 1
+    _ack(layer, 1)
+    for k in list(pos)[:10]:
+        pos[k] = (pos[k][0] + 1e-4, pos[k][1])
+    del pos["UNIT-199"]
+    text = layer.diff(_items(pos), "base")
+    d = json.loads(text)
+    assert not d["full"] and (d["seq"], d["prev"]) == (2, 1)
+    assert len(d["move"]) == 10 and d["remove"] == ["d:UNIT-199"] and d["add"]["features"] == []
+    assert len(text) * 10 < len(full.diff(_items(pos), "base"))
+    _ack(layer, 2)
+    assert layer.diff(_items(pos), "base") is None and layer.feature_group(_items(pos), "base") is None
+
+
+def test_keyframe_when_browser_is_out_of_sync_or_base_changes():
+    pos = _fleet(20)
+    layer = live_map.LiveLayer()
+    layer.diff(_items(pos), "base")
+    pos["UNIT-0"] = (10.1, 76.4)
+    assert json.loads(layer.diff(_items(pos), "base"))["full"]          # no report yet
+    layer.returned = {SEQ_FIELD: {"seq": -1, "at": 5}}                 # browser missed a diff
+    pos["UNIT-1"] = (10.1, 76.4)
+    assert json.loads(layer.diff(_items(pos), "base"))["full"]
+    _ack(layer, 6)
+    assert json.loads(layer.diff(_items(pos), "other-route"))["full"]
@@ -0,0 +1,46 @@
+import json
+import random
+
+import map_layers
+from map_layers import CLUSTER, DRIVER, TRAIL
+
+
+def _fleet(n, spread=0.5, seed=0):
+    rng = random.Random(seed)
+    return {f"d:UNIT-{i}": (DRIVER, (9.8 + rng.random() * spread, 76.1 + rng.random() * spread), {"color": "green", "tpl": "driver_line"})
+            for i in range(n)}
+
+
+def test_layers_are_cached_by_content():
+    items = _fleet(100)
+    cache = map_layers._cache
+    misses = cache.misses
+    first = map_layers.layers_json(items)
+    assert map_layers.layers_json(dict(items)) == first
+    assert cache.misses == misses + 1 and cache.hits >= 1
+    fc = json.loads(first[DRIVER])
+    assert len(fc["features"]) == 100 and fc["features"][0]["geometry"]["type"] == "Point"
+
+
+def test_dumps_escapes_script_end():
+    s = map_layers.dumps({"name": "</script><script>alert(1)</script>"})
+    assert "</" not in s and json.loads(s)["name"].startswith("</script>")
+
+
+def test_cull_and_cluster_reduce_features():
+    items = _fleet(5000)
+    items["t:trail"] = (TRAIL, [(0.0, 0.0), (0.1, 0.1)], {"color": "#00ff9d"})
+    view, _ = map_layers.viewport(center=(10.015, 76.34), zoom=13)
+    culled = map_layers.cull(items, map_layers.expand(view), keep=("d:UNIT-0",))
+    assert "t:trail" in culled and "d:UNIT-0" in culled and len(culled) < len(items)
+    shown = map_layers.cluster(culled, 11)
+    clusters = [it for it in shown.values() if it[0] == CLUSTER]
+    assert clusters and len(shown) < len(culled)
+    assert sum(it[2]["count"] for it in clusters) + sum(1 for it in shown.values() if it[0] == DRIVER) == len(culled) - 1
+    assert map_layers.cluster(culled, map_layers.CLUSTER_MAX_ZOOM) is culled
+
+
+def test_viewport_prefers_reported_bounds():
+    returned = {"bounds": {"_southWest": {"lat": 9.9, "lng": 76.2}, "_northEast": {"lat": 10.1, "lng": 76.4}}, "zoom": 14}
+    assert map_layers.viewport(returned, center=(0, 0), zoom=3) == ((9.9, 76.2, 10.1, 76.4), 14)
+    assert map_layers.viewport() == (None, 12)
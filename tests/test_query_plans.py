@@ -0,0 +1,22 @@
+import pytest
+
+import db
+import schema
+
+HOT_QUERIES = schema.hot_queries()
+
+
+@pytest.mark.parametrize("name, sql, params, allowed_scan", HOT_QUERIES, ids=[q[0] for q in HOT_QUERIES])
+def test_hot_query_uses_an_index(db_file, name, sql, params, allowed_scan):
+    conn = db.get_manager(db_file).connection()
+    scans = [step for step in schema.explain(conn, sql, params) if step.startswith("SCAN ") and step != allowed_scan]
+    assert scans == []
+
+
+def test_check_query_plans_passes(db_file):
+    assert schema.check_query_plans(db_file) == []
+
+
+def test_dropped_index_is_reported(db_file):
+    db.execute("DROP INDEX idx_sensor_readings_ts", db_file=db_file)
+    assert ("sensor_window", "SCAN sensor_readings") in schema.check_query_plans(db_file)
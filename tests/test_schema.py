@@ -0,0 +1,32 @@
+import sqlite3
+
+import db
+import schema
+
+
+def test_fresh_database_records_epoch_ms(db_file):
+    rows = db.fetchall("SELECT version, applied_at_ms FROM schema_version ORDER BY version", db_file=db_file)
+    assert [v for v, _ in rows] == [v for v, _, _ in schema.MIGRATIONS]
+    assert all(abs(ms - db.now_ms()) < 60000 for _, ms in rows)
+    assert [r[1] for r in db.fetchall("PRAGMA table_info(schema_version)", db_file=db_file)] == ["version", "description", "applied_at_ms"]
+
+
+def test_upgrade_converts_applied_at(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE schema_version (version INTEGER PRIMARY KEY, description TEXT, applied_at DATETIME)")
+    with conn:
+        for version, description, fn in schema.MIGRATIONS[:9]:
+            fn(conn)
+            conn.execute("INSERT INTO schema_version VALUES (?, ?, '2026-01-02 03:04:05.000000')", (version, description))
+    conn.close()
+    try:
+        assert schema.migrate(path) == [10]
+        rows = db.fetchall("SELECT version, applied_at_ms FROM schema_version ORDER BY version", db_file=path)
+        old = db.fetchone("SELECT CAST(ROUND((julianday('2026-01-02 03:04:05', 'utc') - 2440587.5) * 86400000) AS INTEGER)",
+                          db_file=path)[0]
+        assert [ms for _, ms in rows[:9]] == [old] * 9 and abs(rows[9][1] - db.now_ms()) < 60000
+        assert [r[1] for r in db.fetchall("PRAGMA table_info(schema_version)", db_file=path)] == ["version", "description", "applied_at_ms"]
+        assert schema.migrate(path) == []
+    finally:
+        db.get_manager(path).close_all()
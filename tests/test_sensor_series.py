@@ -0,0 +1,28 @@
+import numpy as np
+
+import sensor_series
+
+
+def test_window_stats_after_wraparound():
+    bank = sensor_series.SeriesBank(["A", "B"], capacity=10)
+    for t in range(25):
+        flows = [t, 50]
+        bank.push(1_700_000_000_000 + t * 1000, [0, 1], flows, sensor_series.classify(flows))
+    stats = bank.stats()
+    assert stats["A"]["samples"] == 10
+    assert stats["A"]["mean"] == np.mean(range(15, 25))
+    assert (stats["A"]["min"], stats["A"]["p50"], stats["A"]["p90"]) == (15, 19, 23)
+    assert stats["A"]["trend"] > 0 and stats["B"]["trend"] == 0
+    ts, flow, _ = bank.series("A")
+    assert flow.tolist() == list(range(15, 25)) and (np.diff(ts) > 0).all()
+
+
+def test_congestion_duration_and_sparkline():
+    bank = sensor_series.SeriesBank(["A"], capacity=300)
+    for t in range(120):
+        flow = 5 if t >= 60 else 60
+        bank.push(t * 1000, [0], [flow], sensor_series.classify([flow]))
+    assert bank.stats()["A"]["congested_sec"] == 59
+    spark = bank.sparkline("A", points=30)
+    assert len(spark) == 30 and spark[0] == 60 and spark[-1] == 5
+    assert bank.sparkline("A", points=500) == bank.series("A")[1].tolist()
@@ -0,0 +1,42 @@
+import numpy as np
+
+import db
+import sensor_sim
+import sensors
+from shared_utils import SENSORS_GRID
+
+T0 = 1_700_000_000_000
+
+
+def test_same_seed_same_readings():
+    a = sensor_sim.CitySimulator(n=500, clock=lambda: T0)
+    b = sensor_sim.CitySimulator(n=500, clock=lambda: T0)
+    assert a.read() == b.read()
+    assert not np.array_equal(a.flows_at(T0), sensor_sim.CitySimulator(n=500, seed=7).flows_at(T0))
+    assert list(a.junctions)[:len(SENSORS_GRID)] == list(SENSORS_GRID)
+
+
+def test_incident_cuts_flow_nearby_only():
+    sim = sensor_sim.CitySimulator(n=500, incidents_per_hour=0)
+    before = sim.flows_at(T0)
+    name = list(sim.junctions)[0]
+    sim.inject_incident(*sim.junctions[name], severity=0.8, start_ms=T0)
+    after = sim.flows_at(T0)
+    i = sim.names.index(name)
+    assert after[i] < before[i] * 0.5
+    far = np.hypot(sim._x - sim._x[i], sim._y - sim._y[i]) > 10
+    assert (after[far] == before[far]).all()
+    end = T0 + sensor_sim.INCIDENT_DURATION_SEC * 1000
+    assert (sim.flows_at(end) == sensor_sim.CitySimulator(n=500, incidents_per_hour=0).flows_at(end)).all()
+
+
+def test_city_scale_ingestion(db_file):
+    ticks = iter(range(T0, T0 + 10 * 2000, 2000))
+    sim = sensor_sim.CitySimulator(n=10000, clock=lambda: next(ticks))
+    ing = sensors.SensorIngestor(db_file, source=sim, junctions=sim.junctions)
+    for _ in range(3):
+        ing.tick_once()
+    data = ing.latest()
+    assert len(data) == 10000 and len(ing.stats()) == 10000
+    assert db.fetchone("SELECT COUNT(*) FROM sensor_readings", db_file=db_file)[0] == 30000
+    assert {d["Status"] for d in data} <= {"CLEAR", "HEAVY", "JAMMED"}
@@ -0,0 +1,48 @@
+import db
+import leases
+import sensor_sim
+import sensors
+
+
+def _sim():
+    return sensor_sim.CitySimulator(n=50, incidents_per_hour=0, clock=lambda: 1_700_000_000_000)
+
+
+def test_sensor_ingestor_tick_publishes_and_persists(db_file):
+    sim = _sim()
+    ing = sensors.SensorIngestor(db_file, source=sim)
+    snap = ing.tick_once()
+    assert ing.runs == 1 and snap.version == 1 and ing.last_result is snap
+    assert len(snap.readings) == len(sim.junctions) == ing.rows_written
+    assert {r["Area"] for r in ing.latest()} == set(sim.junctions)
+
+
+
+def test_sensor_ingestor_setup_backfills_series(db_file):
+    sim = _sim()
+    first = sensors.SensorIngestor(db_file, source=sim)
+    for _ in range(5):
+        first.tick_once()
+    restarted = sensors.SensorIngestor(db_file, source=sim)
+    restarted.setup()
+    assert (restarted.series.count == first.series.count).all()
+    assert (restarted.series.total == first.series.total).all()
+
+
+
+class _Fixed:
+    name = "fixed"
+
+    def read(self, junctions):
+        return {name: 20 for name in junctions}
+
+
+def test_green_wave_overrides_the_snapshot_not_the_measurement(db_file):
+    junction = next(iter(sensors.SENSORS_GRID))
+    leases.set_green(junction, db_file=db_file)
+    ing = sensors.SensorIngestor(db_file, source=_Fixed())
+    ing.tick_once()
+    shown = {r["Area"]: r for r in ing.latest()}
+    assert (shown[junction]["Status"], shown[junction]["Flow"]) == ("GREEN_WAVE", sensors.GREEN_WAVE_FLOW)
+    assert db.fetchall("SELECT flow, status FROM sensor_readings WHERE junction=?", (junction,), db_file=db_file) == [(20, "HEAVY")]
+    assert ing.series.flow[ing.series.index[junction]].max() == 20
@@ -0,0 +1,26 @@
+import numpy as np
+
+from shared_utils import HOSPITALS, distance_km, distance_matrix_km, distances_km
+
+
+def _points(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return 9.9 + rng.random(n) * 0.3, 76.2 + rng.random(n) * 0.2
+
+
+def test_distances_km_matches_scalar_haversine():
+    lat, lon = HOSPITALS["Amrita AIMS (Edappally)"]
+    lats, lons = _points(1000)
+    scalar = [distance_km(lat, lon, la, lo) for la, lo in zip(lats, lons)]
+    assert np.allclose(distances_km(lat, lon, lats, lons), scalar, rtol=0, atol=1e-9)
+    assert np.isnan(distances_km(lat, lon, [np.nan], [lon])[0])
+
+
+def test_distance_matrix_shape_and_methods():
+    hosp = np.array(list(HOSPITALS.values()))
+    lats, lons = _points(500, seed=1)
+    hav = distance_matrix_km(hosp[:, 0], hosp[:, 1], lats, lons)
+    assert hav.shape == (len(hosp), 500)
+    assert np.allclose(hav[2], distances_km(hosp[2, 0], hosp[2, 1], lats, lons))
+    eq = distance_matrix_km(hosp[:, 0], hosp[:, 1], lats, lons, method="equirect")
+    assert np.allclose(eq, hav, rtol=1e-3, atol=1e-3)   # within 0.1% at city scale
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import spatial_index
+from shared_utils import distances_km
+
+
+def _index(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = 9.85 + rng.random(n) * 0.35
+    lons = 76.2 + rng.random(n) * 0.25
+    return spatial_index.from_points({i: (lats[i], lons[i]) for i in range(n)}), lats, lons
+
+
+@pytest.mark.parametrize("n", [1, 100, spatial_index.KNN_SCAN_BELOW + 500])   # scan and grid paths
+def test_knn_and_radius_match_brute_force(n):
+    idx, lats, lons = _index(n)
+    rng = np.random.default_rng(1)
+    for lat, lon in zip(9.9 + rng.random(20) * 0.25, 76.25 + rng.random(20) * 0.15):
+        d = distances_km(lat, lon, lats, lons)
+        order = np.argsort(d, kind="stable")
+        assert [k for k, _ in idx.knn(lat, lon, 10)] == order[:10].tolist()
+        assert [k for k, _ in idx.radius(lat, lon, 2.0)] == [i for i in order if d[i] <= 2.0]
+        even = [k for k, _ in idx.knn(lat, lon, 5, where=lambda key: key % 2 == 0)]
+        assert even == [i for i in order if i % 2 == 0][:5]
+        assert all(km <= 1.0 for _, km in idx.knn(lat, lon, 50, max_km=1.0))
+
+
+def test_upsert_and_remove_keep_queries_consistent():
+    idx, lats, lons = _index(300)
+    for i in range(0, 300, 3):
+        idx.remove(i)
+    for i in range(1, 300, 3):
+        idx.upsert(i, lats[i] + 0.01, lons[i])
+        lats[i] += 0.01
+    keep = np.array([i for i in range(300) if i % 3])
+    assert len(idx) == len(keep)
+    d = distances_km(10.0, 76.3, lats[keep], lons[keep])
+    assert [k for k, _ in idx.knn(10.0, 76.3, 20)] == keep[np.argsort(d, kind="stable")[:20]].tolist()
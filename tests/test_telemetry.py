@@ -0,0 +1,83 @@
+import db
+import schema
+import telemetry
+
+
+def _rows(units, tick):
+    now = db.now_ms()
+    for u in range(units):
+        did = f"UNIT-{u:03d}"
+        lat, lon = 10.0 + u * 1e-3, 76.3 + tick * 1e-4
+        yield (did, "EN_ROUTE", lat, lon, now, 50.0, "A", "B", None, 1), (did, "A", "B", lat, lon, 50.0, "EN_ROUTE", now)
+
+
+def test_write_behind_collapses_upserts_and_keeps_every_state(db_file):
+    ing = telemetry.TelemetryIngestor(db_file)
+    for tick in range(5):
+        for drow, srow in _rows(20, tick):
+            ing.upsert_driver(drow)
+            ing.append_state(srow)
+    ing.stop()
+    stats = ing.stats()
+    assert stats["dropped"] == stats["lost"] == stats["retrying"] == 0
+    assert stats["enqueued"] == 200 and stats["rows_written"] + stats["collapsed"] == 200
+    assert db.fetchone("SELECT COUNT(*) FROM drivers", db_file=db_file)[0] == 20
+    assert db.fetchone("SELECT COUNT(*) FROM driver_state", db_file=db_file)[0] == 100
+    # Latest heartbeat wins
+    assert db.fetchone("SELECT current_lon FROM drivers WHERE driver_id='UNIT-000'", db_file=db_file)[0] == 76.3 + 4e-4
+
+
+def test_failed_flush_is_retried(tmp_path):
+    path = str(tmp_path / "late.db")   # tables do not exist yet, so flushes fail
+    ing = telemetry.TelemetryIngestor(path, flush_interval=60)
+    try:
+        for drow, srow in _rows(3, 0):
+            ing.upsert_driver(drow)
+            ing.append_state(srow)
+        assert ing.flush() == 0
+        assert ing.last_error and ing.stats()["retrying"] == 6
+        schema.migrate(path)
+        assert ing.flush() == 6
+        assert ing.stats()["retrying"] == 0 and ing.lost == 0
+        assert db.fetchone("SELECT COUNT(*) FROM driver_state", db_file=path)[0] == 3
+    finally:
+        ing.stop()
+        db.get_manager(path).close_all()
+
+
+def test_retry_batch_is_bounded(tmp_path):
+    path = str(tmp_path / "late.db")
+    ing = telemetry.TelemetryIngestor(path, max_queue=100, flush_interval=60)
+    try:
+        for tick in range(20):
+            for drow, srow in _rows(5, tick):
+                ing.upsert_driver(drow)
+                ing.append_state(srow)
+            ing.flush()
+        # 5 collapsed drivers + 100 states kept for retry; the 5 oldest states are given up
+        assert ing.stats()["retrying"] == 100 and ing.lost == 5
+    finally:
+        ing.stop()
+        db.get_manager(path).close_all()
+
+
+def test_retry_bound_also_caps_drivers(tmp_path):
+    path = str(tmp_path / "late.db")
+    ing = telemetry.TelemetryIngestor(path, flush_interval=60)
+    ing.max_retry_rows = 10
+    try:
+        for drow, srow in _rows(8, 0):
+            ing.upsert_driver(drow)
+            ing.append_state(srow)
+        ing.flush()
+        assert ing.stats()["retrying"] == 10 and ing.lost == 6   # 8 drivers + the 2 newest states
+        later = [drow for drow, _ in _rows(12, 1)]
+        for u in (11, 10, 9, 8, 3, 2, 1, 0):   # UNIT-004..007 have not reported since
+            ing.upsert_driver(later[u])
+        ing.flush()
+        stats = ing.stats()
+        assert stats["retrying"] == 10 and stats["lost"] == 6 + 2 + 2   # both states, then UNIT-004 and -005
+        assert sorted(ing._retry_drivers) == [f"UNIT-{u:03d}" for u in (0, 1, 2, 3, 6, 7, 8, 9, 10, 11)]
+    finally:
+        ing.stop()
+        db.get_manager(path).close_all()